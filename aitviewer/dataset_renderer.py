@@ -0,0 +1,204 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+import os
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from tqdm import tqdm
+
+from aitviewer.render_target import OffscreenTarget
+from aitviewer.scene.camera import OpenCVCamera
+
+
+class DatasetRenderer(object):
+    """
+    Render a scene from several cameras for many frames and store the results in compressed chunks.
+
+    The output directory contains a `meta.json` describing the dataset and one directory per camera holding files
+    `chunk_XXXXXX.npz`, each containing the outputs of `chunk_size` consecutive frames:
+      - 'frame_ids': (F,) the scene frames of the chunk.
+      - 'K': (F, 3, 3) and 'Rt': (F, 3, 4) the camera intrinsics and extrinsics in the OpenCV format.
+      - 'rgb': (F, H, W, 3) uint8 color images.
+      - 'depth': (F, H, W) float32 linear depth, 0 where nothing was rendered.
+      - 'object_id': (F, H, W) int32 uids of the rendered nodes, 0 for the background.
+      - 'triangle_id': (F, H, W) int32 indices of the rendered triangles, -1 for the background.
+      - 'mask': (F, H, W, 3) uint8 color masks.
+    Chunks are written atomically, so an interrupted run can be resumed by running it again, chunks that already
+    exist for all cameras are skipped.
+
+    Frames are iterated in the outer loop and cameras in the inner loop, such that the scene is only updated once per
+    frame and the shadow maps, which do not depend on the camera, are rendered once per frame.
+    """
+
+    def __init__(self, viewer, cameras, output_dir, chunk_size=64, outputs=('rgb', 'depth', 'object_id'),
+                 supersampling=1, n_workers=None, max_pending=8):
+        """
+        Initializer.
+        :param viewer: A `HeadlessRenderer` with the scene to render.
+        :param cameras: A list of `OpenCVCamera`s, the images have the resolution given by their cols and rows.
+        :param output_dir: The directory where the dataset is stored.
+        :param chunk_size: Number of frames stored in one chunk.
+        :param outputs: The outputs to store, any of 'rgb', 'depth', 'object_id', 'triangle_id' and 'mask'.
+        :param supersampling: Render at this multiple of the camera resolution and downsample on the GPU.
+        :param n_workers: Number of threads compressing and writing chunks, defaults to the number of CPUs.
+        :param max_pending: Maximum number of chunks waiting to be written before rendering blocks.
+        """
+        valid_outputs = ['rgb', 'depth', 'object_id', 'triangle_id', 'mask']
+        for o in outputs:
+            if o not in valid_outputs:
+                raise ValueError("Unknown output '{}', must be one of {}.".format(o, valid_outputs))
+        for c in cameras:
+            assert isinstance(c, OpenCVCamera), "Only OpenCVCameras are supported."
+
+        self.viewer = viewer
+        self.cameras = cameras
+        self.output_dir = output_dir
+        self.chunk_size = chunk_size
+        self.outputs = tuple(outputs)
+        self.supersampling = supersampling
+        self.n_workers = n_workers or os.cpu_count()
+        self.max_pending = max_pending
+
+    def _chunk_path(self, camera_idx, chunk_idx):
+        return os.path.join(self.output_dir, 'camera_{:0>3}'.format(camera_idx), 'chunk_{:0>6}.npz'.format(chunk_idx))
+
+    def _write_meta(self, frames):
+        meta = {
+            'n_cameras': len(self.cameras),
+            'resolutions': [[c.cols, c.rows] for c in self.cameras],
+            'frames': [int(f) for f in frames],
+            'chunk_size': self.chunk_size,
+            'outputs': list(self.outputs),
+        }
+        path = os.path.join(self.output_dir, 'meta.json')
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                if json.load(f) != meta:
+                    raise ValueError("The dataset in {} was rendered with different settings, use another output "
+                                     "directory or delete it to start over.".format(self.output_dir))
+            return
+        with open(path, 'w') as f:
+            json.dump(meta, f, indent=2)
+
+    @staticmethod
+    def _save(path, arrays):
+        # Write to a temporary file first such that a chunk is either complete or does not exist.
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def run(self, frames=None):
+        """
+        Render the dataset.
+        :param frames: The scene frames to render or None to render all frames.
+        """
+        v = self.viewer
+        v._init_scene()
+        frames = np.arange(v.scene.n_frames) if frames is None else np.asarray(frames)
+        chunks = [frames[i:i + self.chunk_size] for i in range(0, len(frames), self.chunk_size)]
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        for i in range(len(self.cameras)):
+            os.makedirs(os.path.dirname(self._chunk_path(i, 0)), exist_ok=True)
+        self._write_meta(frames)
+
+        # Resume from chunks that have already been written for all cameras.
+        todo = [c for c in range(len(chunks))
+                if not all(os.path.exists(self._chunk_path(i, c)) for i in range(len(self.cameras)))]
+        if len(todo) < len(chunks):
+            print("Resuming, {} of {} chunks already exist.".format(len(chunks) - len(todo), len(chunks)))
+
+        # Remember viewer state.
+        saved_camera = v.scene.camera
+        saved_using_temp_camera = v._using_temp_camera
+        saved_target = v.offscreen_target
+        saved_curr_frame = v.scene.current_frame_id
+        saved_run_animations = v.run_animations
+        v.run_animations = False
+
+        # One offscreen target per resolution.
+        targets = {}
+        for c in self.cameras:
+            if (c.cols, c.rows) not in targets:
+                targets[(c.cols, c.rows)] = OffscreenTarget(v.ctx, c.cols, c.rows, self.supersampling)
+
+        want_ids = 'object_id' in self.outputs or 'triangle_id' in self.outputs
+        executor = ThreadPoolExecutor(max_workers=self.n_workers)
+        pending = []
+        render_time, read_time, wait_time = 0.0, 0.0, 0.0
+        n_images = 0
+
+        start_time = perf_counter()
+        try:
+            for c in tqdm(todo, desc='Rendering chunks'):
+                chunk_frames = chunks[c]
+                data = [{o: [] for o in self.outputs + ('K', 'Rt')} for _ in self.cameras]
+
+                for f in chunk_frames:
+                    v.scene.current_frame_id = f
+                    for i, cam in enumerate(self.cameras):
+                        cam.current_frame_id = f
+                        v.set_temp_camera(cam)
+                        v.offscreen_target = targets[(cam.cols, cam.rows)]
+
+                        t = perf_counter()
+                        v.render(0, 0, export=True)
+                        render_time += perf_counter() - t
+
+                        t = perf_counter()
+                        out = v.get_current_outputs(rgb='rgb' in self.outputs, depth='depth' in self.outputs,
+                                                    ids=want_ids, mask='mask' in self.outputs)
+                        for o in self.outputs:
+                            data[i][o].append(out[o])
+                        data[i]['K'].append(cam.current_K)
+                        data[i]['Rt'].append(cam.current_Rt)
+                        read_time += perf_counter() - t
+                        n_images += 1
+
+                # Compress and write the chunk in the background while the next one is rendered.
+                t = perf_counter()
+                for i in range(len(self.cameras)):
+                    arrays = {k: np.stack(x) for k, x in data[i].items()}
+                    arrays['frame_ids'] = chunk_frames
+                    if len(pending) >= self.max_pending:
+                        pending.pop(0).result()
+                    pending.append(executor.submit(self._save, self._chunk_path(i, c), arrays))
+                wait_time += perf_counter() - t
+
+            t = perf_counter()
+            for p in pending:
+                p.result()
+            wait_time += perf_counter() - t
+        finally:
+            executor.shutdown()
+            for target in targets.values():
+                target.release()
+
+            # Restore viewer state.
+            v.offscreen_target = saved_target
+            v.scene.camera = saved_camera
+            v._using_temp_camera = saved_using_temp_camera
+            v.scene.current_frame_id = saved_curr_frame
+            v.run_animations = saved_run_animations
+
+        elapsed = max(perf_counter() - start_time, 1e-6)
+        print("Rendered {} images in {:.2f}s ({:.2f} images/s, {:.2f} frames/s)".format(
+            n_images, elapsed, n_images / elapsed, n_images / max(len(self.cameras), 1) / elapsed))
+        print("Render {:.2f}s, readback {:.2f}s, waiting for writes {:.2f}s".format(render_time, read_time, wait_time))
@@ -14,8 +14,15 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import imgui
 import os
+import shutil
+import tempfile
+import numpy as np
+import multiprocessing as mp
 
+from concurrent.futures import ProcessPoolExecutor
+from aitviewer.utils.utils import concat_videos, get_video_paths, video_to_gif
 from aitviewer.viewer import Viewer
 from PIL.Image import Image
 
@@ -37,13 +44,17 @@ class HeadlessRenderer(Viewer):
         """Same as self.save_video, kept for backward compatibility."""
         return self.save_video(frame_dir, video_dir, output_fps)
 
-    def save_video(self, frame_dir=None, video_dir=None, output_fps=60):
+    def save_video(self, frame_dir=None, video_dir=None, output_fps=60, scale_factor=None, supersampling=1):
         """
         Convenience method to run the headless rendering.
         :param frame_dir: Where to store the individual frames or None if you don't care.
         :param video_dir: If set will automatically generate a video from the images found in `frame_dir`. Must
           be specified if `frame_dir` is None.
         :param output_fps: Fps of the output video, if None uses 60fps as default
+        :param scale_factor: a scale factor used to scale the frames. If None the frames have the same size as the
+          viewer.
+        :param supersampling: render at this multiple of the output size and downsample on the GPU, must be a power
+          of two.
         """
         self._init_scene()
         self.export_video(
@@ -51,17 +62,21 @@ class HeadlessRenderer(Viewer):
             frame_dir=frame_dir,
             animation=True,
             output_fps=output_fps,
+            scale_factor=scale_factor,
+            supersampling=supersampling,
         )
 
-    def save_frame(self, file_path, scale_factor: float = None):
+    def save_frame(self, file_path, scale_factor: float = None, supersampling=1):
         """
         Run the headless viewer and render a single frame.
         :param file_path: the path where the image is saved.
         :param scale_factor: a scale factor used to scale the image. If None no scale factor is used and
           the image will have the same size as the viewer.
+        :param supersampling: render at this multiple of the image size and downsample on the GPU, must be a power
+          of two.
         """
         self._init_scene()
-        self.export_frame(file_path, scale_factor)
+        self.export_frame(file_path, scale_factor, supersampling)
 
     def save_depth(self, file_path):
         """
@@ -81,6 +96,12 @@ class HeadlessRenderer(Viewer):
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         self.get_mask().save(file_path)
 
+    def close(self):
+        """Release the renderer such that another one can be created in the same process."""
+        self.on_close()
+        imgui.destroy_context(self.imgui_ctx)
+        self.window.destroy()
+
     def _render_frame(self):
         self._init_scene()
 
@@ -118,3 +139,124 @@ class HeadlessRenderer(Viewer):
         """
         self._render_frame()
         return self.get_current_mask_image()
+
+    def get_outputs(self, rgb=True, depth=True, ids=True, mask=False):
+        """
+        Render a single frame and return the requested outputs as np arrays, see `Viewer.get_current_outputs`.
+        The scene is rendered once for all outputs.
+        """
+        self._render_frame()
+        return self.get_current_outputs(rgb=rgb, depth=depth, ids=ids, mask=mask)
+
+
+def _probe_scene(scene_fn, viewer_kwargs):
+    """Build the scene in a worker process and return its number of frames and the default playback fps."""
+    v = HeadlessRenderer(**viewer_kwargs)
+    scene_fn(v)
+    result = v.scene.n_frames, v.playback_fps
+    v.close()
+    return result
+
+
+def _render_shard(scene_fn, viewer_kwargs, playback_fps, animation_range, output_fps, rotate_camera,
+                  seconds_per_rotation, rotation_steps, segment_path, scale_factor, supersampling):
+    """Render a contiguous chunk of an animation to a video segment in a worker process."""
+    v = HeadlessRenderer(**viewer_kwargs)
+    scene_fn(v)
+    if playback_fps is not None:
+        v.playback_fps = playback_fps
+    v._init_scene()
+
+    # Bring the camera to the state it would have after the frames preceding this chunk in a serial export.
+    if rotate_camera:
+        playback_count = int(np.round(v.playback_fps / output_fps))
+        az_delta = 2 * np.pi / seconds_per_rotation * (playback_count / v.playback_fps)
+        for _ in range(rotation_steps):
+            v.scene.camera.rotate_azimuth(az_delta)
+            v.scene.camera.update_matrices(*v.window.size)
+
+    path = v.export_video(output_path=segment_path, animation=True, animation_range=animation_range,
+                          output_fps=output_fps, rotate_camera=rotate_camera,
+                          seconds_per_rotation=seconds_per_rotation, scale_factor=scale_factor,
+                          supersampling=supersampling)
+    v.close()
+    return path
+
+
+def save_video_sharded(scene_fn, output_path, n_workers=None, animation_range=None, output_fps=60,
+                       playback_fps=None, rotate_camera=False, seconds_per_rotation=10.0, scale_factor=None,
+                       supersampling=1, viewer_kwargs=None):
+    """
+    Render an animation with several worker processes in parallel. The animation is split into contiguous chunks,
+    every worker creates its own `HeadlessRenderer` and renders one chunk to a video segment. The segments are
+    then concatenated without re-encoding, so the result is the same as rendering all frames with
+    `HeadlessRenderer.save_video`.
+    :param scene_fn: A picklable callable that receives a `HeadlessRenderer` and populates its scene, e.g. a
+      function defined at module level that loads a sequence and adds it to `viewer.scene`. It is called once in
+      every worker, so it must build the same scene every time.
+    :param output_path: Where to save the video, see `Viewer.export_video`.
+    :param n_workers: Number of worker processes, defaults to the number of CPUs.
+    :param animation_range: The range of scene frames [first, last] to render or None to render all frames.
+    :param output_fps: Fps of the output video, the playback fps must be a multiple of it.
+    :param playback_fps: Playback fps used by the workers or None to use the one from the configuration.
+    :param rotate_camera: Whether to rotate the camera around the scene during the animation.
+    :param seconds_per_rotation: Seconds of video for a full camera rotation.
+    :param scale_factor: A scale factor used to scale the frames.
+    :param supersampling: Render at this multiple of the output size and downsample on the GPU.
+    :param viewer_kwargs: Keyword arguments passed to the `HeadlessRenderer` of every worker, e.g. `size` or
+      `config`. Changes made to the configuration in this process are not seen by the workers.
+    :return: The path of the exported video.
+    """
+    n_workers = n_workers or os.cpu_count()
+    viewer_kwargs = viewer_kwargs or {}
+
+    # Find the frame range by building the scene once in a worker, such that no GL context is created in this
+    # process. Workers are spawned rather than forked since GL contexts cannot be shared with a forked process.
+    mp_context = mp.get_context('spawn')
+    if animation_range is None or playback_fps is None:
+        with ProcessPoolExecutor(max_workers=1, mp_context=mp_context) as executor:
+            n_scene_frames, default_fps = executor.submit(_probe_scene, scene_fn, viewer_kwargs).result()
+        playback_fps = playback_fps or default_fps
+        if animation_range is None:
+            animation_range = [0, n_scene_frames - 1]
+
+    if np.fmod(playback_fps, output_fps) >= 0.1:
+        raise ValueError("Sharded rendering requires the playback fps ({}) to be a multiple of the output fps ({})."
+                         .format(playback_fps, output_fps))
+    playback_count = int(np.round(playback_fps / output_fps))
+    n_frames = (animation_range[1] - animation_range[0] + 1) // playback_count
+    if n_frames <= 0:
+        print("No frames rendered.")
+        return None
+
+    # Split the output frames into contiguous chunks of scene frames that are aligned to the playback count.
+    bounds = np.linspace(0, n_frames, min(n_workers, n_frames) + 1).astype(int)
+    is_gif = output_path.endswith('.gif')
+    final_mp4, final_gif, _ = get_video_paths(output_path)
+
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(final_mp4))
+    try:
+        with ProcessPoolExecutor(max_workers=len(bounds) - 1, mp_context=mp_context) as executor:
+            futures = []
+            for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+                chunk_range = [animation_range[0] + start * playback_count,
+                               animation_range[0] + end * playback_count - 1]
+                segment_path = os.path.join(tmp_dir, 'segment_{:0>4}.mp4'.format(i))
+                futures.append(executor.submit(_render_shard, scene_fn, viewer_kwargs, playback_fps, chunk_range,
+                                               output_fps, rotate_camera, seconds_per_rotation, start, segment_path,
+                                               scale_factor, supersampling))
+
+            # Segments are concatenated in the order of their frames, independently of when the workers finished.
+            segments = [f.result() for f in futures]
+
+        concat_videos(segments, final_mp4, remove=True)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if is_gif:
+        video_to_gif(final_mp4, final_gif, remove=True)
+        print(f"GIF saved to {os.path.abspath(final_gif)}")
+        return final_gif
+
+    print(f"Video saved to {os.path.abspath(final_mp4)}")
+    return final_mp4
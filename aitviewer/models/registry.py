@@ -0,0 +1,84 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import inspect
+import threading
+import torch
+import weakref
+
+# Layers that are currently in use, keyed by their class and constructor arguments. Entries only hold weak references,
+# so a layer is dropped from the registry as soon as the last sequence using it is garbage collected.
+_layers = weakref.WeakValueDictionary()
+_lock = threading.Lock()
+
+
+def _normalize(value):
+    if isinstance(value, (torch.device, torch.dtype)):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(v) for v in value)
+    return value
+
+
+def _layer_key(layer_cls, args, kwargs):
+    """Return a hashable key of the arguments with all defaults filled in or None if the arguments are not hashable."""
+    signature = inspect.signature(layer_cls.__init__)
+    bound = signature.bind(None, *args, **kwargs)
+    bound.apply_defaults()
+
+    items = []
+    for name, value in list(bound.arguments.items())[1:]:
+        if signature.parameters[name].kind == inspect.Parameter.VAR_KEYWORD:
+            items.extend((k, _normalize(v)) for k, v in sorted(value.items()))
+        else:
+            items.append((name, _normalize(value)))
+    key = (layer_cls, tuple(items))
+
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def get_layer(layer_cls, *args, **kwargs):
+    """
+    Return a layer of the given class created with the given arguments, e.g. `get_layer(SMPLLayer, gender='male')`.
+    Layers are shared between all callers in this process that ask for the same class and arguments, so the body
+    model is only loaded from disk once as long as a sequence is still using it. Shared layers must not be modified.
+    This is thread-safe.
+    :param layer_cls: The class of the layer, e.g. `SMPLLayer` or `STARLayer`.
+    :param args: Positional arguments passed to the constructor of the layer.
+    :param kwargs: Keyword arguments passed to the constructor of the layer.
+    :return: The shared layer.
+    """
+    key = _layer_key(layer_cls, args, kwargs)
+    if key is None:
+        # Arguments that are not hashable, e.g. arrays, cannot be compared so the layer is not shared.
+        return layer_cls(*args, **kwargs)
+
+    with _lock:
+        layer = _layers.get(key)
+        if layer is None:
+            layer = layer_cls(*args, **kwargs)
+            _layers[key] = layer
+        return layer
+
+
+def clear_layers():
+    """Forget all shared layers, layers that are still in use are not affected but won't be shared anymore."""
+    with _lock:
+        _layers.clear()
@@ -16,8 +16,10 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 from abc import ABC
 import collections
+import copy
 import numpy as np
 import smplx
+import threading
 import torch
 import torch.nn as nn
 import trimesh
@@ -56,6 +58,13 @@ class SMPLLayer(nn.Module, ABC):
         self.bm = smplx.create(C.smplx_models, model_type=model_type,
                                num_betas=self.num_betas, gender=gender, **smpl_model_params)
         self.bm.to(device=device, dtype=dtype)
+        self.dtype = dtype
+
+        # Copies of the body model in reduced precision for inference, created on demand.
+        self._inference_bms = {}
+        self._unsupported_dtypes = set()
+        # Layers are shared between sequences and threads, see `get_layer`, this guards the state above.
+        self._inference_lock = threading.Lock()
 
         self.model_type = model_type
         self._parents = None
@@ -145,17 +154,24 @@ class SMPLLayer(nn.Module, ABC):
           facial expressions.
         :return: The resulting vertices and joints.
         """
-        assert poses_body.shape[1] == self.bm.NUM_BODY_JOINTS*3
+        return self._fk(self.bm, poses_body, betas, poses_root, trans, normalize_root, poses_left_hand,
+                        poses_right_hand, poses_jaw, poses_leye, poses_reye, expression)
+
+    def _fk(self, bm, poses_body, betas, poses_root=None, trans=None,
+            normalize_root=False, poses_left_hand=None, poses_right_hand=None,
+            poses_jaw=None, poses_leye=None, poses_reye=None, expression=None):
+        """Evaluate the given body model, see `fk`."""
+        assert poses_body.shape[1] == bm.NUM_BODY_JOINTS*3
 
-        has_hands = hasattr(self.bm, 'NUM_HAND_JOINTS')
-        has_face = hasattr(self.bm, 'NUM_FACE_JOINTS')
+        has_hands = hasattr(bm, 'NUM_HAND_JOINTS')
+        has_face = hasattr(bm, 'NUM_FACE_JOINTS')
         if has_hands:
-            if self.bm.use_pca:
-                dof_per_hand = self.bm.num_pca_comps
+            if bm.use_pca:
+                dof_per_hand = bm.num_pca_comps
                 assert poses_left_hand is None or poses_left_hand.shape[1] == dof_per_hand
                 assert poses_right_hand is None or poses_right_hand.shape[1] == dof_per_hand
             else:
-                dof_per_hand = self.bm.NUM_HAND_JOINTS*3
+                dof_per_hand = bm.NUM_HAND_JOINTS*3
                 assert poses_left_hand is None or poses_left_hand.shape[1] == dof_per_hand
                 assert poses_right_hand is None or poses_right_hand.shape[1] == dof_per_hand
         else:
@@ -182,8 +198,8 @@ class SMPLLayer(nn.Module, ABC):
         if has_face and poses_reye is None:
             poses_reye = torch.zeros([batch_size, 3]).to(dtype=poses_body.dtype, device=device)
         if has_face and expression is None:
-            expression = torch.zeros([batch_size, self.bm.num_expression_coeffs]).to(dtype=poses_body.dtype,
-                                                                                     device=device)
+            expression = torch.zeros([batch_size, bm.num_expression_coeffs]).to(dtype=poses_body.dtype,
+                                                                                device=device)
 
         # Batch shapes if they don't match batch dimension.
         if len(betas.shape) == 1 or betas.shape[0] == 1:
@@ -199,12 +215,48 @@ class SMPLLayer(nn.Module, ABC):
             trans = torch.matmul(first_root_ori.unsqueeze(0), trans.unsqueeze(-1)).squeeze()
             trans = trans - trans[0:1]
 
-        output = self.bm(body_pose=poses_body, betas=betas, global_orient=poses_root, transl=trans,
-                         left_hand_pose=poses_left_hand, right_hand_pose=poses_right_hand,
-                         jaw_pose=poses_jaw, leye_pose=poses_leye, reye_pose=poses_reye, expression=expression)
+        output = bm(body_pose=poses_body, betas=betas, global_orient=poses_root, transl=trans,
+                    left_hand_pose=poses_left_hand, right_hand_pose=poses_right_hand,
+                    jaw_pose=poses_jaw, leye_pose=poses_leye, reye_pose=poses_reye, expression=expression)
 
         return output.vertices, output.joints
 
+    def _get_inference_bm(self, dtype):
+        with self._inference_lock:
+            if dtype not in self._inference_bms:
+                self._inference_bms[dtype] = copy.deepcopy(self.bm).to(dtype=dtype)
+            return self._inference_bms[dtype]
+
+    def fk_inference(self, compute_dtype=None, **kwargs):
+        """
+        Evaluate the forward kinematics for visualization, i.e. with autograd disabled such that no intermediate
+        results are kept in memory. Use `fk` if gradients are required, e.g. for fitting.
+        :param compute_dtype: The floating point type the body model is evaluated in, e.g. torch.float16 or
+          torch.bfloat16. If None `C.inference_precision` is used. If the type is not supported by the device the
+          layer's own precision is used instead.
+        :param kwargs: The arguments of `fk`.
+        :return: The resulting vertices and joints in the layer's precision.
+        """
+        if compute_dtype is None:
+            compute_dtype = getattr(torch, C.inference_precision)
+
+        with torch.inference_mode():
+            if compute_dtype != self.dtype and compute_dtype not in self._unsupported_dtypes:
+                try:
+                    bm = self._get_inference_bm(compute_dtype)
+                    args = {k: v.to(dtype=compute_dtype) if isinstance(v, torch.Tensor) and v.is_floating_point()
+                            else v for k, v in kwargs.items()}
+                    verts, joints = self._fk(bm, **args)
+                    return verts.to(dtype=self.dtype), joints.to(dtype=self.dtype)
+                except RuntimeError as e:
+                    # Some operations are not implemented in reduced precision on every device.
+                    print("Evaluating the body model in {} failed, using {} instead: {}".format(
+                        compute_dtype, self.dtype, e))
+                    with self._inference_lock:
+                        self._unsupported_dtypes.add(compute_dtype)
+                        self._inference_bms.pop(compute_dtype, None)
+            return self._fk(self.bm, **kwargs)
+
     def forward(self, *args, **kwargs):
         """
         Forward pass using forward kinematics
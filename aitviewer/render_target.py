@@ -0,0 +1,102 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import numpy as np
+
+
+class OffscreenTarget(object):
+    """
+    An offscreen framebuffer of arbitrary size that frames can be rendered to independently of the window size.
+    With supersampling the frame is rendered at a multiple of the output size and downsampled on the GPU by
+    building the mipmap chain of the color texture, the output is then read from the matching mipmap level.
+    """
+
+    def __init__(self, ctx, width, height, supersampling=1):
+        """
+        Initializer.
+        :param ctx: The moderngl context.
+        :param width: Width of the output in pixels.
+        :param height: Height of the output in pixels.
+        :param supersampling: Number of rendered pixels per output pixel along each axis, must be a power of two.
+        """
+        assert supersampling >= 1 and (supersampling & (supersampling - 1)) == 0, \
+            "Supersampling factor must be a power of two."
+
+        self.ctx = ctx
+        self.size = (int(width), int(height))
+        self.supersampling = supersampling
+        self.render_size = (self.size[0] * supersampling, self.size[1] * supersampling)
+        self.level = int(np.log2(supersampling))
+
+        self.color = ctx.texture(self.render_size, 4)
+        self.depth = ctx.depth_texture(self.render_size)
+        self.fbo = ctx.framebuffer(color_attachments=[self.color], depth_attachment=self.depth)
+
+        # Outline rendering
+        self.outline_texture = ctx.texture(self.render_size, 1, dtype='f4')
+        self.outline_framebuffer = ctx.framebuffer(color_attachments=[self.outline_texture])
+
+        # Buffers for object ids, triangle ids and view space positions at the output size, created on demand.
+        self.id_framebuffer = None
+
+    def create_id_buffers(self):
+        """Create the buffers the fragment map and the id mask are rendered to, if they don't exist yet."""
+        if self.id_framebuffer is not None:
+            return
+        self.viewpos_texture = self.ctx.texture(self.size, 4, dtype='f4')
+        self.obj_info_texture = self.ctx.texture(self.size, 4, dtype='f4')
+        self.id_depth = self.ctx.depth_texture(self.size)
+        self.id_framebuffer = self.ctx.framebuffer(color_attachments=[self.viewpos_texture, self.obj_info_texture],
+                                                   depth_attachment=self.id_depth)
+        self.mask_texture = self.ctx.texture(self.size, 4)
+        self.mask_framebuffer = self.ctx.framebuffer(color_attachments=[self.mask_texture])
+
+    def use(self):
+        self.fbo.use()
+
+    def resolve(self):
+        """Downsample the rendered frame to the output size."""
+        if self.level > 0:
+            self.color.build_mipmaps(0, self.level)
+
+    def read(self):
+        """Return the RGBA bytes of the frame at the output size, bottom row first."""
+        self.resolve()
+        return self.color.read(level=self.level, alignment=1)
+
+    def read_into(self, buffer):
+        """Read the RGBA bytes of the frame at the output size into the given buffer without waiting for the GPU."""
+        self.resolve()
+        self.color.read_into(buffer, level=self.level, alignment=1)
+
+    def read_depth(self):
+        """Return the depth buffer as a np array of shape (H, W) at the output size, bottom row first."""
+        depth = np.frombuffer(self.depth.read(alignment=1), dtype=np.float32)
+        depth = depth.reshape(self.render_size[1], self.render_size[0])
+        s = self.supersampling
+        return depth[s // 2::s, s // 2::s]
+
+    def release(self):
+        self.fbo.release()
+        self.color.release()
+        self.depth.release()
+        self.outline_framebuffer.release()
+        self.outline_texture.release()
+        if self.id_framebuffer is not None:
+            for r in [self.id_framebuffer, self.viewpos_texture, self.obj_info_texture, self.id_depth,
+                      self.mask_framebuffer, self.mask_texture]:
+                r.release()
+            self.id_framebuffer = None
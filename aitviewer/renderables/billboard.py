@@ -19,10 +19,12 @@ import moderngl
 import numpy as np
 import pickle
 
+from aitviewer.configuration import CONFIG as C
 from aitviewer.scene.camera import Camera, OpenCVCamera
 from aitviewer.scene.node import Node
 from aitviewer.shaders import get_screen_texture_program
 from aitviewer.utils.decorators import hooked
+from aitviewer.utils.video_reader import VideoReader
 from moderngl_window.opengl.vao import VAO
 from trimesh.triangles import points_to_barycentric
 from typing import List
@@ -45,12 +47,13 @@ class Billboard(Node):
         :param img_process_fn: A function with signature f(img, current_frame_id) -> img. This function is called
             once per image before it is displayed so it can be used to process the image in any way.
         """
-        super(Billboard, self).__init__(n_frames=len(texture_paths), icon=icon, **kwargs)
+        n_frames = kwargs.pop('n_frames', None) or len(texture_paths)
+        super(Billboard, self).__init__(n_frames=n_frames, icon=icon, **kwargs)
 
         if len(vertices.shape) == 2:
             vertices = vertices[np.newaxis]
         else:
-            assert vertices.shape[0] == 1 or vertices.shape[0] == len(texture_paths), "the length of the sequence of vertices must be 1 or match the number of textures"
+            assert vertices.shape[0] == 1 or vertices.shape[0] == n_frames, "the length of the sequence of vertices must be 1 or match the number of textures"
 
         center = np.mean(vertices, axis=(0, 1))
         self.vertices = vertices - center
@@ -85,18 +88,18 @@ class Billboard(Node):
         """
         # Load a single image so we can determine the aspect ratio.
         img = cv2.imread(texture_paths[0])
-        ar = img.shape[1] / img.shape[0]
+        billboard = cls(cls._default_corners(img.shape[1] / img.shape[0], scale), texture_paths, **kwargs)
+        return billboard
 
-        corners = np.array([
+    @staticmethod
+    def _default_corners(ar, scale):
+        return np.array([
             [1 * ar, 1, 0],
             [1 * ar, -1, 0],
             [-1 * ar, 1, 0],
             [-1 * ar, -1, 0],
         ]) * scale
 
-        billboard = cls(corners, texture_paths, **kwargs)
-        return billboard
-
     @classmethod
     def from_camera_and_distance(cls, camera: Camera, distance: float, cols: int, rows: int,
                                  texture_paths: List[str], image_process_fn=None):
@@ -165,7 +168,11 @@ class Billboard(Node):
 
         self.ctx = ctx
 
-    def render(self, camera, **kwargs):
+    def update_texture(self, block=False):
+        """
+        Load the image of the current frame into the texture if it is not there yet.
+        :param block: Whether to wait for the image if it is loaded in the background, e.g. when exporting.
+        """
         if self.current_frame_id != self._current_texture_id:
             if self.texture:
                 self.texture.release()
@@ -179,6 +186,12 @@ class Billboard(Node):
             self.texture = self.ctx.texture((img.shape[1], img.shape[0]), img.shape[2], img.tobytes())
             self._current_texture_id = self.current_frame_id
 
+    def render(self, camera, **kwargs):
+        # Exported frames must show the image of their frame, so wait for it.
+        self.update_texture(block=kwargs.get('export', False))
+        if self.texture is None:
+            return
+
         self.prog['transparency'] = self.texture_alpha
         self.prog['texture0'].value = 0
         self.texture.use(0)
@@ -232,3 +245,68 @@ class Billboard(Node):
     def gui_material(self, imgui, show_advanced=True):
         _, self.texture_alpha = imgui.slider_float('Texture alpha##texture_alpha{}'.format(self.unique_name),
                                                    self.texture_alpha, 0.0, 1.0, '%.2f')
+
+
+class VideoBillboard(Billboard):
+    """
+    A billboard displaying a video file in sync with the scene. Frames are decoded in a background thread and
+    looked up by time, so the video can have a different frame rate than the scene. When scrubbing, the last decoded
+    frame is shown until the requested one is available.
+    """
+
+    def __init__(self, vertices, video_path, fps=None, offset=0.0, blocking=False, cache_size=64, read_ahead=16,
+                 **kwargs):
+        """
+        Initializer.
+        :param vertices: A np array of 4 billboard vertices in world space coordinates of shape (4, 3).
+        :param video_path: Path to the video file.
+        :param fps: The frame rate of the scene, defaults to the one in the configuration.
+        :param offset: Time in seconds in the video that corresponds to the first frame of the scene.
+        :param blocking: Whether to wait for the decoder such that every rendered frame shows the correct video frame.
+          Exported frames always wait, otherwise rendering never waits.
+        :param cache_size: Maximum number of decoded frames kept in memory.
+        :param read_ahead: Number of video frames after the current one that are decoded ahead of time.
+        """
+        self.reader = VideoReader(video_path, cache_size, read_ahead)
+        self.fps = fps or C.scene_fps
+        self.offset = offset
+        self.blocking = blocking
+        n_frames = max(1, int((self.reader.n_frames / self.reader.fps - offset) * self.fps))
+        super(VideoBillboard, self).__init__(vertices, None, n_frames=n_frames, **kwargs)
+
+    @classmethod
+    def from_video(cls, video_path, scale=1.0, **kwargs):
+        """Initialize a VideoBillboard at the default location."""
+        cap = cv2.VideoCapture(video_path)
+        ar = cap.get(cv2.CAP_PROP_FRAME_WIDTH) / cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+        cap.release()
+        return cls(cls._default_corners(ar, scale), video_path, **kwargs)
+
+    def video_frame_id(self, frame_id):
+        """The index of the video frame shown at the given scene frame."""
+        return int(round((frame_id / self.fps + self.offset) * self.reader.fps))
+
+    def update_texture(self, block=False):
+        frame_id = self.video_frame_id(self.current_frame_id)
+        if frame_id == self._current_texture_id:
+            return
+        img = self.reader.get(frame_id, block=self.blocking or block)
+        if img is None:
+            return
+        img = self.img_process_fn(img, self.current_frame_id)
+        if self.texture is None or self.texture.size != (img.shape[1], img.shape[0]):
+            if self.texture:
+                self.texture.release()
+            self.texture = self.ctx.texture((img.shape[1], img.shape[0]), img.shape[2])
+        self.texture.write(img.tobytes())
+        self._current_texture_id = frame_id
+        self._geometry_version += 1
+
+    @hooked
+    def release(self):
+        self.reader.close()
+
+    def gui(self, imgui):
+        imgui.text("Video: {}x{} @ {:.2f} fps".format(self.reader.width, self.reader.height, self.reader.fps))
+        imgui.text("Frame {} of {}".format(self._current_texture_id, self.reader.n_frames))
+        _, self.blocking = imgui.checkbox('Wait for decoder##blocking{}'.format(self.unique_name), self.blocking)
@@ -331,6 +331,7 @@ class Meshes(Node):
 
     def redraw(self, **kwargs):
         self._need_upload = True
+        self._geometry_version += 1
 
     # noinspection PyAttributeOutsideInit
     @Node.once
@@ -17,15 +17,48 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import numpy as np
 import moderngl
 
+from aitviewer.configuration import CONFIG as C
 from aitviewer.scene.node import Node
 from aitviewer.shaders import get_simple_unlit_program
 from aitviewer.utils.decorators import hooked
 from moderngl_window.opengl.vao import VAO
 
 
+def pack_ragged(arrays, dim):
+    """
+    Concatenate a sequence of arrays with a varying number of rows into a single contiguous float32 array.
+    :param arrays: A list of np arrays of shape (N_i, dim) or a np array of shape (F, N, dim).
+    :param dim: The size of the last dimension.
+    :return: The packed array of shape (sum(N_i), dim) and the offsets of each frame of shape (F+1, ).
+    """
+    if isinstance(arrays, np.ndarray) and arrays.ndim == 3:
+        counts = np.full(arrays.shape[0], arrays.shape[1], dtype=np.int64)
+        packed = np.ascontiguousarray(arrays.reshape(-1, dim), dtype=np.float32)
+    else:
+        counts = np.array([len(a) for a in arrays], dtype=np.int64)
+        if len(arrays) > 0:
+            packed = np.concatenate([np.asarray(a, dtype=np.float32).reshape(-1, dim) for a in arrays], axis=0)
+        else:
+            packed = np.zeros((0, dim), dtype=np.float32)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return packed, offsets
+
+
+def unpack_ragged(packed, offsets, like=None):
+    """Return views of the frames of a packed array, as an array if `like` is an array of shape (F, N, dim)."""
+    if isinstance(like, np.ndarray) and like.ndim == 3:
+        return packed.reshape(like.shape[0], like.shape[1], packed.shape[1])
+    return np.split(packed, offsets[1:-1])
+
+
 class PointClouds(Node):
     """
     Draw a point clouds man!
+
+    The points of all frames are stored in a single packed float32 array together with the offset of each frame. If
+    the sequence fits into `C.point_cloud_gpu_budget` it is uploaded to the GPU once and playing it back only changes
+    the range of points that is drawn, otherwise the points of the current frame are uploaded on every frame change.
     """
 
     def __init__(self,
@@ -56,7 +89,6 @@ class PointClouds(Node):
 
         self.colors = colors
         self.point_size = point_size
-        self.max_n_points = max([p.shape[0] for p in self.points])
 
         self.vao = VAO("points", mode=moderngl.POINTS)
 
@@ -69,9 +101,12 @@ class PointClouds(Node):
 
     @points.setter
     def points(self, points):
-        self._points = points
-        self.n_frames = len(points)
-        self.max_n_points = max([p.shape[0] for p in self.points])
+        self._packed_points, self._offsets = pack_ragged(points, 3)
+        self._points = unpack_ragged(self._packed_points, self._offsets, like=points)
+        self._counts = np.diff(self._offsets)
+        self.n_frames = len(self._counts)
+        self.max_n_points = int(self._counts.max(initial=0))
+        self._uploaded = False
 
     @property
     def colors(self):
@@ -81,15 +116,20 @@ class PointClouds(Node):
     def colors(self, colors):
         # Colors cannot be empty
         if colors is None:
-            self._colors = [self.color]
-        elif isinstance(colors, tuple) and len(colors) == 4:
+            colors = tuple(self.color)
+        if isinstance(colors, tuple) and len(colors) == 4:
             self._colors = [colors]
-        elif isinstance(colors, list):
+            self._packed_colors = None
+            self._uniform_colors = None
+        elif isinstance(colors, list) or isinstance(colors, np.ndarray):
             assert len(colors) == self.n_frames
             assert colors[0].shape[-1] == 4
-            self._colors = colors
+            self._packed_colors, offsets = pack_ragged(colors, 4)
+            assert np.array_equal(offsets, self._offsets), "The number of colors must match the number of points."
+            self._colors = unpack_ragged(self._packed_colors, offsets, like=colors)
         else:
             raise ValueError("Invalid colors: {}".format(colors))
+        self._uploaded = False
 
     @Node.color.setter
     def color(self, color):
@@ -99,16 +139,14 @@ class PointClouds(Node):
         # though to change the alpha, even if a point cloud has per-point colors.
         self.material.color = color
         if self.is_renderable:
-            single_color = isinstance(self.colors[0], tuple) and len(self.colors[0]) == 4
-            if single_color:
+            if self._packed_colors is None:
                 self.colors = tuple(color)
             else:
-                # Only update the colors if the alpha changed. Take any frame and any point to check if the alpha
-                # changed because we always change every frame and every point.
-                alpha_changed = abs(color[-1] - self.colors[0][0, -1]) > 0
+                # Only update the colors if the alpha changed. Take any point to check if the alpha changed because we
+                # always change every frame and every point.
+                alpha_changed = len(self._packed_colors) > 0 and abs(color[-1] - self._packed_colors[0, -1]) > 0
                 if alpha_changed:
-                    for i in range(self.n_frames):
-                        self.colors[i][..., -1] = color[-1]
+                    self._packed_colors[:, -1] = color[-1]
         self.redraw()
 
     @property
@@ -118,50 +156,87 @@ class PointClouds(Node):
 
     @property
     def current_colors(self):
-        if len(self.colors) == 1:
+        if self._packed_colors is None:
+            # Uniform colors for the largest frame, all frames use a prefix of it.
             n_points = self.current_points.shape[0]
-            return np.full((n_points, 4), self.colors[0])
+            if self._uniform_colors is None or len(self._uniform_colors) < n_points:
+                self._uniform_colors = np.tile(np.array(self._colors[0], dtype=np.float32), (self.max_n_points, 1))
+            return self._uniform_colors[:n_points]
         else:
             idx = self.current_frame_id if len(self.colors) > 1 else 0
             return self.colors[idx]
 
     @property
     def bounds(self):
-        if len(self.points) == 0:
+        if len(self._packed_points) == 0:
             return np.array([[0, 0], [0, 0], [0, 0]])
-
-        bounds = np.array([[np.inf, np.NINF], [np.inf, np.NINF], [np.inf, np.NINF]])
-        for i in range(len(self.points)):
-            b = self.get_bounds(self.points[i])
-            bounds[:, 0] = np.minimum(bounds[:, 0], b[:, 0])
-            bounds[:, 1] = np.maximum(bounds[:, 1], b[:, 1])
-        return bounds
+        return self.get_bounds(self._packed_points)
 
     @property
     def current_bounds(self):
         return self.get_bounds(self.current_points)
 
+    @property
+    def nbytes(self):
+        """The size of the points and colors of all frames in bytes once uploaded to the GPU."""
+        return len(self._packed_points) * (3 + 4) * 4
+
+    @property
+    def is_gpu_resident(self):
+        """Whether all frames are kept on the GPU, which is the case if they fit into `C.point_cloud_gpu_budget`."""
+        return self.nbytes <= C.point_cloud_gpu_budget * 1024 * 1024
+
+    @property
+    def draw_range(self):
+        """The index of the first point in the GPU buffers and the number of points drawn for the current frame."""
+        idx = self.current_frame_id if len(self.points) > 1 else 0
+        count = int(self._counts[idx])
+        if self.is_gpu_resident:
+            return int(self._offsets[idx]), count
+        return 0, count
+
     def on_frame_update(self):
         """Called whenever a new frame must be displayed."""
         super().on_frame_update()
-        self.redraw()
-
-    def redraw(self, **kwargs):
-        """Upload the current frame data to the GPU for rendering."""
         if not self.is_renderable:
             return
+        self._geometry_version += 1
+        # Resident sequences only draw a different range of the buffers.
+        if not self.is_gpu_resident:
+            self._upload_current_frame()
 
-        points = self.current_points.astype('f4').tobytes()
-        colors = self.current_colors.astype('f4').tobytes()
+    def _upload_all(self):
+        colors = self._packed_colors
+        if colors is None:
+            colors = np.tile(np.array(self._colors[0], dtype=np.float32), (len(self._packed_points), 1))
+        self._write(self._packed_points, colors)
 
+    def _upload_current_frame(self):
+        self._write(self.current_points, self.current_colors)
+
+    def _write(self, points, colors):
         # Resize the VBOs if necessary. This can happen if new points are set after the `make_renderable` has been
-        # called.
-        if self.max_n_points * 3 * 4 > self.vbo_points.size:
-            self.vbo_points.orphan(self.max_n_points * 3 * 4)
-            self.vbo_colors.orphan(self.max_n_points * 4 * 4)
+        # called or if the sequence switched between being resident and being streamed.
+        if points.nbytes > self.vbo_points.size:
+            self.vbo_points.orphan(points.nbytes)
+            self.vbo_colors.orphan(colors.nbytes)
+        if len(points) > 0:
+            self.vbo_points.write(np.ascontiguousarray(points))
+            self.vbo_colors.write(np.ascontiguousarray(colors))
+
+    def _upload(self):
+        if self.is_gpu_resident:
+            self._upload_all()
+        else:
+            self._upload_current_frame()
+        self._uploaded = True
 
-        self.vbo_points.write(points)
-        self.vbo_colors.write(colors)
+    def redraw(self, **kwargs):
+        """Upload the data to the GPU for rendering, either all frames or only the current one."""
+        if not self.is_renderable:
+            return
+        self._geometry_version += 1
+        self._upload()
 
     def _clear_buffer(self):
         self.vbo_points.clear()
@@ -172,10 +247,10 @@ class PointClouds(Node):
     def make_renderable(self, ctx):
         ctx.point_size = self.point_size
         self.prog = get_simple_unlit_program()
-        self.vbo_points = ctx.buffer(reserve=self.max_n_points * 3 * 4, dynamic=True)
-        self.vbo_colors = ctx.buffer(reserve=self.max_n_points * 4 * 4, dynamic=True)
-        self.vbo_points.write(self.current_points.astype('f4').tobytes())
-        self.vbo_colors.write(self.current_colors.astype('f4').tobytes())
+        n_points = len(self._packed_points) if self.is_gpu_resident else self.max_n_points
+        self.vbo_points = ctx.buffer(reserve=max(n_points, 1) * 3 * 4, dynamic=True)
+        self.vbo_colors = ctx.buffer(reserve=max(n_points, 1) * 4 * 4, dynamic=True)
+        self._upload()
         self.vao.buffer(self.vbo_points, '3f', ['in_position'])
         self.vao.buffer(self.vbo_colors, '4f', ['in_color'])
 
@@ -183,13 +258,21 @@ class PointClouds(Node):
         self.positions_vao.buffer(self.vbo_points, '3f', ['in_position'])
 
     def render(self, camera, **kwargs):
+        # Upload the data if the points or colors were replaced.
+        if not self._uploaded:
+            self.redraw()
+
         self.set_camera_matrices(self.prog, camera, **kwargs)
-        # Draw only as many points as we have set in the buffer.
-        self.vao.render(self.prog, vertices=len(self.current_points))
+        # Draw only the points of the current frame.
+        first, count = self.draw_range
+        self.vao.render(self.prog, vertices=count, first=first)
 
     def render_positions(self, prog):
         if self.is_renderable:
-            self.positions_vao.render(prog, vertices=len(self.current_points))
+            if not self._uploaded:
+                self.redraw()
+            first, count = self.draw_range
+            self.positions_vao.render(prog, vertices=count, first=first)
 
     @hooked
     def release(self):
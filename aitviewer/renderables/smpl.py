@@ -16,10 +16,12 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import numpy as np
 import pickle as pkl
+import threading
 import torch
 import os
 
 from aitviewer.configuration import CONFIG as C
+from aitviewer.models.registry import get_layer
 from aitviewer.models.smpl import SMPLLayer
 from aitviewer.renderables.meshes import Meshes
 from aitviewer.renderables.skeletons import Skeletons
@@ -35,11 +37,17 @@ from aitviewer.utils import to_torch
 from aitviewer.utils import local_to_global
 from aitviewer.utils import interpolate_positions
 from aitviewer.utils import to_numpy as c2c
+from aitviewer.utils import load_npz_window
 from scipy.spatial.transform import Rotation
 from smplx.joint_names import JOINT_NAMES, SMPLH_JOINT_NAMES
+from contextlib import contextmanager
 from typing import Union, IO
 
 
+# Sequences whose construction is deferred until the end of a `batch_construction` block, per thread.
+_deferred = threading.local()
+
+
 class SMPLSequence(Node):
     """
     Represents a temporal sequence of SMPL poses. Can be loaded from disk or initialized from memory.
@@ -144,8 +152,18 @@ class SMPLSequence(Node):
         self._edit_pose = None
         self._edit_pose_dirty = False
 
-        # Nodes
-        self.vertices, self.joints, self.faces, self.skeleton = self.fk()
+        # Inside a `batch_construction` block the forward kinematics of all sequences are evaluated together at the
+        # end of the block, and the child nodes are only created then.
+        deferred = getattr(_deferred, 'sequences', None)
+        if deferred is not None:
+            deferred.append(self)
+        else:
+            self._create_nodes(*self.fk())
+
+    def _create_nodes(self, vertices, joints, faces, skeleton):
+        """Create the child nodes from the result of the forward kinematics."""
+        self.vertices, self.joints, self.faces, self.skeleton = vertices, joints, faces, skeleton
+        kwargs = self._render_kwargs
 
         if self._is_rigged:
             self.skeleton_seq = Skeletons(self.joints, self.skeleton, gui_affine=False,
@@ -183,12 +201,25 @@ class SMPLSequence(Node):
                    log=True,
                    fps_out=None,
                    z_up=True,
+                   resample_method='spline',
+                   frame_ids=None,
                    **kwargs):
-        """Load a sequence downloaded from the AMASS website."""
+        """
+        Load a sequence downloaded from the AMASS website.
+        :param resample_method: How poses are interpolated if `fps_out` differs from the frame rate of the sequence,
+          see `interpolate_rotations`.
+        :param frame_ids: Optional indices of the frames to load relative to `start_frame`, e.g. a few keyframes of a
+          long sequence. Cannot be combined with `fps_out`.
+        """
+        if frame_ids is not None and fps_out is not None:
+            raise ValueError("Selecting frames with 'frame_ids' cannot be combined with resampling.")
 
-        body_data = np.load(npz_data_path)
+        # Only read the requested frames from disk, which matters for short clips of long captures.
+        body_data = load_npz_window(npz_data_path, start_frame or None, end_frame or None,
+                                    keys=('poses', 'trans', 'betas', 'gender', 'mocap_frame_rate'))
         if smpl_layer is None:
-            smpl_layer = SMPLLayer(
+            smpl_layer = get_layer(
+                SMPLLayer,
                 model_type=C.body.type, gender=body_data['gender'].item(), 
                 device=C.device, num_betas=C.body.num_betas
             )
@@ -201,16 +232,16 @@ class SMPLSequence(Node):
             print('Gender {}'.format(body_data['gender']))
             print('FPS {}'.format(body_data['mocap_frame_rate']))
 
-        sf = start_frame or 0
-        ef = end_frame or body_data['poses'].shape[0]
-        poses = body_data['poses'][sf:ef]
-        trans = body_data['trans'][sf:ef]
+        poses = body_data['poses']
+        trans = body_data['trans']
+        if frame_ids is not None:
+            poses, trans = poses[frame_ids], trans[frame_ids]
 
         if fps_out is not None:
             fps_in = body_data['mocap_frame_rate'].tolist()
             if fps_in != fps_out:
                 ps = np.reshape(poses, [poses.shape[0], -1, 3])
-                ps_new = resample_rotations(ps, fps_in, fps_out)
+                ps_new = resample_rotations(ps, fps_in, fps_out, resample_method)
                 poses = np.reshape(ps_new, [-1, poses.shape[1]])
                 trans = resample_positions(trans, fps_in, fps_out)
 
@@ -229,7 +260,8 @@ class SMPLSequence(Node):
 
     @classmethod
     def empty(cls, gender: str=C.body.gender, z_up=True, **kwargs):
-        smpl_layer = SMPLLayer(
+        smpl_layer = get_layer(
+            SMPLLayer,
             model_type=C.body.type, gender=C.body.gender, 
             device=C.device, num_betas=C.body.num_betas
         )
@@ -250,7 +282,8 @@ class SMPLSequence(Node):
 
     @classmethod
     def empty_from(cls, sequence, gender: str=C.body.gender, z_up=True, **kwargs):
-        smpl_layer = SMPLLayer(
+        smpl_layer = get_layer(
+            SMPLLayer,
             model_type=C.body.type, gender=C.body.gender, 
             device=C.device, num_betas=C.body.num_betas
         )
@@ -277,7 +310,8 @@ class SMPLSequence(Node):
         num_people = len(body_data['poses'])
 
         if smplx_neutral:
-            smpl_layer = SMPLLayer(
+            smpl_layer = get_layer(
+                SMPLLayer,
                 model_type=C.body.type, gender=C.body.gender, 
                 num_betas=C.body.num_betas, flat_hand_mean=True
             )
@@ -288,31 +322,34 @@ class SMPLSequence(Node):
 
         name = kwargs.get('name', '3DPW')
 
+        # Evaluate the forward kinematics of all people together.
         seqs = []
-        for i in range(num_people):
-            # gender = body_data['genders'][i]
-            if not smplx_neutral:
-                smpl_layer = SMPLLayer(
-                    model_type=C.body.type, gender=C.body.gender, 
-                    device=C.device, num_betas=C.body.num_betas
-                )
-
-            # Extract the 30 Hz data that is already aligned with the image data.
-            poses = body_data[poses_key][i]
-            trans = body_data[trans_key][i]
-            betas = body_data[betas_key][i]
-
-            if len(betas.shape) == 1:
-                betas = betas[np.newaxis]
-
-            poses_body = poses[:, 3:]
-            poses_root = poses[:, :3]
-            trans_root = trans
-
-            kwargs['name'] = name + " S{}".format(i)
-            seq = cls(poses_body=poses_body, poses_root=poses_root, trans=trans_root,
-                      smpl_layer=smpl_layer, betas=betas, **kwargs)
-            seqs.append(seq)
+        with batch_construction():
+            for i in range(num_people):
+                # gender = body_data['genders'][i]
+                if not smplx_neutral:
+                    smpl_layer = get_layer(
+                        SMPLLayer,
+                        model_type=C.body.type, gender=C.body.gender, 
+                        device=C.device, num_betas=C.body.num_betas
+                    )
+
+                # Extract the 30 Hz data that is already aligned with the image data.
+                poses = body_data[poses_key][i]
+                trans = body_data[trans_key][i]
+                betas = body_data[betas_key][i]
+
+                if len(betas.shape) == 1:
+                    betas = betas[np.newaxis]
+
+                poses_body = poses[:, 3:]
+                poses_root = poses[:, :3]
+                trans_root = trans
+
+                kwargs['name'] = name + " S{}".format(i)
+                seq = cls(poses_body=poses_body, poses_root=poses_root, trans=trans_root,
+                          smpl_layer=smpl_layer, betas=betas, **kwargs)
+                seqs.append(seq)
 
         return seqs
 
@@ -321,7 +358,8 @@ class SMPLSequence(Node):
         """Creates a SMPL sequence whose single frame is a SMPL mesh in T-Pose."""
 
         if smpl_layer is None:
-            smpl_layer = SMPLLayer(
+            smpl_layer = get_layer(
+                SMPLLayer,
                 model_type=C.body.type, gender=C.body.gender,
                 num_betas=C.body.num_betas, device=C.device,
             )
@@ -333,7 +371,8 @@ class SMPLSequence(Node):
     def from_npz(cls, file: Union[IO, str], smpl_layer: SMPLLayer=None, **kwargs):
         """Creates a SMPL sequence from a .npz file exported through the 'export' function."""
         if smpl_layer is None:
-            smpl_layer = SMPLLayer(
+            smpl_layer = get_layer(
+                SMPLLayer,
                 model_type=C.body.type, gender=C.body.gender,
                 num_betas=C.body.num_betas, device=C.device,
             )
@@ -384,8 +423,8 @@ class SMPLSequence(Node):
     def _edit_mode(self):
         return self.selected_mode == 'edit'
 
-    def fk(self, current_frame_only=False):
-        """Get joints and/or vertices from the poses."""
+    def _fk_inputs(self, current_frame_only=False):
+        """Return the keyword arguments of the SMPL layer for the whole sequence or the current frame only."""
         if current_frame_only:
             # Use current frame data.
             if self._edit_mode:
@@ -420,16 +459,19 @@ class SMPLSequence(Node):
             trans = self.trans
             betas = self.betas
 
-        verts, joints = self.smpl_layer(poses_root=poses_root,
-                                        poses_body=poses_body,
-                                        poses_left_hand=poses_left_hand,
-                                        poses_right_hand=poses_right_hand,
-                                        betas=betas,
-                                        trans=trans)
+        return dict(poses_root=poses_root,
+                    poses_body=poses_body,
+                    poses_left_hand=poses_left_hand,
+                    poses_right_hand=poses_right_hand,
+                    betas=betas,
+                    trans=trans)
 
+    def _fk_outputs(self, verts, joints, current_frame_only=False):
+        """Post-process the output of the SMPL layer, see `fk`."""
         # Apply post_fk_func if specified.
         if self.post_fk_func:
-            verts, joints = self.post_fk_func(self, verts, joints, current_frame_only)
+            # The outputs are inference tensors which cannot be modified in-place, so pass regular copies.
+            verts, joints = self.post_fk_func(self, verts.clone(), joints.clone(), current_frame_only)
 
         skeleton = self.smpl_layer.skeletons()['body'].T
         faces = self.smpl_layer.bm.faces.astype(np.int64)
@@ -440,11 +482,17 @@ class SMPLSequence(Node):
         else:
             return c2c(verts), c2c(joints), c2c(faces), c2c(skeleton)
 
-    def interpolate(self, frame_ids):
+    def fk(self, current_frame_only=False):
+        """Get joints and/or vertices from the poses."""
+        verts, joints = self.smpl_layer.fk_inference(**self._fk_inputs(current_frame_only))
+        return self._fk_outputs(verts, joints, current_frame_only)
+
+    def interpolate(self, frame_ids, method='spline'):
         """
         Replace the frames at the given frame IDs via an interpolation of its neighbors. Only the body pose as well
         as the root pose and translation are interpolated.
         :param frame_ids: A list of frame ids to be interpolated.
+        :param method: How poses are interpolated, see `interpolate_rotations`.
         """
         ids = np.unique(frame_ids)
         all_ids = np.arange(self.n_frames)
@@ -454,7 +502,7 @@ class SMPLSequence(Node):
         # Interpolate poses.
         all_poses = torch.cat([self.poses_root, self.poses_body], dim=-1)
         ps = np.reshape(all_poses.cpu().numpy(), (self.n_frames, -1, 3))
-        ps_interp = interpolate_rotations(ps[mask_avail], all_ids[mask_avail], ids)
+        ps_interp = interpolate_rotations(ps[mask_avail], all_ids[mask_avail], ids, method)
         all_poses[ids] = torch.from_numpy(ps_interp.reshape(len(ids), -1)).to(dtype=self.betas.dtype,
                                                                               device=self.betas.device)
         self.poses_root = all_poses[:, :3]
@@ -484,7 +532,12 @@ class SMPLSequence(Node):
         current_frame_only = kwargs.get('current_frame_only', False)
 
         # Use the edited pose if in edit mode.
-        vertices, joints, self.faces, self.skeleton = self.fk(current_frame_only)
+        self._update_from_fk(*self.fk(current_frame_only), current_frame_only)
+        super().redraw(**kwargs)
+
+    def _update_from_fk(self, vertices, joints, faces, skeleton, current_frame_only=False):
+        """Update the child nodes with the result of the forward kinematics."""
+        self.faces, self.skeleton = faces, skeleton
 
         if current_frame_only:
             self.vertices[self.current_frame_id] = vertices
@@ -539,8 +592,6 @@ class SMPLSequence(Node):
             # Update mesh
             self.mesh_seq.vertices = vertices
 
-        super().redraw(**kwargs)
-
     @property
     def edit_mode(self):
         return self._edit_mode
@@ -674,3 +725,103 @@ class SMPLSequence(Node):
     def render_outline(self, ctx, camera, prog):
         # Only render outline of the mesh, skipping skeleton and rigid bodies.
         self.mesh_seq.render_outline(ctx, camera, prog)
+
+
+def batch_fk(sequences, current_frame_only=False, max_batch_size=4096):
+    """
+    Evaluate the forward kinematics of many sequences with as few calls to the body models as possible. Sequences that
+    share a SMPL layer are concatenated into one batch and the results are scattered back, which amortizes the
+    per-call overhead that dominates for short sequences or single frames.
+    :param sequences: A list of SMPLSequences.
+    :param current_frame_only: Whether to evaluate only the current frame of every sequence.
+    :param max_batch_size: Maximum number of frames evaluated in one call, longer sequences are evaluated alone.
+    :return: A list with the result of `SMPLSequence.fk` for every sequence.
+    """
+    results = [None] * len(sequences)
+
+    # Group sequences by layer, subclasses with their own forward kinematics (e.g. STAR) are evaluated individually.
+    groups = {}
+    for i, seq in enumerate(sequences):
+        if type(seq).fk is not SMPLSequence.fk:
+            results[i] = seq.fk(current_frame_only)
+        else:
+            groups.setdefault(id(seq.smpl_layer), []).append(i)
+
+    for idxs in groups.values():
+        layer = sequences[idxs[0]].smpl_layer
+        inputs = {i: sequences[i]._fk_inputs(current_frame_only) for i in idxs}
+        sizes = {i: inputs[i]['poses_body'].shape[0] for i in idxs}
+
+        # Split the group into batches of at most max_batch_size frames.
+        batches, batch, n = [], [], 0
+        for i in idxs:
+            if batch and n + sizes[i] > max_batch_size:
+                batches.append(batch)
+                batch, n = [], 0
+            batch.append(i)
+            n += sizes[i]
+        batches.append(batch)
+
+        for batch in batches:
+            batched = {}
+            for k in inputs[batch[0]]:
+                values = [inputs[i][k] for i in batch]
+                ref = next((v for v in values if v is not None), None)
+                if ref is None:
+                    batched[k] = None
+                    continue
+                width = max(v.shape[1] for v in values if v is not None)
+                parts = []
+                for i, v in zip(batch, values):
+                    if v is None:
+                        v = torch.zeros((sizes[i], width), dtype=ref.dtype, device=ref.device)
+                    else:
+                        # Shape parameters may be shared over all frames and may have different lengths.
+                        v = v.to(dtype=ref.dtype, device=ref.device).expand(sizes[i], -1)
+                        v = torch.nn.functional.pad(v, (0, width - v.shape[1]))
+                    parts.append(v)
+                batched[k] = torch.cat(parts)
+
+            verts, joints = layer.fk_inference(**batched)
+            batch_sizes = [sizes[i] for i in batch]
+            for i, v, j in zip(batch, torch.split(verts, batch_sizes), torch.split(joints, batch_sizes)):
+                results[i] = sequences[i]._fk_outputs(v, j, current_frame_only)
+
+    return results
+
+
+def redraw_batched(sequences, current_frame_only=False):
+    """
+    Redraw many sequences, evaluating their forward kinematics together, see `batch_fk`.
+    :param sequences: A list of SMPLSequences.
+    :param current_frame_only: Whether to update only the current frame of every sequence.
+    """
+    for seq, result in zip(sequences, batch_fk(sequences, current_frame_only)):
+        seq._update_from_fk(*result, current_frame_only)
+        super(SMPLSequence, seq).redraw(current_frame_only=current_frame_only)
+
+
+@contextmanager
+def batch_construction():
+    """
+    Context manager that evaluates the forward kinematics of all SMPLSequences created inside the block together when
+    the block exits, see `batch_fk`. The sequences are only fully initialized after the block, e.g.:
+
+        with batch_construction():
+            seqs = [SMPLSequence.from_amass(p) for p in paths]
+        viewer.scene.add(*seqs)
+    """
+    outer = getattr(_deferred, 'sequences', None)
+    if outer is not None:
+        # Nested blocks are evaluated by the outermost one.
+        yield
+        return
+
+    _deferred.sequences = []
+    try:
+        yield
+    finally:
+        sequences = _deferred.sequences
+        _deferred.sequences = None
+    for seq, result in zip(sequences, batch_fk(sequences)):
+        seq._create_nodes(*result)
@@ -18,6 +18,7 @@ import numpy as np
 import torch
 
 from aitviewer.configuration import CONFIG as C
+from aitviewer.models.registry import get_layer
 from aitviewer.models.star import STARLayer
 from aitviewer.renderables.smpl import SMPLSequence
 from aitviewer.utils import to_numpy as c2c
@@ -128,7 +129,7 @@ class STARSequence(SMPLSequence):
             trans = trans[sub_frames]
 
         return cls(poses_body=poses_body,
-                   smpl_layer=STARLayer(device=C.device),
+                   smpl_layer=get_layer(STARLayer, device=C.device),
                    poses_root=poses_root,
                    betas=betas,
                    trans=trans,
@@ -147,7 +148,7 @@ class STARSequence(SMPLSequence):
         """Creates a SMPL sequence whose single frame is a SMPL mesh in T-Pose."""
 
         if model is None:
-            model = STARLayer(device=C.device)
+            model = get_layer(STARLayer, device=C.device)
 
         poses_body = np.zeros([frames, model.n_joints_body * 3])
         poses_root = np.zeros([frames, 3])
@@ -658,6 +658,16 @@ class PinholeCamera(Camera):
     def rotation(self):
         return np.array([-self.right, self.up, -self.forward]).T
 
+    def _update_local_transforms(self, frame_id=None):
+        # The orientation of a pinhole camera is defined by its positions and targets, so update it for all frames.
+        forward = self._targets - self._positions
+        forward = forward / np.linalg.norm(forward, axis=-1, keepdims=True)
+        right = np.cross(self._world_up, forward)
+        right = right / np.linalg.norm(right, axis=-1, keepdims=True)
+        up = np.cross(forward, right)
+        self._rotations = np.stack([-right, up, -forward], axis=-1).astype(np.float32)
+        super(PinholeCamera, self)._update_local_transforms(frame_id)
+
     def update_matrices(self, width, height):
         # Compute projection matrix.
         P = perspective_projection(np.deg2rad(self.fov), width / height, self.near, self.far)
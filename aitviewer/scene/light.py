@@ -20,7 +20,6 @@ from aitviewer.renderables.lines import Lines
 from aitviewer.scene.node import Node
 from aitviewer.scene.camera_utils import look_at
 from aitviewer.scene.camera_utils import orthographic_projection
-from functools import lru_cache
 
 
 class Light(Node):
@@ -43,6 +42,13 @@ class Light(Node):
         self._debug_lines = None
         self._show_debug_lines = False
 
+        # The light matrix is cached for the most recent set of parameters only.
+        self._light_matrix = None
+        self._light_matrix_key = None
+
+        # State of the light and the shadow casters the current shadow map was rendered with.
+        self._shadow_map_key = None
+
     def create_shadowmap(self, ctx):
         if self.shadow_map is None:
             shadow_map_size = 8192, 8192
@@ -61,8 +67,19 @@ class Light(Node):
         self.shadow_map_framebuffer.clear()
         self.shadow_map_framebuffer.use()
 
+    def is_shadow_map_dirty(self, casters_key):
+        """
+        Check if the shadow map must be rendered again and remember the current state, i.e. the caller is expected to
+        render the shadow map if this returns True.
+        :param casters_key: A hashable summary of the state of all shadow casters in the scene.
+        """
+        key = (self._light_matrix_key, casters_key)
+        if self.shadow_map is None or key != self._shadow_map_key:
+            self._shadow_map_key = key
+            return True
+        return False
+
     @staticmethod
-    @lru_cache()
     def _compute_light_matrix(position, size, near, far):
         P = orthographic_projection(size, size, near, far)
         V = look_at(np.array(position), np.array([0.0, 0.0, 0.0]), np.array([0.0, 1.0, 0.0]))
@@ -70,7 +87,11 @@ class Light(Node):
 
     def mvp(self):
         """Return a model-view-projection matrix to project vertices into the view of the light."""
-        return self._compute_light_matrix(tuple(self.position), self.shadow_map_size, self.shadow_map_near, self.shadow_map_far)
+        key = (tuple(self.position), self.shadow_map_size, self.shadow_map_near, self.shadow_map_far)
+        if key != self._light_matrix_key:
+            self._light_matrix = self._compute_light_matrix(*key)
+            self._light_matrix_key = key
+        return self._light_matrix
 
     def _update_debug_lines(self):
         lines = np.array([
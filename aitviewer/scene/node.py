@@ -20,7 +20,12 @@ import numpy as np
 from aitviewer.configuration import CONFIG as C
 from aitviewer.scene.material import Material
 from aitviewer.utils.so3 import euler2rot_numpy, rot2euler_numpy
-from functools import lru_cache
+from itertools import count
+
+
+# Monotonic counter used to tag every recomputed model matrix, children compare against it to know when their
+# cached model matrix is stale.
+_model_matrix_versions = count(1)
 
 
 class Node(object):
@@ -81,10 +86,26 @@ class Node(object):
                         f"({n_positions}), rotation ({n_rotations}) and scale ({n_scales})"
                         "frames must be 1 or match.")
 
+        # Hierarchy
+        self.nodes = []
+        self.parent = None
+
         # Frames
         self._n_frames = n_frames
         self._current_frame_id = 0
-        self.model_matrix = self.get_local_transform()
+        self._pending_frame_id = None
+
+        # Local transforms of all frames as a (F, 4, 4) table. The model matrix is composed with the parent's lazily.
+        self._local_transforms = None
+        self._parent_transform = None
+        self._model_matrix = None
+        self._model_matrix_key = None
+        self._model_matrix_version = 0
+        self._model_matrix_dirty = True
+        self._inverse_model_matrix = None
+        self._inverse_model_matrix_version = None
+        self._update_local_transforms()
+
         self._enabled_frames = enabled_frames
         if self._enabled_frames is not None:
             assert np.count_nonzero(self._enabled_frames) == n_frames, (f"Number of non-zero elements in enabled_frames"
@@ -108,6 +129,9 @@ class Node(object):
 
         # Flags to enable rendering passes
         self.cast_shadow = False
+
+        # Incremented by renderables whenever their geometry changes, used to detect when shadow maps are stale.
+        self._geometry_version = 0
         self.fragmap = False
         self.depth_prepass = False
         self.outline = False
@@ -132,9 +156,6 @@ class Node(object):
         self._show_in_hierarchy = True
         self.is_selectable = is_selectable
 
-        self.nodes = []
-        self.parent = None
-
     # Selected Mode
     @property
     def selected_mode(self):
@@ -154,7 +175,8 @@ class Node(object):
     def position(self, position):
         idx = self.current_frame_id if self._positions.shape[0] > 1 else 0
         self._positions[idx] = np.array(position, dtype=np.float32).copy()
-        self.update_transform(None if self.parent is None else self.parent.model_matrix)
+        # A value shared by all frames changes the transforms of all frames.
+        self._update_local_transforms(idx if self._positions.shape[0] > 1 else None)
 
     @property
     def positions(self):
@@ -163,7 +185,7 @@ class Node(object):
     @positions.setter
     def positions(self, positions):
         self._positions = positions
-        self.update_transform(None if self.parent is None else self.parent.model_matrix)
+        self._update_local_transforms()
 
     @property
     def rotation(self):
@@ -174,7 +196,8 @@ class Node(object):
     def rotation(self, rotation):
         idx = self.current_frame_id if self._rotations.shape[0] > 1 else 0
         self._rotations[idx] = rotation
-        self.update_transform(None if self.parent is None else self.parent.model_matrix)
+        # A value shared by all frames changes the transforms of all frames.
+        self._update_local_transforms(idx if self._rotations.shape[0] > 1 else None)
 
     @property
     def rotations(self):
@@ -183,7 +206,7 @@ class Node(object):
     @rotations.setter
     def rotations(self, rotations):
         self._rotations = rotations
-        self.update_transform(None if self.parent is None else self.parent.model_matrix)
+        self._update_local_transforms()
 
     @property
     def scale(self):
@@ -194,7 +217,8 @@ class Node(object):
     def scale(self, scale):
         idx = self.current_frame_id if self._scales.shape[0] > 1 else 0
         self._scales[idx] = scale
-        self.update_transform(None if self.parent is None else self.parent.model_matrix)
+        # A value shared by all frames changes the transforms of all frames.
+        self._update_local_transforms(idx if self._scales.shape[0] > 1 else None)
 
     @property
     def scales(self):
@@ -203,37 +227,89 @@ class Node(object):
     @scales.setter
     def scales(self, scales):
         self._scales = scales
-        self.update_transform(None if self.parent is None else self.parent.model_matrix)
+        self._update_local_transforms()
 
     @staticmethod
-    @lru_cache()
-    def _compute_transform(pos, rot, scale):
-        rotation = np.eye(4)
-        rotation[:3, :3] = np.array(rot)
-
-        trans = np.eye(4)
-        trans[:3, 3] = np.array(pos)
-
-        scale = np.diag([scale, scale, scale, 1])
-
-        return (trans @ rotation @ scale).astype('f4')
+    def _compute_transforms(positions, rotations, scales):
+        """
+        Compute the transforms trans @ rot @ scale for a batch of frames.
+        :param positions: A np array of shape (F, 3) or (1, 3).
+        :param rotations: A np array of shape (F, 3, 3) or (1, 3, 3).
+        :param scales: A np array of shape (F) or (1).
+        :return: A np array of shape (F, 4, 4).
+        """
+        n = max(positions.shape[0], rotations.shape[0], scales.shape[0])
+        transforms = np.zeros((n, 4, 4), dtype=np.float32)
+        transforms[:, :3, :3] = rotations * np.reshape(scales, (-1, 1, 1))
+        transforms[:, :3, 3] = positions
+        transforms[:, 3, 3] = 1.0
+        return transforms
+
+    def _update_local_transforms(self, frame_id=None):
+        """
+        Recompute the table of local transforms from this node's positions, rotations and scales.
+        :param frame_id: If given, only the transform of this frame is recomputed.
+        """
+        n = max(self._positions.shape[0], self._rotations.shape[0], self._scales.shape[0])
+        if frame_id is None or n == 1 or self._local_transforms.shape[0] != n:
+            self._local_transforms = self._compute_transforms(self._positions, self._rotations, self._scales)
+        else:
+            p = self._positions[frame_id if self._positions.shape[0] > 1 else 0]
+            r = self._rotations[frame_id if self._rotations.shape[0] > 1 else 0]
+            s = self._scales[frame_id if self._scales.shape[0] > 1 else 0]
+            self._local_transforms[frame_id] = self._compute_transforms(
+                p[np.newaxis], r[np.newaxis], np.array([s]))[0]
+        self._model_matrix_dirty = True
 
     def get_local_transform(self):
-        """Construct local transform as a 4x4 matrix from this node's position, orientation and scale."""
-        return self._compute_transform(
-               tuple(self.position),
-               tuple(map(tuple, self.rotation)),
-               self.scale)
+        """Return the local transform of the current frame as a 4x4 matrix."""
+        idx = self.current_frame_id if self._local_transforms.shape[0] > 1 else 0
+        return self._local_transforms[idx]
 
-    def update_transform(self, parent_transform=None):
-        """Update the model matrix of this node and all of its descendants."""
-        if parent_transform is None:
-            self.model_matrix = self.get_local_transform()
+    @property
+    def model_matrix(self):
+        """
+        The transform from this node's local space to world space in the current frame. It is only recomputed if the
+        current frame, the local transform or the parent's model matrix changed since it was last accessed.
+        """
+        if self.parent is not None:
+            parent_transform = self.parent.model_matrix
+            parent_version = self.parent._model_matrix_version
         else:
-            self.model_matrix = parent_transform.astype('f4') @ self.get_local_transform()
+            parent_transform = self._parent_transform
+            parent_version = None
+
+        idx = self.current_frame_id if self._local_transforms.shape[0] > 1 else 0
+        key = (parent_version, idx)
+        if self._model_matrix_dirty or key != self._model_matrix_key:
+            local_transform = self._local_transforms[idx]
+            if parent_transform is None:
+                self._model_matrix = local_transform.copy()
+            else:
+                self._model_matrix = parent_transform @ local_transform
+            self._model_matrix_key = key
+            self._model_matrix_version = next(_model_matrix_versions)
+            self._model_matrix_dirty = False
+        return self._model_matrix
 
-        for n in self.nodes:
-            n.update_transform(self.model_matrix)
+    @property
+    def inverse_model_matrix(self):
+        """The inverse of the model matrix, it is only recomputed when the model matrix changes."""
+        model_matrix = self.model_matrix
+        if self._inverse_model_matrix_version != self._model_matrix_version:
+            self._inverse_model_matrix = np.linalg.inv(model_matrix)
+            self._inverse_model_matrix_version = self._model_matrix_version
+        return self._inverse_model_matrix
+
+    def update_transform(self, parent_transform=None):
+        """
+        Recompute the local transforms of this node, e.g. after its positions, rotations or scales were modified
+        in-place. Descendants pick up the change lazily the next time their model matrix is accessed.
+        :param parent_transform: Transform to compose with if this node is not attached to a parent node.
+        """
+        if parent_transform is not None:
+            self._parent_transform = parent_transform.astype('f4')
+        self._update_local_transforms()
 
     @property
     def color(self):
@@ -293,31 +369,45 @@ class Node(object):
 
     @property
     def current_frame_id(self):
+        # Make sure pending frame changes of the ancestors and of this node have been applied.
+        if self.parent is not None:
+            self.parent.current_frame_id
+        if self._pending_frame_id is not None:
+            self._apply_pending_frame()
         return self._current_frame_id
 
     @current_frame_id.setter
     def current_frame_id(self, frame_id):
-        # Check if the frame changed.
-        last_frame_id = self._current_frame_id if self._enabled_frames is None else self._internal_frame_id
+        # Only record the requested frame, the update is deferred until the frame is accessed or `update_frame` is
+        # called. Multiple frame changes in between are thus coalesced into a single update.
+        if self._pending_frame_id is not None:
+            last_frame_id = self._pending_frame_id
+        else:
+            last_frame_id = self._current_frame_id if self._enabled_frames is None else self._internal_frame_id
         if self.n_frames == 1 or frame_id == last_frame_id:
             return
+        self._pending_frame_id = frame_id
+
+    def _apply_pending_frame(self):
+        """Switch to the pending frame and propagate it to the children, which in turn will update lazily."""
+        frame_id = self._pending_frame_id
+        self._pending_frame_id = None
 
-        self.on_before_frame_update()
         if self._enabled_frames is None:
-            if frame_id < 0:
-                self._current_frame_id = 0
-            elif frame_id >= len(self):
-                self._current_frame_id = len(self) - 1
-            else:
-                self._current_frame_id = frame_id
+            frame_id = min(max(frame_id, 0), len(self) - 1)
+            if frame_id == self._current_frame_id:
+                return
+
+            self.on_before_frame_update()
+            self._current_frame_id = frame_id
         else:
             # If an enabled_frames is present use it to get the current frame.
-            if frame_id < 0:
-                self._internal_frame_id = 0
-            elif frame_id >= self._enabled_frames.shape[0]:
-                self._internal_frame_id = self._enabled_frames.shape[0] - 1
-            else:
-                self._internal_frame_id = frame_id
+            frame_id = min(max(frame_id, 0), self._enabled_frames.shape[0] - 1)
+            if frame_id == self._internal_frame_id:
+                return
+
+            self.on_before_frame_update()
+            self._internal_frame_id = frame_id
             self._current_frame_id = self._enabled_frame_id[self._internal_frame_id]
             # Update enabled using the mask.
             self.enabled = self._enabled_frames[self._internal_frame_id]
@@ -327,8 +417,20 @@ class Node(object):
             n.current_frame_id = self._current_frame_id
 
         self.on_frame_update()
-        if self.parent and (self._positions.shape[0] > 1 or self._rotations.shape[0] > 1 or self._scales.shape[0] > 1):
-            self.update_transform(self.parent.model_matrix)
+
+    def update_frame(self):
+        """
+        Apply pending frame changes to this node and its enabled descendants. This is called before rendering,
+        disabled subtrees are skipped and only updated once they are enabled again.
+        """
+        if self._enabled_frames is None and not self.enabled:
+            return
+        if self._pending_frame_id is not None:
+            self._apply_pending_frame()
+        if not self.enabled:
+            return
+        for n in self.nodes:
+            n.update_frame()
 
     def next_frame(self):
         self.current_frame_id = self.current_frame_id + 1 if self.current_frame_id < len(self) - 1 else 0
@@ -365,7 +467,7 @@ class Node(object):
         n._enabled = enabled if n._enabled_frames is None else n._enabled_frames[n.current_frame_id]
         self.nodes.append(n)
         n.parent = self
-        n.update_transform(self.model_matrix)
+        n._model_matrix_dirty = True
 
     def _add_nodes(self, *nodes, **kwargs):
         """Add multiple nodes"""
@@ -537,6 +639,15 @@ class Node(object):
             uniform = program[f'shadow_maps']
             uniform.value = 1 if uniform.array_length == 1 else [*range(1, len(lights) + 1)]
 
+    @property
+    def shadow_key(self):
+        """A hashable value that changes whenever the contribution of this node to the shadow maps might change."""
+        if not self.cast_shadow or self.color[3] == 0.0:
+            return None
+        # Access the model matrix first such that its version is up to date.
+        self.model_matrix
+        return self.is_renderable, self.current_frame_id, self._model_matrix_version, self._geometry_version
+
     def render_shadowmap(self, light_matrix, prog):
         if not self.cast_shadow or self.color[3] == 0.0:
             return
@@ -22,6 +22,7 @@ from aitviewer.renderables.plane import ChessboardPlane
 from aitviewer.scene.camera import ViewerCamera
 from aitviewer.scene.light import Light
 from aitviewer.scene.node import Node
+from aitviewer.scene.update_queue import SceneUpdateQueue
 from aitviewer.renderables.lines import Lines
 from aitviewer.configuration import CONFIG as C
 
@@ -81,6 +82,9 @@ class Scene(Node):
         # The scene node in the GUI is expanded at the start.
         self.expanded = True
 
+        # Changes submitted from other threads, applied by the viewer before every frame.
+        self.updates = SceneUpdateQueue()
+
     def render(self, **kwargs):
         # As per https://learnopengl.com/Advanced-OpenGL/Blending
 
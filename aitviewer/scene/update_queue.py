@@ -0,0 +1,124 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import itertools
+import threading
+import traceback
+
+from collections import OrderedDict
+
+
+class SceneUpdateQueue(object):
+    """
+    A queue of changes to the scene that other threads can submit safely. Nodes must only be modified on the render
+    thread, because changing them may touch GPU resources. Producers enqueue changes instead, and the viewer applies
+    them once per frame before rendering.
+
+    Updates of the same property of the same node are coalesced, only the newest value is applied. Every node whose
+    properties were changed is redrawn once after all updates were applied.
+    """
+
+    def __init__(self):
+        self._updates = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+
+    def _put(self, key, fn):
+        """Queue a function that receives the scene and returns a node to redraw or None."""
+        with self._lock:
+            if key is None:
+                key = next(self._counter)
+            # Replace an older update with the same key and move it to the end such that it is applied after all
+            # updates that were submitted before this one.
+            self._updates.pop(key, None)
+            self._updates[key] = fn
+
+    def set_attribute(self, node, name, value, redraw=False):
+        """
+        Set an attribute of a node, e.g. `set_attribute(mesh, 'vertices', v)` or `set_attribute(node, 'position', p)`.
+        :param node: The node to change.
+        :param name: The name of the attribute.
+        :param value: The new value, it must not be modified by the caller afterwards.
+        :param redraw: Whether the node must be redrawn after the change, e.g. after setting the poses of a
+          `SMPLSequence`. Properties like `Meshes.vertices` redraw the node by themselves.
+        """
+        def update(scene):
+            setattr(node, name, value)
+            return node if redraw else None
+        self._put(('attribute', node.uid, name), update)
+
+    def set_vertices(self, node, vertices):
+        """Replace the vertices of a `Meshes` node."""
+        self.set_attribute(node, 'vertices', vertices)
+
+    def add(self, *nodes, parent=None, **kwargs):
+        """Add nodes to the parent node, which defaults to the scene."""
+        def update(scene):
+            (parent or scene).add(*nodes, **kwargs)
+        self._put(None, update)
+
+    def remove(self, *nodes):
+        """Remove nodes from the scene and release them."""
+        def update(scene):
+            for n in nodes:
+                if n.parent is not None:
+                    n.parent.remove(n)
+        self._put(None, update)
+
+    def call(self, fn, *args, key=None, **kwargs):
+        """
+        Call a function on the render thread.
+        :param fn: The function.
+        :param key: If given, an earlier call with the same key that was not applied yet is dropped.
+        """
+        def update(scene):
+            fn(*args, **kwargs)
+        self._put(None if key is None else ('call', key), update)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._updates)
+
+    def apply(self, scene):
+        """
+        Apply all pending updates, must be called on the render thread.
+        :param scene: The scene nodes are added to or removed from.
+        """
+        with self._lock:
+            if len(self._updates) == 0:
+                return
+            updates, self._updates = self._updates, OrderedDict()
+
+        redraw = OrderedDict()
+        for fn in updates.values():
+            try:
+                node = fn(scene)
+            except Exception:
+                print("Failed to apply a scene update:")
+                traceback.print_exc()
+                continue
+            if node is not None:
+                redraw[node.uid] = node
+
+        # The body models of all updated SMPL sequences are evaluated together.
+        from aitviewer.renderables.smpl import SMPLSequence, redraw_batched
+        sequences = [n for n in redraw.values() if type(n) is SMPLSequence]
+        if len(sequences) > 1:
+            redraw_batched(sequences)
+            for n in sequences:
+                del redraw[n.uid]
+        for node in redraw.values():
+            node.redraw()
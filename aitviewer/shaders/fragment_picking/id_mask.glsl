@@ -0,0 +1,35 @@
+#version 400
+//
+// Converts the object ids of the fragment map to a color mask. Each object gets a uniform color computed as a hash
+// of its id, the hash is computed on signed integers to match the colors of previous versions.
+//
+
+#if defined VERTEX_SHADER
+
+in vec3 in_position;
+
+void main() {
+    gl_Position = vec4(in_position, 1.0);
+}
+
+#elif defined FRAGMENT_SHADER
+
+uniform sampler2D obj_info_texture;
+
+out vec4 fragColor;
+
+int hash(int h) {
+    h ^= h >> 16;
+    h *= int(0x85ebca6bu);
+    h ^= h >> 13;
+    h *= int(0xc2b2ae35u);
+    h ^= h >> 16;
+    return h;
+}
+
+void main() {
+    int id = int(texelFetch(obj_info_texture, ivec2(gl_FragCoord.xy), 0).r);
+    int h = hash(id);
+    fragColor = vec4(h & 0xff, (h >> 8) & 0xff, (h >> 16) & 0xff, 255) / 255.0;
+}
+#endif
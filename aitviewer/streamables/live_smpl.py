@@ -0,0 +1,100 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import threading
+import time
+import torch
+
+from aitviewer.renderables.smpl import SMPLSequence
+from aitviewer.streamables.streamable import Streamable
+from aitviewer.utils import to_torch
+
+# Parameters of a SMPLSequence that can be published.
+PARAMETERS = ['poses_body', 'poses_root', 'poses_left_hand', 'poses_right_hand', 'betas', 'trans']
+
+
+class LiveSMPLSequence(SMPLSequence, Streamable):
+    """
+    A SMPL sequence whose parameters are updated while it is displayed, e.g. by an optimizer running in a background
+    thread. The producer calls `publish` as often as it likes, which only copies the parameters into a back buffer.
+    Once per frame the viewer swaps the buffers and evaluates the body model for the newest snapshot, snapshots that
+    were published in between are never evaluated. This way the producer never waits for the viewer.
+    """
+
+    def __init__(self, *args, max_fps=30.0, **kwargs):
+        """
+        Initializer, see `SMPLSequence` for the other parameters.
+        :param max_fps: Maximum rate at which the displayed parameters are updated, such that evaluating the body
+          model for long sequences does not slow down rendering.
+        """
+        super(LiveSMPLSequence, self).__init__(*args, **kwargs)
+        self.max_fps = max_fps
+
+        # The producer writes to the back buffer, the viewer reads from the front buffer.
+        self._front = {}
+        self._back = {}
+        self._back_keys = set()
+        self._lock = threading.Lock()
+        self._last_update = 0.0
+
+        # Statistics shown in the GUI.
+        self.n_published = 0
+        self.n_displayed = 0
+
+    def publish(self, **params):
+        """
+        Publish a snapshot of the parameters, can be called from any thread. Tensors are copied, so the caller can
+        keep modifying them, e.g. `seq.publish(poses_body=poses_body, trans=trans)` inside an optimization loop.
+        :param params: New values of any of the parameters in `PARAMETERS` with the same shape as the current ones.
+        """
+        with torch.no_grad(), self._lock:
+            for k, v in params.items():
+                if k not in PARAMETERS:
+                    raise ValueError("Unknown parameter '{}', must be one of {}.".format(k, PARAMETERS))
+                current = getattr(self, k)
+                v = to_torch(v, dtype=current.dtype, device=current.device).detach()
+                assert v.shape == current.shape, "The shape of '{}' must be {}.".format(k, tuple(current.shape))
+                # Reuse the buffer from two snapshots ago to avoid allocations.
+                if k in self._back:
+                    self._back[k].copy_(v)
+                else:
+                    self._back[k] = v.clone()
+                self._back_keys.add(k)
+            self.n_published += 1
+
+    def capture(self):
+        now = time.perf_counter()
+        if now - self._last_update < 1.0 / self.max_fps:
+            return
+
+        with self._lock:
+            if len(self._back_keys) == 0:
+                return
+            self._front, self._back = self._back, self._front
+            keys, self._back_keys = self._back_keys, set()
+
+        # The producer only writes to the back buffer, so the front buffer can be read without the lock.
+        with torch.no_grad():
+            for k in keys:
+                getattr(self, k).copy_(self._front[k])
+        self.redraw()
+        self._last_update = now
+        self.n_displayed += 1
+
+    def gui(self, imgui):
+        imgui.text("Snapshots: {} published, {} displayed".format(self.n_published, self.n_displayed))
+        _, self.max_fps = imgui.drag_float('Max. update fps##max_fps{}'.format(self.unique_name), self.max_fps, 1.0,
+                                           1.0, 240.0, '%.0f')
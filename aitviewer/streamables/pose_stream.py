@@ -0,0 +1,203 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import threading
+import time
+import numpy as np
+import torch
+
+from aitviewer.configuration import CONFIG as C
+from aitviewer.models.registry import get_layer
+from aitviewer.models.smpl import SMPLLayer
+from aitviewer.renderables.meshes import Meshes
+from aitviewer.renderables.smpl import SMPLSequence
+from aitviewer.renderables.spheres import Spheres
+from aitviewer.streamables.recorder import load_recording
+from aitviewer.streamables.streamable import Streamable
+from aitviewer.utils import interpolate_positions
+from aitviewer.utils.shared_ring_buffer import RingBufferReader
+from aitviewer.utils.so3 import interpolate_rotations
+
+# Fields of a stream that are passed to the SMPL model.
+SMPL_FIELDS = ['poses_root', 'poses_body', 'poses_left_hand', 'poses_right_hand', 'trans', 'betas']
+
+
+class PoseStream(Streamable):
+    """
+    Displays poses that another process writes to a shared memory ring buffer, see `RingBufferWriter`. A stream with
+    a 'poses_body' field is displayed as a SMPL body, the fields in `SMPL_FIELDS` are used as SMPL parameters. The
+    model type and gender can be given in the metadata of the stream. Otherwise a stream with a 'vertices' field is
+    displayed as a mesh with the given faces, and a stream with a 'joints' field as spheres.
+
+    New samples are received in a background thread. Only the newest sample is displayed, so the body model is
+    evaluated at most once per rendered frame no matter how fast the producer is.
+    """
+
+    def __init__(self, name, smpl_layer=None, faces=None, z_up=None, icon="\u0093", **kwargs):
+        """
+        Initializer.
+        :param name: The name of the ring buffer the producer writes to.
+        :param smpl_layer: The SMPL layer used for 'poses_body' streams, defaults to one created from the metadata.
+        :param faces: The faces of the mesh for 'vertices' streams.
+        :param z_up: Whether the streamed data assumes Z is up, defaults to the 'z_up' entry of the metadata.
+        """
+        super(PoseStream, self).__init__(name=name, icon=icon, **kwargs)
+        self.stream_name = name
+
+        self._reader = RingBufferReader(name)
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._sample = None
+        self._last_count = 0
+
+        # Statistics shown in the GUI.
+        self.n_received = 0
+        self.n_dropped = 0
+        self.latency = 0.0
+
+        fields = self._reader.fields
+        meta = self._reader.metadata
+        z_up = meta.get('z_up', False) if z_up is None else z_up
+        self.z_up = z_up
+        self.faces = faces
+        self.smpl_seq, self.mesh, self.spheres = None, None, None
+        if 'poses_body' in fields:
+            if smpl_layer is None:
+                smpl_layer = get_layer(SMPLLayer, model_type=meta.get('model_type', C.body.type),
+                                       gender=meta.get('gender', 'neutral'), device=C.device)
+            params = {k: np.zeros((1, fields[k])) for k in SMPL_FIELDS if k in fields and k != 'betas'}
+            self.smpl_seq = SMPLSequence(smpl_layer=smpl_layer, z_up=z_up, name='SMPL', **params)
+            self._add_node(self.smpl_seq)
+        elif 'vertices' in fields:
+            assert faces is not None, "Faces must be given to display a stream of vertices."
+            self.mesh = Meshes(np.zeros((1, fields['vertices'] // 3, 3)), faces, name='Mesh')
+            self._add_node(self.mesh)
+        elif 'joints' in fields:
+            self.spheres = Spheres(np.zeros((1, fields['joints'] // 3, 3)), radius=0.03, name='Joints')
+            self._add_node(self.spheres)
+        else:
+            raise ValueError("The stream {} has none of the fields 'poses_body', 'vertices' or 'joints'.".format(name))
+
+        if z_up and self.smpl_seq is None:
+            self.rotation = np.matmul(np.array([[1, 0, 0], [0, 0, 1], [0, -1, 0]]), self.rotation)
+
+        self.start()
+
+    def _receive_loop(self):
+        while not self._stop_event.is_set():
+            if not self._reader.wait(timeout=0.1):
+                continue
+            sample = self._reader.read_latest()
+            if sample is None:
+                continue
+            self.record_capture(sample[1], **sample[2])
+            with self._lock:
+                # Samples that were written since the last one we received are skipped.
+                self.n_dropped += max(0, sample[0] - self._last_count - 1)
+                if self._sample is not None:
+                    self.n_dropped += 1
+                self._last_count = sample[0]
+                self._sample = sample
+                self.n_received += 1
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._receive_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._reader.close()
+        # Write the frames that are still buffered, otherwise the end of the recording is lost.
+        if self.is_recording:
+            self.record_finish()
+
+    def capture(self):
+        with self._lock:
+            sample = self._sample
+            self._sample = None
+        if sample is None:
+            return
+
+        _, timestamp, values = sample
+        if self.smpl_seq is not None:
+            seq = self.smpl_seq
+            for k in SMPL_FIELDS:
+                if k in values:
+                    # The stream may contain more shape parameters than the model uses.
+                    param = getattr(seq, k)
+                    n = min(param.shape[1], values[k].shape[0])
+                    param[0, :n] = torch.from_numpy(values[k][:n]).to(dtype=param.dtype, device=param.device)
+            seq.redraw(current_frame_only=True)
+        elif self.mesh is not None:
+            self.mesh.current_vertices = values['vertices'].reshape(-1, 3)
+        else:
+            self.spheres.current_sphere_positions = values['joints'].reshape(-1, 3)
+            self.spheres.redraw()
+
+        # Smoothed time from the capture of the sample in the producer until it is displayed.
+        self.latency = 0.9 * self.latency + 0.1 * (time.time() - timestamp)
+
+    def recording_to_node(self, output_dir=None, fps=None, **kwargs):
+        """
+        Create a sequence from a recording of this stream, resampled from the capture times to a fixed frame rate.
+        :param output_dir: The directory of the recording, defaults to the last recording of this stream.
+        :param fps: The frame rate of the sequence, defaults to the scene frame rate in the configuration.
+        :param kwargs: Keyword arguments passed to the node.
+        :return: A `SMPLSequence`, `Meshes` or `Spheres` depending on the fields of the stream.
+        """
+        data = load_recording(output_dir or self.recording_dir)
+        fps = fps or C.scene_fps
+
+        # Samples can arrive at irregular intervals, interpolate them at a fixed rate.
+        ts_in, idxs = np.unique(data['timestamps'], return_index=True)
+        if len(ts_in) > 1:
+            ts_out = np.arange(ts_in[0], ts_in[-1], 1.0 / fps)
+            for k, v in data.items():
+                if k in ['timestamps', 'betas']:
+                    continue
+                v = v[idxs].reshape(len(idxs), -1, 3)
+                if k.startswith('poses'):
+                    v = interpolate_rotations(v, ts_in, ts_out)
+                else:
+                    v = interpolate_positions(v, ts_in, ts_out)
+                data[k] = v.reshape(len(ts_out), -1)
+
+        if self.smpl_seq is not None:
+            params = {k: data[k] for k in SMPL_FIELDS if k in data and k != 'betas'}
+            betas = data['betas'][0, :self.smpl_seq.smpl_layer.num_betas] if 'betas' in data else None
+            return SMPLSequence(smpl_layer=self.smpl_seq.smpl_layer, betas=betas, z_up=self.z_up, **params, **kwargs)
+
+        if self.mesh is not None:
+            node = Meshes(data['vertices'].reshape(len(data['vertices']), -1, 3), self.faces, **kwargs)
+        else:
+            node = Spheres(data['joints'].reshape(len(data['joints']), -1, 3), radius=0.03, **kwargs)
+        if self.z_up:
+            node.rotation = np.matmul(np.array([[1, 0, 0], [0, 0, 1], [0, -1, 0]]), node.rotation)
+        return node
+
+    def gui(self, imgui):
+        imgui.text("Stream: {}".format(self.stream_name))
+        imgui.text("Samples: {} received, {} dropped".format(self.n_received, self.n_dropped))
+        imgui.text("Latency: {:.1f} ms".format(self.latency * 1000.0))
+        self.gui_record(imgui)
@@ -0,0 +1,143 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import glob
+import os
+import threading
+import numpy as np
+
+
+class StreamRecorder(object):
+    """
+    Records the frames of a stream to disk without blocking the thread that captures them. Frames are copied into a
+    preallocated ring buffer and a background thread writes them to disk in chunks of `chunk_size` frames, stored
+    as `chunk_XXXXXX.npz` files in the output directory. If the disk cannot keep up and the ring buffer is full, new
+    frames are dropped instead of waiting.
+
+    By default the ring buffer and the chunks are sized from a memory budget once the size of a frame is known, so a
+    stream of small poses buffers many frames and a stream of large images only a few.
+    """
+
+    def __init__(self, output_dir, capacity=None, chunk_size=None, max_bytes=256 * 1024 * 1024, max_capacity=1024):
+        """
+        Initializer.
+        :param output_dir: Directory where the chunks are written.
+        :param capacity: Number of frames the ring buffer holds, None to derive it from `max_bytes`.
+        :param chunk_size: Number of frames per chunk, None to use an eighth of the capacity.
+        :param max_bytes: Memory budget of the ring buffer in bytes, used if `capacity` is None.
+        :param max_capacity: Maximum number of frames the ring buffer holds if the capacity is derived from the budget.
+        """
+        if capacity is not None and chunk_size is not None:
+            assert capacity >= chunk_size, "The ring buffer must hold at least one chunk."
+        self.output_dir = output_dir
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.max_capacity = max_capacity
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Allocated when the first frame arrives and the shapes are known.
+        self._buffers = None
+        self._n_pushed = 0
+        self._n_flushed = 0
+        self._finished = False
+        self.n_dropped = 0
+        self.chunk_paths = []
+
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+
+    def push(self, timestamp, **arrays):
+        """
+        Add a frame to the recording.
+        :param timestamp: The time the frame was captured.
+        :param arrays: The data of the frame as np arrays, the same names and shapes must be used for all frames.
+        """
+        with self._cond:
+            if self._finished:
+                return
+            if self._buffers is None:
+                self._allocate(arrays)
+            if self._n_pushed - self._n_flushed >= self.capacity:
+                self.n_dropped += 1
+                return
+
+            slot = self._n_pushed % self.capacity
+            for k, v in arrays.items():
+                self._buffers[k][slot] = v
+            self._buffers['timestamps'][slot] = timestamp
+            self._n_pushed += 1
+            if self._n_pushed - self._n_flushed >= self.chunk_size:
+                self._cond.notify_all()
+
+    def _allocate(self, arrays):
+        arrays = {k: np.asarray(v) for k, v in arrays.items()}
+        if self.capacity is None:
+            frame_bytes = sum(v.nbytes for v in arrays.values()) + 8
+            self.capacity = int(np.clip(self.max_bytes // frame_bytes, 1, self.max_capacity))
+        if self.chunk_size is None:
+            self.chunk_size = max(1, self.capacity // 8)
+        self.chunk_size = min(self.chunk_size, self.capacity)
+        self._buffers = {k: np.empty((self.capacity,) + v.shape, dtype=v.dtype) for k, v in arrays.items()}
+        self._buffers['timestamps'] = np.empty(self.capacity, dtype=np.float64)
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._finished or (self._buffers is not None and
+                                                               self._n_pushed - self._n_flushed >= self.chunk_size))
+                if self._buffers is None:
+                    break
+                n = min(self._n_pushed - self._n_flushed, self.chunk_size)
+                if n == 0:
+                    break
+                start = self._n_flushed
+                buffers = self._buffers
+
+            # The slots of this chunk are not written to until they are flushed, so they can be read without the lock.
+            slots = np.arange(start, start + n) % self.capacity
+            chunk = {k: b[slots] for k, b in buffers.items()}
+            path = os.path.join(self.output_dir, 'chunk_{:0>6}.npz'.format(len(self.chunk_paths)))
+            np.savez(path, **chunk)
+            self.chunk_paths.append(path)
+
+            with self._cond:
+                self._n_flushed += n
+
+    def finish(self):
+        """
+        Write the remaining frames and stop recording.
+        :return: The paths of all chunks.
+        """
+        with self._cond:
+            self._finished = True
+            self._cond.notify_all()
+        self._thread.join()
+        return self.chunk_paths
+
+
+def load_recording(output_dir):
+    """
+    Load all frames recorded by a `StreamRecorder`.
+    :param output_dir: The directory the recorder wrote to.
+    :return: A dictionary mapping the names of the recorded arrays and 'timestamps' to arrays of shape (F, ...).
+    """
+    paths = sorted(glob.glob(os.path.join(output_dir, 'chunk_*.npz')))
+    if len(paths) == 0:
+        raise ValueError("No recording found in {}.".format(output_dir))
+    chunks = [dict(np.load(p)) for p in paths]
+    return {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0]}
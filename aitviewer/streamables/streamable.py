@@ -14,7 +14,12 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import os
+import time
+
+from aitviewer.configuration import CONFIG as C
 from aitviewer.scene.node import Node
+from aitviewer.streamables.recorder import StreamRecorder
 
 
 class Streamable(Node):
@@ -24,6 +29,8 @@ class Streamable(Node):
         super(Streamable, self).__init__(**kwargs)
 
         self.is_recording = False
+        self.recording_dir = None
+        self._recorder = None
 
     def start(self):
         pass
@@ -35,13 +42,61 @@ class Streamable(Node):
         """Capture from the sensor"""
         raise NotImplementedError("Must be implemented by the subclass.")
 
-    def record_start(self):
+    def record_start(self, output_dir=None, capacity=None, chunk_size=None, max_bytes=256 * 1024 * 1024):
+        """
+        Start recording the stream to disk, see `StreamRecorder`.
+        :param output_dir: Directory where the recording is stored, defaults to a new directory in the export
+          directory.
+        :param capacity: Number of frames buffered in memory before frames are dropped, None to derive it from
+          `max_bytes` and the size of a frame.
+        :param chunk_size: Number of frames written to disk at once, None to derive it from the capacity.
+        :param max_bytes: Memory budget of the buffered frames in bytes.
+        """
+        if output_dir is None:
+            output_dir = os.path.join(C.export_dir, 'recordings', '{}_{}'.format(
+                self.name.replace(' ', '_'), time.strftime('%Y%m%d_%H%M%S')))
+        self._recorder = StreamRecorder(output_dir, capacity, chunk_size, max_bytes)
         self.is_recording = True
 
-    def record_capture(self):
-        pass
+    def record_capture(self, timestamp=None, **arrays):
+        """
+        Add a frame to the recording if recording is active. Subclasses call this for every captured frame, ideally
+        from their capture thread such that the stream is recorded at its full rate.
+        :param timestamp: The time the frame was captured, defaults to now.
+        :param arrays: The data of the frame as np arrays.
+        """
+        recorder = self._recorder
+        if self.is_recording and recorder is not None:
+            recorder.push(time.time() if timestamp is None else timestamp, **arrays)
 
     def record_finish(self):
+        """
+        Stop recording and write the remaining frames to disk.
+        :return: The paths of the recorded chunks.
+        """
         self.is_recording = False
-        return []
+        if self._recorder is None:
+            return []
+        recorder, self._recorder = self._recorder, None
+        chunk_paths = recorder.finish()
+        if recorder.n_dropped > 0:
+            print("{} frames of {} were dropped while recording.".format(recorder.n_dropped, self.name))
+        self.recording_dir = recorder.output_dir
+        return chunk_paths
+
+    def recording_to_node(self, output_dir=None, **kwargs):
+        """
+        Create a node that plays back a recording of this stream.
+        :param output_dir: The directory of the recording, defaults to the last recording of this stream.
+        :param kwargs: Keyword arguments passed to the node.
+        """
+        raise NotImplementedError("Must be implemented by the subclass.")
 
+    def gui_record(self, imgui):
+        """Render a button that starts and stops recording."""
+        if self.is_recording:
+            if imgui.button('Stop recording##record{}'.format(self.unique_name)):
+                self.record_finish()
+                print("Recording saved to {}".format(self.recording_dir))
+        elif imgui.button('Record##record{}'.format(self.unique_name)):
+            self.record_start()
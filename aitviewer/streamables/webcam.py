@@ -15,8 +15,14 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import cv2
+import glob
+import os
+import threading
+import time
 
+from aitviewer.renderables.billboard import VideoBillboard
 from aitviewer.streamables.streamable import Streamable
+from aitviewer.utils.video_writer import VideoWriter
 from aitviewer.scene.node import Node
 from aitviewer.shaders import get_screen_texture_program
 from moderngl_window import geometry
@@ -25,6 +31,9 @@ import numpy as np
 class Webcam(Streamable):
     """
     Renders webcam stream to a quad. Quad is positioned in screen coordinates.
+
+    Frames are read and converted to RGB in a background thread, so the viewer does not wait for the camera. Only
+    the newest frame is kept, frames that arrive before the previous one was displayed are dropped.
     """
 
     def __init__(self, src=0, size=(2.0, 2.0), pos=(0.0, 0.0), transparency=1.0, icon="\u0088", **kwargs):
@@ -50,17 +59,64 @@ class Webcam(Streamable):
         # Render into a quad in screen space (z=0)
         self._texture = None
 
+        # The newest frame and the time it was read, written by the capture thread.
+        self._frame = None
+        self._frame_time = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._is_file = False
+
+        # Statistics shown in the GUI.
+        self.n_captured = 0
+        self.n_dropped = 0
+        self.latency = 0.0
+
     @Node.once
     def make_renderable(self, ctx):
         self.ctx = ctx
         self.quad = geometry.quad_2d(pos=self.pos, size=self.size, normals=False)  # (2,2) is Full Screen i.e. -1 to 1 in x/y
         self.prog = get_screen_texture_program()
 
-    def capture(self):
-        ret, frame = self._cap.read()
-        if ret:
+    def _capture_loop(self):
+        # Video files are played at their frame rate instead of as fast as they can be decoded.
+        period = 1.0 / (self.fps if self.fps and self.fps > 0 else 30.0)
+        next_time = time.perf_counter()
+        while not self._stop_event.is_set():
+            if self._is_file:
+                delay = next_time - time.perf_counter()
+                if delay > 0 and self._stop_event.wait(delay):
+                    break
+                # Don't try to catch up if reading fell behind, e.g. after the viewer was paused by the OS.
+                next_time = max(next_time + period, time.perf_counter())
+
+            ret, frame = self._cap.read()
+            if not ret:
+                if self._is_file:
+                    # Loop the video once the end is reached.
+                    self._cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                else:
+                    time.sleep(0.001)
+                continue
+            frame_time = time.perf_counter()
             frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            self.record_capture(frame=frame)
+            with self._lock:
+                if self._frame is not None:
+                    self.n_dropped += 1
+                self._frame = frame
+                self._frame_time = frame_time
+                self.n_captured += 1
+
+    def capture(self):
+        with self._lock:
+            frame, frame_time = self._frame, self._frame_time
+            self._frame = None
+        # Only upload if a new frame arrived since the last call.
+        if frame is not None:
             self._texture.write(frame)
+            # Smoothed time between reading a frame and uploading it.
+            self.latency = 0.9 * self.latency + 0.1 * (time.perf_counter() - frame_time)
 
     def render(self, camera, **kwargs):
         self._texture.use(0)
@@ -87,6 +143,7 @@ class Webcam(Streamable):
         self.width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         self.height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         self.fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self._is_file = isinstance(self.src, str) and os.path.isfile(self.src)
 
         # Set W/H Manually
         # self._cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
@@ -99,11 +156,50 @@ class Webcam(Streamable):
         if not self._cap.isOpened():
             raise IOError("Cannot open source")
 
+        self._frame = None
+        self.n_captured, self.n_dropped, self.latency = 0, 0, 0.0
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+
     def stop(self):
+        # Wait for the capture thread before releasing the device it reads from.
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
         self._cap.release()
         self._texture = None
+        # Write the frames that are still buffered, otherwise the end of the recording is lost.
+        if self.is_recording:
+            self.record_finish()
+
+    def recording_to_node(self, output_dir=None, **kwargs):
+        """Encode a recording of the webcam to a video next to the recording and return a `VideoBillboard` of it."""
+        output_dir = output_dir or self.recording_dir
+        paths = sorted(glob.glob(os.path.join(output_dir, 'chunk_*.npz')))
+        if len(paths) == 0:
+            raise ValueError("No recording found in {}.".format(output_dir))
+
+        # Estimate the frame rate from the timestamps, only the timestamps are read here.
+        timestamps = np.concatenate([np.load(p)['timestamps'] for p in paths])
+        fps = (len(timestamps) - 1) / (timestamps[-1] - timestamps[0]) if len(timestamps) > 1 else 30.0
+
+        video_path = os.path.join(output_dir, 'recording.mp4')
+        writer = None
+        for p in paths:
+            frames = np.load(p)['frame']
+            if writer is None:
+                writer = VideoWriter(video_path, frames.shape[2], frames.shape[1], fps, flip=False)
+            for f in frames:
+                writer.write(f.tobytes())
+        writer.close()
+        return VideoBillboard.from_video(video_path, **kwargs)
 
     def gui(self, imgui):
         if self.enabled:
             imgui.text("Clip Info: {}x{} @ {:.2f} fps".format(self.width, self.height, self.fps))
+            imgui.text("Frames: {} captured, {} dropped".format(self.n_captured, self.n_dropped))
+            imgui.text("Latency: {:.1f} ms".format(self.latency * 1000.0))
+            self.gui_record(imgui)
         _, self.transparency = imgui.slider_float('Opacity##opacity_'.format(self.name), self.transparency, 0.0, 1.0, '%.2f')
\ No newline at end of file
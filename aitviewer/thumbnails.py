@@ -0,0 +1,161 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import hashlib
+import os
+import multiprocessing as mp
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+from aitviewer.configuration import CONFIG as C
+from aitviewer.utils.amass_catalog import read_amass_metadata
+
+# The renderer of a worker process, created once when the worker starts.
+_viewer = None
+
+
+def _init_worker(width, height, viewer_kwargs):
+    from aitviewer.headless import HeadlessRenderer
+
+    global _viewer
+    _viewer = HeadlessRenderer(**viewer_kwargs)
+    _viewer.auto_set_camera_target = False
+    _viewer.create_offscreen_target(width, height, supersampling=2)
+
+
+def _render_thumbnail(path, thumbnail_path, n_keyframes):
+    """Render a strip of keyframes of an AMASS sequence in a worker process and save it as an image."""
+    from aitviewer.renderables.smpl import SMPLSequence
+
+    v = _viewer
+    n_frames = read_amass_metadata(path)['n_frames']
+    keyframes = np.unique(np.linspace(0, n_frames - 1, n_keyframes).astype(np.int64))
+
+    # Load the file once and evaluate the body model only for the keyframes.
+    seq = SMPLSequence.from_amass(path, frame_ids=keyframes, log=False)
+    v.scene.add(seq)
+    v._init_scene()
+
+    images = []
+    for i in range(len(keyframes)):
+        v.scene.current_frame_id = i
+        bounds = seq.current_bounds
+        center = bounds.mean(-1)
+        dist = max(0.01, np.linalg.norm(bounds[:, 0] - bounds[:, 1]) * 1.3)
+        v.scene.camera.position = center - v.scene.camera.forward * dist
+        v.scene.camera.target = center
+        images.append(np.asarray(v.get_frame()))
+    v.scene.remove(seq)
+
+    # Write to a temporary file first such that a thumbnail is either complete or does not exist.
+    tmp_path = thumbnail_path + '.tmp.png'
+    Image.fromarray(np.concatenate(images, axis=1)).save(tmp_path)
+    os.replace(tmp_path, thumbnail_path)
+    return thumbnail_path
+
+
+class ThumbnailService(object):
+    """
+    Render previews of AMASS sequences in a background process. A preview is a strip of keyframes spread evenly over
+    the sequence. Previews are cached on disk, keyed by a hash of the path, size and modification time of the file,
+    so every sequence is only rendered once. All methods return immediately, which allows calling them from the GUI
+    every frame.
+    """
+
+    def __init__(self, cache_dir=None, width=160, height=160, n_keyframes=4, viewer_kwargs=None):
+        """
+        Initializer.
+        :param cache_dir: Directory where the previews are stored, defaults to the one in the configuration.
+        :param width: Width of a keyframe in pixels.
+        :param height: Height of a keyframe in pixels.
+        :param n_keyframes: Number of keyframes per preview.
+        :param viewer_kwargs: Keyword arguments passed to the `HeadlessRenderer` of the worker process.
+        """
+        self.cache_dir = cache_dir or C.thumbnail_dir
+        self.n_keyframes = n_keyframes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # The worker is spawned rather than forked since GL contexts cannot be shared with a forked process.
+        self._executor = ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context('spawn'),
+                                             initializer=_init_worker, initargs=(width, height, viewer_kwargs or {}))
+        self._pending = {}
+        self._images = {}
+        self._failed = set()
+
+    def thumbnail_path(self, path):
+        """Return the path of the cached preview of the given sequence."""
+        stat = os.stat(path)
+        key = '{}:{}:{}:{}'.format(os.path.abspath(path), stat.st_size, stat.st_mtime_ns, self.n_keyframes)
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.png')
+
+    def get(self, path):
+        """
+        Return the preview of the given sequence or None if it is not available yet, in which case it is scheduled
+        for rendering.
+        :param path: Path to an AMASS npz file.
+        :return: A np array of shape (H, W, 3) or None.
+        """
+        if path in self._images:
+            return self._images[path]
+        if path in self._failed:
+            return None
+
+        future = self._pending.get(path)
+        if future is None:
+            thumbnail_path = self.thumbnail_path(path)
+            if os.path.exists(thumbnail_path):
+                return self._load(path, thumbnail_path)
+            self._pending[path] = self._executor.submit(_render_thumbnail, path, thumbnail_path, self.n_keyframes)
+            return None
+
+        if not future.done():
+            return None
+        del self._pending[path]
+        try:
+            return self._load(path, future.result())
+        except Exception as e:
+            print("Could not render a preview of {}: {}".format(path, e))
+            self._failed.add(path)
+            return None
+
+    def prefetch(self, paths):
+        """
+        Schedule the previews of the given sequences for rendering without waiting for them, e.g. for the rows that are
+        visible in a list. Previews are rendered in the given order.
+        :param paths: A list of paths to AMASS npz files.
+        """
+        for path in paths:
+            if path in self._images or path in self._failed or path in self._pending:
+                continue
+            thumbnail_path = self.thumbnail_path(path)
+            if not os.path.exists(thumbnail_path):
+                self._pending[path] = self._executor.submit(_render_thumbnail, path, thumbnail_path, self.n_keyframes)
+
+    def _load(self, path, thumbnail_path):
+        image = np.asarray(Image.open(thumbnail_path).convert('RGB'))
+        self._images[path] = image
+        return image
+
+    def cancel_pending(self):
+        """Drop requested previews whose rendering has not started yet, e.g. when the selection changes."""
+        for path, future in list(self._pending.items()):
+            if future.cancel():
+                del self._pending[path]
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
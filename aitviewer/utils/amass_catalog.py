@@ -0,0 +1,176 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import glob
+import os
+import sqlite3
+import zipfile
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+from aitviewer.configuration import CONFIG as C
+
+
+def _read_header(zf, name):
+    """Return the shape of an array in an npz file without reading its data."""
+    with zf.open(name) as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, _ = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, _ = np.lib.format.read_array_header_2_0(f)
+    return shape
+
+
+def _read_array(zf, name):
+    with zf.open(name) as f:
+        return np.lib.format.read_array(f, allow_pickle=False)
+
+
+def _read_string(zf, name):
+    value = _read_array(zf, name).item()
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def read_amass_metadata(path):
+    """
+    Read the metadata of an AMASS sequence without loading its poses.
+    :param path: Path to the npz file.
+    :return: A dictionary with the keys 'n_frames', 'fps', 'gender', 'model_type' and 'betas'.
+    """
+    with zipfile.ZipFile(path) as zf:
+        names = set(zf.namelist())
+        n_frames = _read_header(zf, 'poses.npy')[0] if 'poses.npy' in names else _read_header(zf, 'trans.npy')[0]
+
+        # SMPL-X sequences store the frame rate as 'mocap_frame_rate' and the model type, SMPL-H sequences don't.
+        fps = 0.0
+        for key in ['mocap_frame_rate.npy', 'mocap_framerate.npy']:
+            if key in names:
+                fps = float(_read_array(zf, key))
+                break
+        if 'surface_model_type.npy' in names:
+            model_type = _read_string(zf, 'surface_model_type.npy')
+        else:
+            model_type = 'smplh'
+        gender = _read_string(zf, 'gender.npy') if 'gender.npy' in names else 'neutral'
+        betas = _read_array(zf, 'betas.npy').astype(np.float32) if 'betas.npy' in names else np.zeros(0, np.float32)
+
+    return {'n_frames': int(n_frames), 'fps': fps, 'gender': gender, 'model_type': model_type, 'betas': betas}
+
+
+class AmassCatalog(object):
+    """
+    An index of the sequences in an AMASS directory, stored in an sqlite database. The metadata of every sequence is
+    read once and only read again if the file was modified, so browsing and filtering a large dataset does not
+    require loading any sequence.
+    """
+
+    def __init__(self, root=None, index_path=None, pattern='**/*_stageii.npz', n_workers=None):
+        """
+        Initializer.
+        :param root: The root directory of the dataset, defaults to the AMASS directory in the configuration.
+        :param index_path: Path of the sqlite database, defaults to the catalog path in the configuration.
+        :param pattern: Glob pattern of the sequence files relative to the root.
+        :param n_workers: Number of threads reading metadata, defaults to the number of CPUs.
+        """
+        self.root = os.path.abspath(root or C.datasets.amass)
+        self.index_path = index_path or C.datasets.amass_catalog
+        self.pattern = pattern
+        self.n_workers = n_workers or os.cpu_count()
+
+        index_dir = os.path.dirname(os.path.abspath(self.index_path))
+        os.makedirs(index_dir, exist_ok=True)
+        self._db = sqlite3.connect(self.index_path)
+        self._db.row_factory = sqlite3.Row
+        # Paths are stored relative to the root, so several datasets can share one index.
+        self._db.execute("CREATE TABLE IF NOT EXISTS sequences (root TEXT, path TEXT, mtime REAL, n_frames INTEGER, "
+                         "fps REAL, gender TEXT, model_type TEXT, betas BLOB, PRIMARY KEY (root, path))")
+        self._db.commit()
+
+    def update(self):
+        """
+        Scan the dataset and update the index with files that were added, modified or removed since the last scan.
+        :return: The number of files whose metadata was read.
+        """
+        paths = glob.glob(os.path.join(self.root, self.pattern), recursive=True)
+        mtimes = {os.path.relpath(p, self.root): os.path.getmtime(p) for p in paths}
+        indexed = {row['path']: row['mtime']
+                   for row in self._db.execute("SELECT path, mtime FROM sequences WHERE root = ?", (self.root,))}
+
+        removed = [p for p in indexed if p not in mtimes]
+        todo = [p for p, mtime in mtimes.items() if indexed.get(p) != mtime]
+
+        def read(path):
+            try:
+                return path, read_amass_metadata(os.path.join(self.root, path))
+            except (OSError, KeyError, ValueError, zipfile.BadZipFile) as e:
+                print("Could not read {}: {}".format(path, e))
+                return path, None
+
+        rows = []
+        with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+            for path, meta in executor.map(read, todo):
+                if meta is not None:
+                    rows.append((self.root, path, mtimes[path], meta['n_frames'], meta['fps'], meta['gender'],
+                                 meta['model_type'], meta['betas'].tobytes()))
+
+        with self._db:
+            self._db.executemany("DELETE FROM sequences WHERE root = ? AND path = ?", [(self.root, p) for p in removed])
+            self._db.executemany("INSERT OR REPLACE INTO sequences VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(todo)
+
+    def query(self, name=None, gender=None, model_type=None, min_frames=None, max_frames=None):
+        """
+        Return the indexed sequences matching all given filters, sorted by path.
+        :param name: Only return sequences whose path relative to the root contains this string, case-insensitive.
+        :param gender: Only return sequences of this gender.
+        :param model_type: Only return sequences of this model type, e.g. 'smplx' or 'smplh'.
+        :param min_frames: Only return sequences with at least this many frames.
+        :param max_frames: Only return sequences with at most this many frames.
+        :return: A list of dictionaries with the keys 'path' (absolute), 'mtime', 'n_frames', 'fps', 'gender',
+          'model_type' and 'betas'.
+        """
+        conditions, args = ["root = ?"], [self.root]
+        if name:
+            conditions.append("path LIKE ?")
+            args.append('%{}%'.format(name))
+        if gender:
+            conditions.append("gender = ?")
+            args.append(gender)
+        if model_type:
+            conditions.append("model_type = ?")
+            args.append(model_type)
+        if min_frames is not None:
+            conditions.append("n_frames >= ?")
+            args.append(min_frames)
+        if max_frames is not None:
+            conditions.append("n_frames <= ?")
+            args.append(max_frames)
+
+        sql = ("SELECT path, mtime, n_frames, fps, gender, model_type, betas FROM sequences WHERE {} "
+               "ORDER BY path".format(" AND ".join(conditions)))
+
+        results = []
+        for row in self._db.execute(sql, args):
+            r = dict(row)
+            r['path'] = os.path.join(self.root, r['path'])
+            r['betas'] = np.frombuffer(r['betas'], dtype=np.float32)
+            results.append(r)
+        return results
+
+    def close(self):
+        self._db.close()
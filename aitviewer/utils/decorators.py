@@ -28,7 +28,7 @@ def requires_ctx(func):
 def default_to_current_frame(func):
     def _decorator(self, *args, **kwargs):
         if len(args) == 0:
-            kwargs['frame_id'] = kwargs.get('frame_id', self._current_frame_id)
+            kwargs['frame_id'] = kwargs.get('frame_id', self.current_frame_id)
         return func(self, *args, **kwargs)
     return _decorator
 
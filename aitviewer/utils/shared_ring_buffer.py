@@ -0,0 +1,208 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+
+# Layout of the shared memory block: a header of 4 int64 (number of samples written, capacity, floats per sample,
+# length of the metadata), the metadata as JSON, the timestamps of all slots as float64 and the slots as float32.
+_HEADER_SIZE = 32
+_META_SIZE = 4096
+_AUTHKEY = b'aitviewer'
+
+
+def _address(name):
+    """The address of the notification channel of the ring buffer with the given name."""
+    if sys.platform == 'win32':
+        return r'\\.\pipe\aitv_{}'.format(name), 'AF_PIPE'
+    return os.path.join(tempfile.gettempdir(), 'aitv_{}.sock'.format(name)), 'AF_UNIX'
+
+
+def _views(buf, capacity, sample_size):
+    header = np.ndarray((4,), dtype=np.int64, buffer=buf)
+    offset = _HEADER_SIZE + _META_SIZE
+    timestamps = np.ndarray((capacity,), dtype=np.float64, buffer=buf, offset=offset)
+    data = np.ndarray((capacity, sample_size), dtype=np.float32, buffer=buf, offset=offset + 8 * capacity)
+    return header, timestamps, data
+
+
+class RingBufferWriter(object):
+    """
+    The producer side of a ring buffer in shared memory that passes fixed-size samples, e.g. poses, from one process
+    to another. Every sample consists of named float arrays. Readers are notified of new samples through a local
+    socket (a named pipe on Windows), so they don't have to poll.
+    """
+
+    def __init__(self, name, fields, capacity=8, metadata=None):
+        """
+        Initializer.
+        :param name: The name of the ring buffer, readers connect to it by this name.
+        :param fields: A dictionary mapping the name of every field of a sample to its number of floats, e.g.
+          `{'poses_body': 63, 'trans': 3}`.
+        :param capacity: Number of samples the ring buffer holds.
+        :param metadata: A JSON serializable dictionary passed on to the readers.
+        """
+        self.name = name
+        self.fields = dict(fields)
+        self.capacity = capacity
+        self.sample_size = sum(self.fields.values())
+
+        meta = json.dumps({'fields': list(self.fields.items()), 'metadata': metadata or {}}).encode()
+        if len(meta) > _META_SIZE:
+            raise ValueError("The metadata must be smaller than {} bytes when serialized.".format(_META_SIZE))
+
+        size = _HEADER_SIZE + _META_SIZE + capacity * (8 + 4 * self.sample_size)
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._header, self._timestamps, self._data = _views(self._shm.buf, capacity, self.sample_size)
+        self._header[:] = [0, capacity, self.sample_size, len(meta)]
+        self._shm.buf[_HEADER_SIZE:_HEADER_SIZE + len(meta)] = meta
+
+        address, family = _address(name)
+        if family == 'AF_UNIX' and os.path.exists(address):
+            os.remove(address)
+        self._listener = Listener(address, family, authkey=_AUTHKEY)
+        self._clients = []
+        self._lock = threading.Lock()
+        self._accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._accept_thread.start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                # The listener was closed.
+                break
+            with self._lock:
+                self._clients.append(conn)
+
+    def write(self, timestamp=None, **values):
+        """
+        Write a sample and notify all readers.
+        :param timestamp: The time the sample was captured as given by `time.time()`, defaults to now.
+        :param values: One array per field, e.g. `writer.write(poses_body=poses, trans=trans)`.
+        """
+        count = int(self._header[0])
+        slot = count % self.capacity
+        offset = 0
+        for name, size in self.fields.items():
+            self._data[slot, offset:offset + size] = np.ravel(values[name])
+            offset += size
+        self._timestamps[slot] = time.time() if timestamp is None else timestamp
+        # Publish the sample only after it was written completely.
+        self._header[0] = count + 1
+
+        with self._lock:
+            for conn in list(self._clients):
+                try:
+                    conn.send(count + 1)
+                except OSError:
+                    conn.close()
+                    self._clients.remove(conn)
+
+    def close(self):
+        """Close the notification channel and release the shared memory."""
+        self._listener.close()
+        with self._lock:
+            for conn in self._clients:
+                conn.close()
+            self._clients = []
+        del self._header, self._timestamps, self._data
+        self._shm.close()
+        self._shm.unlink()
+
+
+class RingBufferReader(object):
+    """The consumer side of a ring buffer created by a `RingBufferWriter` in another process."""
+
+    def __init__(self, name):
+        """
+        Initializer.
+        :param name: The name of the ring buffer.
+        """
+        self.name = name
+        self._shm = shared_memory.SharedMemory(name=name)
+        if sys.platform != 'win32':
+            # The writer owns the shared memory, don't let this process remove it on exit.
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+
+        header = np.ndarray((4,), dtype=np.int64, buffer=self._shm.buf)
+        self.capacity, self.sample_size, meta_len = int(header[1]), int(header[2]), int(header[3])
+        meta = json.loads(bytes(self._shm.buf[_HEADER_SIZE:_HEADER_SIZE + meta_len]).decode())
+        self.fields = dict(meta['fields'])
+        self.metadata = meta['metadata']
+        self._header, self._timestamps, self._data = _views(self._shm.buf, self.capacity, self.sample_size)
+
+        address, family = _address(name)
+        self._conn = Client(address, family, authkey=_AUTHKEY)
+
+    @property
+    def count(self):
+        """The number of samples written so far."""
+        return int(self._header[0])
+
+    def wait(self, timeout=None):
+        """
+        Wait until the writer notifies that a new sample is available.
+        :param timeout: Maximum time to wait in seconds, None to wait indefinitely.
+        :return: True if a new sample is available, False on timeout or if the writer was closed.
+        """
+        try:
+            if not self._conn.poll(timeout):
+                return False
+            # Skip notifications that piled up, only the newest sample is of interest.
+            while self._conn.poll():
+                self._conn.recv()
+            return True
+        except (EOFError, OSError):
+            return False
+
+    def read_latest(self):
+        """
+        Return the newest sample.
+        :return: A tuple (count, timestamp, values) where count is the number of samples written up to and including
+          this one and values is a dictionary mapping field names to float32 arrays, or None if nothing was written.
+        """
+        while True:
+            count = self.count
+            if count == 0:
+                return None
+            slot = (count - 1) % self.capacity
+            sample = self._data[slot].copy()
+            timestamp = float(self._timestamps[slot])
+            # If the writer lapped this slot while it was copied, the copy may be torn, try again.
+            if self.count - count < self.capacity - 1:
+                break
+
+        values, offset = {}, 0
+        for name, size in self.fields.items():
+            values[name] = sample[offset:offset + size]
+            offset += size
+        return count, timestamp, values
+
+    def close(self):
+        self._conn.close()
+        del self._header, self._timestamps, self._data
+        self._shm.close()
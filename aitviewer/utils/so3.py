@@ -130,15 +130,16 @@ def rot2euler_numpy(rotation_matrices, degrees=False):
     return euler_angles
 
 
-def interpolate_rotations(rotations, ts_in, ts_out):
-    """
-    Interpolate rotations given at timestamps `ts_in` to timestamps given at `ts_out`. This performs the equivalent
-    of cubic interpolation in SO(3).
-    :param rotations: A numpy array of rotations of shape (F, N, 3), i.e. rotation vectors.
-    :param ts_in: Timestamps corresponding to the given rotations, len(ts_in) == F
-    :param ts_out: The desired output timestamps.
-    :return: A numpy array of shape (len(ts_out), N, 3).
-    """
+def _compose_rotvecs(a, b):
+    """Return the rotation vectors of the rotations a * b for rotation vectors a and b of shape (..., 3)."""
+    shape = np.broadcast(a, b).shape
+    a = np.broadcast_to(a, shape).reshape(-1, 3)
+    b = np.broadcast_to(b, shape).reshape(-1, 3)
+    return (R.from_rotvec(a) * R.from_rotvec(b)).as_rotvec().reshape(shape)
+
+
+def _interpolate_rotations_scipy(rotations, ts_in, ts_out):
+    """Reference implementation fitting a scipy `RotationSpline` to every joint separately."""
     out = []
     for j in range(rotations.shape[1]):
         rs = R.from_rotvec(rotations[:, j])
@@ -148,12 +149,68 @@ def interpolate_rotations(rotations, ts_in, ts_out):
     return np.concatenate(out, axis=1)
 
 
-def resample_rotations(rotations, fps_in, fps_out):
+def interpolate_rotations(rotations, ts_in, ts_out, method='spline'):
+    """
+    Interpolate rotations given at timestamps `ts_in` to timestamps given at `ts_out`. All joints are interpolated at
+    once, every rotation between two keyframes is expressed as an offset in the tangent space of the first one.
+    :param rotations: A numpy array of rotations of shape (F, N, 3), i.e. rotation vectors.
+    :param ts_in: Timestamps corresponding to the given rotations, len(ts_in) == F, must be increasing.
+    :param ts_out: The desired output timestamps.
+    :param method: 'spline' for a cubic Hermite spline in the tangent space with the angular velocities at the
+      keyframes estimated from their neighbors, which is smooth in the first derivative. 'slerp' for spherical linear
+      interpolation, which is faster but not smooth at the keyframes. 'scipy' to fit a scipy `RotationSpline` to
+      every joint, which is smooth in the second derivative but much slower.
+    :return: A numpy array of shape (len(ts_out), N, 3).
+    """
+    if method == 'scipy':
+        return _interpolate_rotations_scipy(rotations, ts_in, ts_out)
+    if method not in ['spline', 'slerp']:
+        raise ValueError("Unknown interpolation method '{}', must be one of 'spline', 'slerp' or 'scipy'.".format(
+            method))
+    assert rotations.shape[0] > 1, "We need at least two rotations for an interpolation to make sense."
+
+    ts_in = np.asarray(ts_in, dtype=np.float64)
+    ts_out = np.asarray(ts_out, dtype=np.float64)
+    dts = np.diff(ts_in)
+
+    # Relative rotation from every keyframe to the next one, of shape (F-1, N, 3).
+    deltas = _compose_rotvecs(-rotations[:-1], rotations[1:])
+
+    # Index of the segment every output timestamp falls into and the normalized time within it. Timestamps outside
+    # of the input range are extrapolated from the first or last segment.
+    idxs = np.clip(np.searchsorted(ts_in, ts_out, side='right') - 1, 0, len(dts) - 1)
+    hs = ((ts_out - ts_in[idxs]) / dts[idxs])[:, np.newaxis, np.newaxis]
+
+    if method == 'slerp':
+        offsets = hs * deltas[idxs]
+    else:
+        # Angular velocities at the keyframes in their local frame. On the geodesic between two keyframes the local
+        # angular velocity is constant, so the rates of neighboring segments can be averaged directly.
+        rates = deltas / dts[:, np.newaxis, np.newaxis]
+        velocities = np.concatenate([rates[:1], rates], axis=0)
+        if len(dts) > 1:
+            # Weight the rate of each neighboring segment with the duration of the other one.
+            dt_prev = dts[:-1, np.newaxis, np.newaxis]
+            dt_next = dts[1:, np.newaxis, np.newaxis]
+            velocities[1:-1] = (dt_next * rates[:-1] + dt_prev * rates[1:]) / (dt_prev + dt_next)
+
+        # Cubic Hermite basis, the offset is 0 at the start of the segment and the relative rotation at its end.
+        dt = dts[idxs][:, np.newaxis, np.newaxis]
+        h10 = hs ** 3 - 2 * hs ** 2 + hs
+        h01 = -2 * hs ** 3 + 3 * hs ** 2
+        h11 = hs ** 3 - hs ** 2
+        offsets = h10 * velocities[idxs] * dt + h01 * deltas[idxs] + h11 * velocities[idxs + 1] * dt
+
+    return _compose_rotvecs(rotations[idxs], offsets)
+
+
+def resample_rotations(rotations, fps_in, fps_out, method='spline'):
     """
     Resample a motion sequence from `fps_in` to `fps_out`.
     :param rotations: A numpy array of shape (F, N, 3), i.e. in angle-axis form.
     :param fps_in: The frequency of the input sequence.
     :param fps_out: The desired frequency of the output sequence.
+    :param method: The interpolation method, see `interpolate_rotations`.
     :return: A numpy array of shape (F', N, 3) where F is adjusted according to the new fps.
     """
     n_frames = rotations.shape[0]
@@ -161,4 +218,4 @@ def resample_rotations(rotations, fps_in, fps_out):
     duration = n_frames / fps_in
     ts_in = np.arange(0, duration, 1 / fps_in)[:n_frames]
     ts_out = np.arange(0, duration, 1 / fps_out)
-    return interpolate_rotations(rotations, ts_in, ts_out)
+    return interpolate_rotations(rotations, ts_in, ts_out, method)
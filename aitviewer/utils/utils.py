@@ -14,13 +14,17 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
+import cv2
 import numpy as np
 import torch
 import os
+import struct
 import subprocess
+import zipfile
 
 from aitviewer.utils.so3 import aa2rot_torch as aa2rot
 from aitviewer.utils.so3 import rot2aa_torch as rot2aa
+from aitviewer.utils.video_writer import x264_args
 from scipy.interpolate import CubicSpline
 
 
@@ -65,52 +69,107 @@ def get_video_paths(video_path):
         return video_path_mp4, video_path_candidate, is_gif
 
 
+def _run_ffmpeg(command, output_path):
+    with open(os.devnull, 'w') as FNULL:
+        ret = subprocess.Popen(command, stdout=FNULL, stderr=FNULL).wait()
+    if ret != 0:
+        raise RuntimeError("ffmpeg failed with exit code {} while writing {}".format(ret, output_path))
+
+
+def encode_gif(input_args, output_path, n_frames=None, palette_sample=32, output_fps=None):
+    """
+    Encode a GIF with a palette computed from a sample of frames spread over the whole input. The palette is generated
+    first by an ffmpeg call that only keeps every k-th frame and the GIF is then encoded in a single pass. Unlike
+    splitting one stream into `palettegen` and `paletteuse`, no frames are buffered in memory until the palette is
+    known.
+    :param input_args: The ffmpeg arguments specifying the input, e.g. ['-i', 'video.mp4'].
+    :param output_path: Path of the GIF.
+    :param n_frames: Number of frames of the input if known, used to spread the sample over the input.
+    :param palette_sample: Approximate number of frames the palette is computed from.
+    :param output_fps: Optional frame rate of the GIF.
+    """
+    step = max(1, (n_frames or palette_sample) // palette_sample)
+    palette_path = output_path + '.palette.png'
+    try:
+        _run_ffmpeg(['ffmpeg'] + input_args + ['-vf', 'select=not(mod(n\\,{})),palettegen'.format(step),
+                                               '-frames:v', '1', '-y', palette_path], palette_path)
+        command = ['ffmpeg'] + input_args + ['-i', palette_path, '-lavfi', '[0:v][1:v]paletteuse=dither=none']
+        if output_fps is not None:
+            command += ['-r', str(output_fps)]
+        _run_ffmpeg(command + ['-y', output_path], output_path)
+    finally:
+        if os.path.exists(palette_path):
+            os.remove(palette_path)
+
+
 def video_to_gif(path_mp4, path_gif, remove=False):
+    """Convert a video to a GIF, see `encode_gif`."""
+    cap = cv2.VideoCapture(path_mp4)
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+    cap.release()
+    encode_gif(['-i', path_mp4], path_gif, n_frames=n_frames)
+
+    if remove:
+        os.remove(path_mp4)
+
+
+def concat_videos(paths, output_path, remove=False):
+    """
+    Concatenate videos that were encoded with the same settings into a single video without re-encoding them.
+    :param paths: The paths of the videos in the order in which they should be concatenated.
+    :param output_path: The path of the resulting video.
+    :param remove: Whether to delete the input videos afterwards.
+    """
+    list_path = output_path + '.txt'
+    with open(list_path, 'w') as f:
+        for p in paths:
+            f.write("file '{}'\n".format(os.path.abspath(p).replace("'", "'\\''")))
+
     command = ['ffmpeg',
-               '-i', path_mp4,
+               '-f', 'concat',
+               '-safe', '0',
+               '-i', list_path,
+               '-c', 'copy',
                '-y',
-               '-filter_complex', f"[0:v] split [a][b];[a] palettegen=stats_mode=single [p];[b][p] paletteuse=new=1:dither=none",
-               path_gif]
+               output_path]
 
-    with open(os.devnull, 'w') as FNULL:
-        subprocess.Popen(command, stdout=FNULL, stderr=FNULL).wait()
+    try:
+        _run_ffmpeg(command, output_path)
+    finally:
+        os.remove(list_path)
 
     if remove:
-        os.remove(path_mp4)
+        for p in paths:
+            os.remove(p)
 
 
 def images_to_video(frame_dir, video_path, frame_format='frame_%06d.png', input_fps=60, output_fps=60,
-                    start_frame=0):
+                    start_frame=0, preset=None):
     """Convert the rendered images into a video. The video path format determines whether this will be rendered as
-    a GIF or an MP4 (default)."""
+    a GIF or an MP4 (default). GIFs are encoded from the images directly with a palette computed from a sample of the
+    frames, see `encode_gif`.
+    :param preset: The encoder preset of mp4 videos, see `aitviewer.utils.video_writer.x264_args`."""
     if not os.path.exists(frame_dir):
         raise ValueError(f"Could not find directory containing frames {frame_dir}")
 
     path_mp4, path_gif, is_gif = get_video_paths(video_path)
+    output_path = path_gif if is_gif else path_mp4
 
-    print("Rendering to video {}".format(os.path.abspath(path_mp4)))
-
-    # Create mp4 from frames.
-    command = ['ffmpeg',
-               '-framerate', str(input_fps),  # must be this early in the command, otherwise it is not applied.
-               '-start_number', str(start_frame),
-               '-i', os.path.join(frame_dir, frame_format),
-               '-c:v', 'libx264',
-               '-preset', 'slow',
-               '-profile:v', 'high',
-               '-level:v', '4.0',
-               '-pix_fmt', 'yuv420p',
-               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',  # Avoid error when image res is not divisible by 2.
-               '-r', str(output_fps),
-               '-y',
-               path_mp4]
-
-    with open(os.devnull, 'w') as FNULL:
-        subprocess.Popen(command, stdout=FNULL, stderr=FNULL).wait()
+    print("Rendering to video {}".format(os.path.abspath(output_path)))
 
-    # If GIF we first create a temporary mp4 and then convert that to GIF to reduce palette artifacts.
+    input_args = ['-framerate', str(input_fps),  # must be this early in the command, otherwise it is not applied.
+                  '-start_number', str(start_frame),
+                  '-i', os.path.join(frame_dir, frame_format)]
     if is_gif:
-        video_to_gif(path_mp4, path_gif)
+        encode_gif(input_args, output_path, n_frames=len(os.listdir(frame_dir)), output_fps=output_fps)
+        return
+
+    command = ['ffmpeg'] + input_args + x264_args(preset)
+    command += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']  # Avoid error when image res is not divisible by 2.
+    command += ['-r', str(output_fps),
+                '-y',
+                output_path]
+    _run_ffmpeg(command, output_path)
 
 
 def interpolate_positions(positions, ts_in, ts_out):
@@ -142,6 +201,77 @@ def resample_positions(positions, fps_in, fps_out):
     return interpolate_positions(positions, ts_in, ts_out)
 
 
+def _read_npz_member_window(path, zf, info, start, end):
+    """Read rows [start, end) of the array stored in the given member of an npz file or None if not possible."""
+    with zf.open(info) as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        header_len = f.tell()
+
+        if fortran_order or dtype.hasobject or len(shape) == 0:
+            return None
+        start, end, _ = slice(start, end).indices(shape[0])
+        end = max(start, end)
+        row_shape = shape[1:]
+        row_bytes = int(np.prod(row_shape, dtype=np.int64)) * dtype.itemsize
+
+        if info.compress_type == zipfile.ZIP_STORED:
+            # Uncompressed members are mapped directly, only the pages of the window are read from disk.
+            with open(path, 'rb') as fh:
+                fh.seek(info.header_offset)
+                local_header = fh.read(30)
+            name_len, extra_len = struct.unpack('<HH', local_header[26:30])
+            offset = info.header_offset + 30 + name_len + extra_len + header_len + start * row_bytes
+            if end == start:
+                return np.empty((0,) + row_shape, dtype=dtype)
+            return np.array(np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(end - start,) + row_shape))
+
+        # Compressed members have to be decompressed up to the end of the window, but not beyond.
+        f.seek(header_len + start * row_bytes)
+        data = f.read((end - start) * row_bytes)
+        return np.frombuffer(data, dtype=dtype).reshape((end - start,) + row_shape).copy()
+
+
+def load_npz_window(path, start=None, end=None, windowed_keys=('poses', 'trans'), keys=None):
+    """
+    Load an npz file, reading only the frames [start, end) of the arrays in `windowed_keys`, e.g. a short clip of a
+    long AMASS sequence. Uncompressed arrays are memory-mapped and compressed arrays are decompressed only up to
+    `end`. Pass `keys` to skip the members that are not needed, otherwise all other arrays are loaded completely.
+    Members that store Python objects, e.g. the marker metadata of AMASS files, are never loaded.
+    :param path: Path to the npz file.
+    :param start: The first frame to load, None to start at the beginning.
+    :param end: The frame after the last frame to load, None to load until the end.
+    :param windowed_keys: The names of the arrays whose first dimension is the frame dimension.
+    :param keys: The names of the arrays to load or None to load all arrays. Missing names are ignored.
+    :return: A dictionary mapping the names of the arrays to numpy arrays.
+    """
+    data = {}
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if not info.filename.endswith('.npy'):
+                continue
+            key = info.filename[:-len('.npy')]
+            if keys is not None and key not in keys:
+                continue
+            arr = None
+            if key in windowed_keys:
+                arr = _read_npz_member_window(path, zf, info, start, end)
+            if arr is None:
+                with zf.open(info) as f:
+                    try:
+                        arr = np.lib.format.read_array(f, allow_pickle=False)
+                    except ValueError:
+                        # Object arrays require unpickling, which we never do for data files.
+                        continue
+                if key in windowed_keys:
+                    arr = arr[start:end]
+            data[key] = arr
+    return data
+
+
 def compute_vertex_and_face_normals_torch(vertices, faces, vertex_faces, normalize=False):
     """
     Compute (unnormalized) vertex normals for the given vertices.
@@ -0,0 +1,162 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import cv2
+import subprocess
+import threading
+import numpy as np
+
+
+class VideoReader(object):
+    """
+    Decode frames of a video file in a background thread with random access. Decoded frames are kept in a small
+    cache around the last requested frame and the frames following it are decoded ahead of time, so playback and
+    scrubbing do not wait for the decoder.
+
+    Seeking in compressed video means decoding from the previous keyframe. A keyframe index is built with ffprobe
+    in the background, it is used to decide whether it is faster to decode forward from the current position or to
+    seek to a keyframe.
+    """
+
+    def __init__(self, path, cache_size=64, read_ahead=16):
+        """
+        Initializer.
+        :param path: Path to the video file.
+        :param cache_size: Maximum number of decoded frames kept in memory.
+        :param read_ahead: Number of frames after the requested one that are decoded ahead of time.
+        """
+        assert cache_size > read_ahead, "The cache must be larger than the number of frames read ahead."
+        self.path = path
+        self.cache_size = cache_size
+        self.read_ahead = read_ahead
+
+        self._cap = cv2.VideoCapture(path)
+        if not self._cap.isOpened():
+            raise IOError("Cannot open video {}".format(path))
+        self.width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self._cap.get(cv2.CAP_PROP_FPS)
+        self.n_frames = int(self._cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        # Frame indices of the keyframes or None as long as the index is not available.
+        self.keyframes = None
+
+        self._cache = {}
+        self._failed = set()
+        self._target = 0
+        self._stopped = False
+        self._cond = threading.Condition()
+
+        self._index_thread = threading.Thread(target=self._build_keyframe_index, daemon=True)
+        self._index_thread.start()
+        self._thread = threading.Thread(target=self._decode_loop, daemon=True)
+        self._thread.start()
+
+    def _build_keyframe_index(self):
+        # Only packet headers are read, no frames are decoded.
+        command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+                   '-of', 'csv=print_section=0', self.path]
+        try:
+            output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+        except (OSError, subprocess.CalledProcessError):
+            return
+
+        keyframes = []
+        for line in output.decode().splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags and pts_time not in ('', 'N/A'):
+                keyframes.append(int(round(float(pts_time) * self.fps)))
+        if len(keyframes) > 0:
+            self.keyframes = np.unique(keyframes)
+
+    def _next_missing(self):
+        """The next frame the decoder should produce or None if all frames around the playhead are cached."""
+        for i in range(self._target, min(self._target + self.read_ahead, self.n_frames)):
+            if i not in self._cache and i not in self._failed:
+                return i
+        return None
+
+    def _decode_forward(self, pos, frame_id):
+        """Whether reaching `frame_id` by decoding forward from `pos` is at least as fast as seeking."""
+        if frame_id < pos:
+            return False
+        keyframes = self.keyframes
+        if keyframes is None:
+            return frame_id - pos <= self.read_ahead
+        # A seek starts decoding at the last keyframe before the frame.
+        k = np.searchsorted(keyframes, frame_id, side='right') - 1
+        return k < 0 or keyframes[k] <= pos
+
+    def _decode_loop(self):
+        pos = 0
+        while True:
+            with self._cond:
+                frame_id = self._next_missing()
+                while frame_id is None and not self._stopped:
+                    self._cond.wait()
+                    frame_id = self._next_missing()
+                if self._stopped:
+                    break
+
+            if frame_id != pos:
+                if self._decode_forward(pos, frame_id):
+                    while pos < frame_id and self._cap.grab():
+                        pos += 1
+                else:
+                    self._cap.set(cv2.CAP_PROP_POS_FRAMES, frame_id)
+                    pos = frame_id
+
+            ret, frame = self._cap.read()
+            pos += 1
+            if ret:
+                frame = cv2.cvtColor(cv2.flip(frame, 0), cv2.COLOR_BGR2RGB)
+
+            with self._cond:
+                if ret:
+                    self._cache[frame_id] = frame
+                else:
+                    self._failed.add(frame_id)
+                # Evict the frames that are farthest away from the playhead.
+                while len(self._cache) > self.cache_size:
+                    del self._cache[max(self._cache, key=lambda i: abs(i - self._target))]
+                self._cond.notify_all()
+
+    def get(self, frame_id, block=False, timeout=None):
+        """
+        Return a decoded frame and move the playhead to it.
+        :param frame_id: The index of the frame.
+        :param block: Whether to wait until the frame is decoded.
+        :param timeout: Maximum time in seconds to wait if `block` is set, None to wait until the frame is decoded.
+        :return: A np array of shape (H, W, 3) holding the RGB frame, bottom row first, or None if the frame is not
+          decoded yet or could not be decoded.
+        """
+        frame_id = int(np.clip(frame_id, 0, max(self.n_frames - 1, 0)))
+        with self._cond:
+            if frame_id != self._target:
+                self._target = frame_id
+                self._cond.notify_all()
+            if block:
+                self._cond.wait_for(lambda: frame_id in self._cache or frame_id in self._failed or self._stopped,
+                                    timeout)
+            return self._cache.get(frame_id)
+
+    def close(self):
+        """Stop decoding and release the video file."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._cap.release()
@@ -0,0 +1,280 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import numpy as np
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from aitviewer.configuration import CONFIG as C
+
+
+# Encoder settings trading encoding speed for file size. All presets use the same quality (crf), faster presets
+# produce bigger files.
+VIDEO_PRESETS = {
+    'fast': {'preset': 'ultrafast', 'crf': 23},
+    'balanced': {'preset': 'veryfast', 'crf': 23},
+    'small': {'preset': 'slow', 'crf': 23},
+}
+
+
+def x264_args(preset=None):
+    """
+    Return the ffmpeg arguments for encoding an mp4 with libx264.
+    :param preset: The name of one of the `VIDEO_PRESETS`, a dictionary with the keys 'preset' and 'crf' or None to
+      use the preset set in the configuration.
+    """
+    if preset is None:
+        preset = C.video_preset
+    if isinstance(preset, str):
+        if preset not in VIDEO_PRESETS:
+            raise ValueError("Unknown video preset '{}', must be one of {}.".format(preset, list(VIDEO_PRESETS)))
+        preset = VIDEO_PRESETS[preset]
+    return ['-c:v', 'libx264',
+            '-preset', preset['preset'],
+            '-crf', str(preset['crf']),
+            '-profile:v', 'high',
+            '-level:v', '4.0',
+            '-pix_fmt', 'yuv420p']
+
+
+class VideoWriter(object):
+    """
+    Encode raw RGB or RGBA frames to a video by piping them into ffmpeg from a background thread. Frames are passed as
+    they are read from an OpenGL framebuffer, i.e. bottom row first, and are flipped by ffmpeg.
+    """
+
+    def __init__(self, path, width, height, fps, components=3, output_size=None, flip=True, queue_size=8,
+                 preset=None):
+        """
+        Initializer.
+        :param path: Path of the output video.
+        :param width: Width of the frames in pixels.
+        :param height: Height of the frames in pixels.
+        :param fps: Frame rate of the video.
+        :param components: 3 if the frames are RGB, 4 if they are RGBA.
+        :param output_size: Optional (width, height) the frames are rescaled to by ffmpeg.
+        :param flip: Whether to flip the frames vertically.
+        :param queue_size: Maximum number of frames waiting to be encoded. If the queue is full `write` blocks, which
+          limits memory usage if rendering is faster than encoding.
+        :param preset: The encoder preset, see `x264_args`.
+        """
+        self.path = path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.components = components
+        self.output_size = output_size
+        self.flip = flip
+        self.preset = preset
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._process = None
+        self._thread = None
+        self._start()
+
+    def _filters(self):
+        filters = []
+        if self.flip:
+            filters.append('vflip')
+        if self.output_size is not None:
+            filters.append('scale={}:{}:flags=lanczos'.format(*self.output_size))
+        return filters
+
+    def _input_args(self):
+        return ['-f', 'rawvideo',
+                '-pix_fmt', 'rgba' if self.components == 4 else 'rgb24',
+                '-s', '{}x{}'.format(self.width, self.height),
+                '-framerate', str(self.fps),  # must be this early in the command, otherwise it is not applied.
+                '-i', '-']
+
+    def _command(self):
+        # Pad to avoid an error when the image resolution is not divisible by 2.
+        filters = self._filters() + ['pad=ceil(iw/2)*2:ceil(ih/2)*2']
+        return (['ffmpeg'] + self._input_args() + ['-vf', ','.join(filters)] + x264_args(self.preset) +
+                ['-r', str(self.fps), '-y', self.path])
+
+    def _start(self):
+        self._process = subprocess.Popen(self._command(), stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.DEVNULL)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            if self._error is not None:
+                continue
+            try:
+                self._process.stdin.write(frame)
+            except (BrokenPipeError, OSError) as e:
+                # Keep consuming the queue such that the producer does not block forever.
+                self._error = e
+
+    def write(self, frame):
+        """
+        Queue a frame for encoding.
+        :param frame: The raw bytes of a frame of size width * height * components.
+        """
+        if self._error is not None:
+            raise self._error
+        self._queue.put(frame)
+
+    def close(self):
+        """Wait until all frames are encoded and finalize the video."""
+        self._queue.put(None)
+        self._thread.join()
+        self._process.stdin.close()
+        ret = self._process.wait()
+        if self._error is not None:
+            raise self._error
+        if ret != 0:
+            raise RuntimeError("ffmpeg failed with exit code {} while writing {}".format(ret, self.path))
+
+
+class GifWriter(VideoWriter):
+    """
+    Encode raw frames to a GIF in a single pass. The palette is computed from a sample of the first frames, which are
+    held back until the sample is complete, all following frames are piped into ffmpeg directly. Since frames are
+    streamed, only the first `palette_sample` frames contribute to the palette, colors that only appear later in the
+    video are mapped to the closest color of the palette. Use `encode_gif` on a finished video to sample the whole
+    video instead.
+    """
+
+    def __init__(self, path, width, height, fps, components=3, output_size=None, flip=True, queue_size=8,
+                 palette_sample=16):
+        """
+        Initializer.
+        :param palette_sample: Number of frames the palette is computed from, see `VideoWriter` for the other
+          parameters.
+        """
+        self.palette_sample = palette_sample
+        self._sample = []
+        self._palette_path = None
+        super().__init__(path, width, height, fps, components=components, output_size=output_size, flip=flip,
+                         queue_size=queue_size)
+
+    def _start(self):
+        # The encoder is started once the palette is known.
+        if len(self._sample) < self.palette_sample:
+            return
+
+        # Quantize a mosaic of the sampled frames to 256 colors and store the palette as a 16x16 image for ffmpeg.
+        # Frames are subsampled spatially to keep quantization fast.
+        frames = [np.frombuffer(f, dtype=np.uint8).reshape(self.height, self.width, self.components)[::4, ::4, :3]
+                  for f in self._sample]
+        mosaic = Image.fromarray(np.concatenate(frames, axis=0))
+        palette = np.array(mosaic.quantize(256).getpalette()[:768], dtype=np.uint8)
+        palette = np.pad(palette, (0, 768 - len(palette))).reshape(16, 16, 3)
+        fd, self._palette_path = tempfile.mkstemp(suffix='.png')
+        os.close(fd)
+        Image.fromarray(palette).save(self._palette_path)
+
+        super()._start()
+        for f in self._sample:
+            self._queue.put(f)
+        self._sample = None
+
+    def _command(self):
+        filters = ','.join(self._filters()) or 'null'
+        return (['ffmpeg'] + self._input_args() + ['-i', self._palette_path,
+                '-lavfi', '[0:v]{}[v];[v][1:v]paletteuse=dither=none'.format(filters),
+                '-r', str(self.fps), '-y', self.path])
+
+    def write(self, frame):
+        if self._process is None:
+            self._sample.append(frame)
+            self._start()
+        else:
+            super().write(frame)
+
+    def close(self):
+        """Wait until all frames are encoded and finalize the GIF."""
+        if self._process is None:
+            if len(self._sample) == 0:
+                return
+            self.palette_sample = len(self._sample)
+            self._start()
+        try:
+            super().close()
+        finally:
+            os.remove(self._palette_path)
+
+
+class ImageWriter(object):
+    """Save raw RGB or RGBA frames as images from a pool of worker threads."""
+
+    def __init__(self, frame_dir, width, height, components=3, output_size=None, flip=True, n_workers=None,
+                 max_pending=16):
+        """
+        Initializer.
+        :param frame_dir: Directory where the images are saved.
+        :param width: Width of the frames in pixels.
+        :param height: Height of the frames in pixels.
+        :param components: 3 if the frames are RGB, 4 if they are RGBA.
+        :param output_size: Optional (width, height) the images are resized to.
+        :param flip: Whether to flip the frames vertically.
+        :param n_workers: Number of worker threads, defaults to the number of CPUs.
+        :param max_pending: Maximum number of images waiting to be saved before `write` blocks.
+        """
+        self.frame_dir = frame_dir
+        self.width = width
+        self.height = height
+        self.components = components
+        self.output_size = output_size
+        self.flip = flip
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=n_workers or os.cpu_count())
+        self._pending = []
+
+    def _save(self, frame, path):
+        img = Image.frombytes('RGBA' if self.components == 4 else 'RGB', (self.width, self.height), frame)
+        if self.components == 4:
+            img = img.convert('RGB')
+        if self.flip:
+            img = img.transpose(Image.FLIP_TOP_BOTTOM)
+        if self.output_size is not None:
+            img = img.resize(self.output_size, Image.LANCZOS)
+        img.save(path)
+
+    def write(self, frame, name):
+        """
+        Queue a frame to be saved.
+        :param frame: The raw bytes of a frame of size width * height * components.
+        :param name: File name of the image inside the frame directory.
+        """
+        # Drop finished jobs, result() re-raises errors that happened in the worker threads.
+        for f in [f for f in self._pending if f.done()]:
+            f.result()
+            self._pending.remove(f)
+        if len(self._pending) >= self.max_pending:
+            self._pending.pop(0).result()
+        self._pending.append(self._executor.submit(self._save, frame, os.path.join(self.frame_dir, name)))
+
+    def close(self):
+        """Wait until all images are saved."""
+        for f in self._pending:
+            f.result()
+        self._pending = []
+        self._executor.shutdown()
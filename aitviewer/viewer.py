@@ -20,7 +20,6 @@ import moderngl
 import moderngl_window
 import numpy as np
 import os
-import skvideo.io
 import struct
 import trimesh
 
@@ -29,13 +28,15 @@ from aitviewer.configuration import CONFIG as C
 from aitviewer.renderables.billboard import Billboard
 from aitviewer.renderables.meshes import Meshes, VariableTopologyMeshes
 from aitviewer.renderables.point_clouds import PointClouds
+from aitviewer.render_target import OffscreenTarget
 from aitviewer.scene.camera import PinholeCamera, ViewerCamera
 from aitviewer.scene.scene import Scene
 from aitviewer.scene.node import Node
 from aitviewer.shaders import clear_shader_cache
 from aitviewer.streamables.streamable import Streamable
 from aitviewer.utils import PerfTimer, path
-from aitviewer.utils.utils import get_video_paths, video_to_gif
+from aitviewer.utils.utils import get_video_paths
+from aitviewer.utils.video_writer import GifWriter, ImageWriter, VideoWriter
 from collections import namedtuple
 from moderngl_window import activate_context
 from moderngl_window import geometry
@@ -45,6 +46,7 @@ from moderngl_window.opengl.vao import VAO
 from omegaconf.dictconfig import DictConfig
 from pathlib import Path
 from PIL import Image
+from time import perf_counter
 from tqdm import tqdm
 from typing import Tuple, Union
 
@@ -141,14 +143,27 @@ class Viewer(moderngl_window.WindowConfig):
         self.picker_output = self.ctx.buffer(reserve=5*4)  # 3 floats, 2 ints
         self.picker_vao = VAO(mode=moderngl.POINTS)
 
+        # Ring of output buffers for non-blocking picking in inspect mode. A pick is only read back once
+        # `picker_latency` frames have been rendered after it was issued, so that reading does not stall the GPU.
+        self.picker_ring = [self.ctx.buffer(reserve=5*4) for _ in range(3)]
+        self.picker_latency = 2
+
         # Shaders for drawing outlines
         self.outline_prepare_prog = self.load_program('outline/outline_prepare.glsl')
         self.outline_draw_prog = self.load_program('outline/outline_draw.glsl')
         self.outline_quad = geometry.quad_2d(size=(2.0, 2.0), pos=(0.0, 0.0))
 
+        # Shader for converting object ids to a color mask.
+        self.id_mask_prog = self.load_program('fragment_picking/id_mask.glsl')
+        self.id_mask_prog['obj_info_texture'].value = 0
+
         # Create framebuffers
         self.create_framebuffers()
 
+        # Optional offscreen target that exported frames are rendered to instead of the window.
+        self.offscreen_target = None
+        self._active_target = None
+
         # Custom UI Font
         self.font_dir = Path(__file__).parent / 'resources' / 'fonts'
         self.fonts = imgui.get_io().fonts
@@ -236,6 +251,15 @@ class Viewer(moderngl_window.WindowConfig):
         )
         self.offscreen_p_tri_id.filter = (moderngl.NEAREST, moderngl.NEAREST)
 
+        # Color mask computed from the object ids of the fragment map.
+        self.offscreen_mask = self.ctx.texture(self.wnd.buffer_size, 4)
+        self.offscreen_mask_framebuffer = self.ctx.framebuffer(color_attachments=[self.offscreen_mask])
+
+        # The fragment map is rendered on demand, keep track of whether it is stale and which region it covers.
+        self._fragmap_dirty = True
+        self._fragmap_region = None
+        self._fragmap_key = None
+
         # Outline rendering
         self.outline_texture = self.ctx.texture(self.wnd.buffer_size, 1, dtype='f4')
         self.outline_framebuffer = self.ctx.framebuffer(color_attachments=[self.outline_texture])
@@ -271,6 +295,11 @@ class Viewer(moderngl_window.WindowConfig):
 
         # Mouse mesh intersection in inspect mode.
         self.mmi = None
+        self._picker_ring_index = 0
+        self._picker_pending = []
+        self._picker_frame = 0
+        self._inverse_view_matrix = None
+        self._inverse_view_matrix_key = None
 
         # Mouse selection
         self._move_threshold = 3
@@ -326,6 +355,14 @@ class Viewer(moderngl_window.WindowConfig):
 
     def render(self, time, frame_time, export=False):
         """The main drawing function."""
+        # Collect the results of non-blocking picks issued a few frames ago.
+        self._picker_frame += 1
+        if not export and len(self._picker_pending) > 0:
+            self.poll_mesh_mouse_intersection()
+
+        # Apply changes other threads made to the scene since the last frame.
+        self.scene.updates.apply(self.scene)
+
         if self.run_animations:
             # Compute number of frames to advance by.
             frames = (int)((time - self._last_frame_rendered_at) * self.playback_fps)
@@ -333,18 +370,31 @@ class Viewer(moderngl_window.WindowConfig):
                 self.scene.current_frame_id = (self.scene.current_frame_id + frames) % self.scene.n_frames
                 self._last_frame_rendered_at += frames * (1.0 / self.playback_fps)
 
+        # Exported frames are rendered to the offscreen target if there is one.
+        self._active_target = self.offscreen_target if export else None
+
         # Update camera matrices that will be used for rendering
         if isinstance(self.scene.camera, ViewerCamera):
             self.scene.camera.update_animation(frame_time)
-        self.scene.camera.update_matrices(self.window.size[0], self.window.size[1])
+        self.scene.camera.update_matrices(*self._get_render_size())
 
         if not export:
             self.streamable_capture()
 
-        self.render_fragmap()
+        # Apply pending frame changes only to the nodes that are about to be drawn.
+        self.scene.update_frame()
+
+        # The fragment map is only rendered when picking, mark it as stale if the view or the scene might have changed.
+        # Exported frames always get a fresh fragment map since their outputs are read back right away.
+        fragmap_key = (self.scene.camera.get_view_projection_matrix().tobytes(), self.scene.current_frame_id,
+                       self._scene_key())
+        if export or fragmap_key != self._fragmap_key or self.imgui.io.want_capture_mouse:
+            self._fragmap_dirty = True
+        self._fragmap_key = fragmap_key
+
         self.render_shadowmap()
         self.render_prepare()
-        self.render_scene()
+        self.render_scene(export)
         self.render_outline([n for n in self.scene.collect_nodes() if n.draw_outline], (0.3, 0.7, 1, 1))
 
         if not export:
@@ -354,6 +404,8 @@ class Viewer(moderngl_window.WindowConfig):
 
             # If visualize is True draw a texture with the object id to the screen for debugging.
             if self.visualize:
+                self.ensure_fragmap()
+                self.wnd.use()
                 self.ctx.enable_only(moderngl.NOTHING)
                 self.offscreen_p_tri_id.use(location=0)
                 self.vis_prog['hash_color'] = True
@@ -366,11 +418,22 @@ class Viewer(moderngl_window.WindowConfig):
             # Render the UI components.
             self.gui()
 
+    def _scene_key(self):
+        """A hashable value that changes whenever the set of drawn nodes, their transforms or geometry might change."""
+        key = []
+        for n in self.scene.collect_nodes():
+            # Access the model matrix first such that its version is up to date.
+            n.model_matrix
+            key.append((n.uid, n.is_renderable, n.current_frame_id, n._model_matrix_version, n._geometry_version))
+        return tuple(key)
+
     def streamable_capture(self):
         # Collect all streamable nodes
         rs = self.scene.collect_nodes(obj_type=Streamable)
         for r in rs:
             r.capture()
+        if len(rs) > 0:
+            self._fragmap_dirty = True
 
     def render_shadowmap(self):
         """A pass to render the shadow map, i.e. render the entire scene once from the view of the light."""
@@ -378,43 +441,95 @@ class Viewer(moderngl_window.WindowConfig):
         if self.shadows_enabled:
             rs = self.scene.collect_nodes()
 
+            # Shadow maps are only rendered again if any of the casters or the light changed.
+            casters_key = []
+            for r in rs:
+                k = r.shadow_key
+                if k is not None:
+                    casters_key.append((r.uid, k))
+            casters_key = tuple(casters_key)
+
             for light in self.scene.lights:
                 if light.shadow_enabled:
-                    light.use(self.ctx)
                     light_matrix = light.mvp()
+                    if not light.is_shadow_map_dirty(casters_key):
+                        continue
+                    light.use(self.ctx)
                     for r in rs:
                         r.render_shadowmap(light_matrix, self.depth_only_prog)
 
-    def render_fragmap(self):
-        """A pass to render the fragment picking map, i.e. render the scene with world coords as colors."""
+    def render_fragmap(self, region=None):
+        """
+        A pass to render the fragment picking map, i.e. render the scene with world coords as colors.
+        :param region: An optional (x, y, width, height) rectangle in framebuffer pixels. If given, only this region
+          of the fragment map is rendered.
+        """
         self.ctx.enable_only(moderngl.DEPTH_TEST)
-        self.offscreen_p.clear()
+        self.offscreen_p.scissor = region
+        self.offscreen_p.clear(viewport=region)
         self.offscreen_p.use()
         rs = self.scene.collect_nodes()
         for r in rs:
             r.render_fragmap(self.ctx, self.scene.camera, self.frag_map_prog)
+        self.offscreen_p.scissor = None
+
+        self._fragmap_dirty = False
+        self._fragmap_region = region
+
+    def ensure_fragmap(self, pos=None, radius=8):
+        """
+        Render the fragment picking map if it is stale or if it does not cover the given position.
+        :param pos: An (x, y) position in framebuffer pixels. If given, only a small region around this position is
+          rendered, otherwise the whole fragment map.
+        :param radius: Half the size of the region rendered around `pos`.
+        """
+        region = self._fragmap_region
+        if pos is None:
+            if self._fragmap_dirty or region is not None:
+                self.render_fragmap()
+        else:
+            covered = region is None or (region[0] <= pos[0] < region[0] + region[2] and
+                                         region[1] <= pos[1] < region[1] + region[3])
+            if self._fragmap_dirty or not covered:
+                x, y = max(pos[0] - radius, 0), max(pos[1] - radius, 0)
+                self.render_fragmap((x, y, 2 * radius, 2 * radius))
+
+    def _get_render_size(self):
+        """Return the size of the framebuffer that is currently rendered to."""
+        if self._active_target is not None:
+            return self._active_target.render_size
+        return self.window.size
 
     def render_outline(self, nodes, color):
+        target = self._active_target
+        outline_framebuffer = self.outline_framebuffer if target is None else target.outline_framebuffer
+        outline_texture = self.outline_texture if target is None else target.outline_texture
+        fbo = self.wnd.fbo if target is None else target.fbo
+
         # Prepare the outline buffer, all objects rendered to this buffer will be outlined.
-        self.outline_framebuffer.clear()
-        self.outline_framebuffer.use()
+        outline_framebuffer.clear()
+        outline_framebuffer.use()
         # Render outline of the nodes with outlining enabled, this potentially also renders their children.
         for n in nodes:
             n.render_outline(self.ctx, self.scene.camera, self.outline_prepare_prog)
 
         # Render the outline effect to the window.
-        self.wnd.use()
-        self.wnd.fbo.depth_mask = False
+        fbo.use()
+        fbo.depth_mask = False
         self.ctx.enable_only(moderngl.NOTHING)
-        self.outline_texture.use(0)
+        outline_texture.use(0)
         self.outline_draw_prog['outline'] = 0
         self.outline_draw_prog['outline_color'] = color
         self.outline_quad.render(self.outline_draw_prog)
-        self.wnd.fbo.depth_mask = True
+        fbo.depth_mask = True
 
-    def render_scene(self):
-        """Render the current scene to the framebuffer without time accounting and GUI elements."""
-        self.scene.render(window_size=self.window.size,
+    def render_scene(self, export=False):
+        """
+        Render the current scene to the framebuffer without time accounting and GUI elements.
+        :param export: Whether the frame is exported, in which case nodes wait for data that is loaded asynchronously.
+        """
+        self.scene.render(window_size=self._get_render_size(),
+                          export=export,
                           lights=self.scene.lights,
                           shadows_enabled=self.shadows_enabled,
                           show_camera_target=self.show_camera_target and not self._using_temp_camera,
@@ -422,7 +537,10 @@ class Viewer(moderngl_window.WindowConfig):
 
     def render_prepare(self):
         """Prepare the framebuffer."""
-        self.wnd.use()
+        if self._active_target is not None:
+            self._active_target.use()
+        else:
+            self.wnd.use()
         # Clear background and make sure only the flags we want are enabled.
         if self.dark_mode:
             self.ctx.clear(0.1, 0.1, 0.1, 1.0)
@@ -845,24 +963,51 @@ class Viewer(moderngl_window.WindowConfig):
                 imgui.close_current_popup()
             imgui.end_popup()
 
-    def mesh_mouse_intersection(self, x: int, y: int):
-        """Given an x/y screen coordinate, get the intersected object, triangle id, and xyz point in camera space"""
-
+    def _pick(self, x: int, y: int, output):
+        """Write the position, object id and triangle id under the x/y screen coordinate into the `output` buffer."""
         # Texture is y=0 at bottom, so we flip y coords
         pos = int(x * self.wnd.pixel_ratio), int(self.wnd.buffer_height - (y * self.wnd.pixel_ratio))
 
+        # Make sure the fragment map is up to date at the picked position.
+        self.ensure_fragmap(pos)
+
         # Fragment picker uses already encoded position/object/triangle in the frag_pos program textures
         self.frag_pick_prog['texel_pos'].value = pos
         self.offscreen_p_viewpos.use(location=0)
         self.offscreen_p_tri_id.use(location=1)
-        self.picker_vao.transform(self.frag_pick_prog, self.picker_output, vertices=1)
-        x, y, z, obj_id, tri_id = struct.unpack('3f2i', self.picker_output.read())
+        self.picker_vao.transform(self.frag_pick_prog, output, vertices=1)
+
+    def _get_inverse_view_matrix(self):
+        """Return the inverse of the camera view matrix, it is only recomputed when the view matrix changes."""
+        view = self.scene.camera.get_view_matrix()
+        key = view.tobytes()
+        if key != self._inverse_view_matrix_key:
+            self._inverse_view_matrix = np.linalg.inv(view)
+            self._inverse_view_matrix_key = key
+        return self._inverse_view_matrix
+
+    def _decode_pick(self, data, inverse_view_matrix, model_matrices=None):
+        """
+        Convert the content of a picker output buffer into a MeshMouseIntersection or None if nothing was hit.
+        :param data: The content of the picker output buffer.
+        :param inverse_view_matrix: The inverse view matrix of the camera at the time of the pick.
+        :param model_matrices: Optional dictionary mapping node uids to their model matrix at the time of the pick,
+          otherwise the current model matrix of the hit node is used.
+        """
+        x, y, z, obj_id, tri_id = struct.unpack('3f2i', data)
 
         if obj_id >= 0 and tri_id >= 0:
             node = self.scene.get_node_by_uid(obj_id)
+            if node is None:
+                return None
+
             # Camera space to world space
-            point_world = np.array(np.linalg.inv(self.scene.camera.get_view_matrix()) @ np.array((x, y, z, 1.0)))[:-1]
-            point_local = (np.linalg.inv(node.model_matrix) @ np.append(point_world, 1.0))[:-1]
+            point_world = np.array(inverse_view_matrix @ np.array((x, y, z, 1.0)))[:-1]
+            if model_matrices is not None and obj_id in model_matrices:
+                inverse_model_matrix = np.linalg.inv(model_matrices[obj_id])
+            else:
+                inverse_model_matrix = node.inverse_model_matrix
+            point_local = (inverse_model_matrix @ np.append(point_world, 1.0))[:-1]
             if isinstance(node, Meshes) or isinstance(node, Billboard) or isinstance(node, VariableTopologyMeshes):
                 vert_id = node.closest_vertex_in_triangle(tri_id, point_local)
                 bc_coords = node.get_bc_coords_from_points(tri_id, [point_local])
@@ -877,6 +1022,39 @@ class Viewer(moderngl_window.WindowConfig):
 
         return None
 
+    def mesh_mouse_intersection(self, x: int, y: int):
+        """Given an x/y screen coordinate, get the intersected object, triangle id, and xyz point in camera space"""
+        self._pick(x, y, self.picker_output)
+        return self._decode_pick(self.picker_output.read(), self._get_inverse_view_matrix())
+
+    def request_mesh_mouse_intersection(self, x: int, y: int):
+        """
+        Issue a non-blocking pick at the given x/y screen coordinate. The result is read back a few frames later by
+        `poll_mesh_mouse_intersection` and stored in `self.mmi`.
+        """
+        # If all buffers are in flight drop the oldest request, only the most recent pick is of interest.
+        if len(self._picker_pending) == len(self.picker_ring):
+            self._picker_pending.pop(0)
+
+        output = self.picker_ring[self._picker_ring_index]
+        self._picker_ring_index = (self._picker_ring_index + 1) % len(self.picker_ring)
+        self._pick(x, y, output)
+        # The result is decoded a few frames later, keep the transforms of this frame since the nodes might move.
+        # Model matrices are replaced rather than modified when they change, so keeping references is enough.
+        model_matrices = {n.uid: n.model_matrix for n in self.scene.collect_nodes()}
+        self._picker_pending.append((output, self._picker_frame, self._get_inverse_view_matrix(), model_matrices))
+
+    def poll_mesh_mouse_intersection(self):
+        """Read back the most recent non-blocking pick that is old enough to be available without stalling."""
+        ready = [p for p in self._picker_pending if self._picker_frame - p[1] >= self.picker_latency]
+        if len(ready) == 0:
+            return
+
+        # Older results are superseded by the most recent one.
+        self._picker_pending = self._picker_pending[len(ready):]
+        output, _, inverse_view_matrix, model_matrices = ready[-1]
+        self.mmi = self._decode_pick(output.read(), inverse_view_matrix, model_matrices)
+
     def select_object(self, x: int, y: int):
         """Selects the object at pixel coordinates x, y, returns True if an object is selected"""
         mmi = self.mesh_mouse_intersection(x, y)
@@ -936,6 +1114,9 @@ class Viewer(moderngl_window.WindowConfig):
             return
 
         if action == self.wnd.keys.ACTION_PRESS:
+            # Shortcuts can modify the scene, so the fragment map has to be rendered again on the next pick.
+            self._fragmap_dirty = True
+
             if key == self._exit_key:
                 self._exit_popup_open = True
 
@@ -1002,7 +1183,7 @@ class Viewer(moderngl_window.WindowConfig):
         self.imgui.mouse_position_event(x, y, dx, dy)
 
         if self.selected_mode == 'inspect':
-            self.mmi = self.mesh_mouse_intersection(x, y)
+            self.request_mesh_mouse_intersection(x, y)
 
     def mouse_press_event(self, x: int, y: int, button: int):
         self.imgui.mouse_press_event(x, y, button)
@@ -1067,6 +1248,40 @@ class Viewer(moderngl_window.WindowConfig):
     def unicode_char_entered(self, char):
         self.imgui.unicode_char_entered(char)
 
+    def create_offscreen_target(self, width, height, supersampling=1):
+        """
+        Render exported frames to an offscreen framebuffer instead of the window. The resolution of exports is then
+        independent of the window size, e.g. 4K videos can be rendered from a small headless context.
+        :param width: Width of the exported frames in pixels.
+        :param height: Height of the exported frames in pixels.
+        :param supersampling: Render at this multiple of the resolution and downsample on the GPU for anti-aliasing,
+          must be a power of two.
+        """
+        self.release_offscreen_target()
+        self.offscreen_target = OffscreenTarget(self.ctx, width, height, supersampling)
+
+    def release_offscreen_target(self):
+        """Release the offscreen target, exported frames are rendered to the window again."""
+        if self.offscreen_target is not None:
+            self.offscreen_target.release()
+            self.offscreen_target = None
+
+    def _prepare_export_target(self, scale_factor=None, supersampling=1):
+        """
+        Create a temporary offscreen target for an export that is scaled or supersampled, unless an offscreen target
+        was already set by the user. Returns True if a temporary target was created.
+        """
+        scaled = scale_factor is not None and scale_factor != 1.0
+        if self.offscreen_target is not None or (not scaled and supersampling == 1):
+            return False
+
+        viewport = self.wnd.fbo.viewport
+        width, height = viewport[2] - viewport[0], viewport[3] - viewport[1]
+        if scaled:
+            width, height = int(width * scale_factor), int(height * scale_factor)
+        self.create_offscreen_target(width, height, supersampling)
+        return True
+
     def save_current_frame_as_image(self, path, scale_factor=None):
         """Saves the current frame as an image to disk."""
         image = self.get_current_frame_as_image()
@@ -1078,6 +1293,10 @@ class Viewer(moderngl_window.WindowConfig):
 
     def get_current_frame_as_image(self):
         """Return the FBO content as a PIL image."""
+        if self.offscreen_target is not None:
+            image = Image.frombytes('RGBA', self.offscreen_target.size, self.offscreen_target.read()).convert('RGB')
+            return image.transpose(Image.FLIP_TOP_BOTTOM)
+
         image = Image.frombytes('RGB',
                                 (self.wnd.fbo.viewport[2] - self.wnd.fbo.viewport[0],
                                  self.wnd.fbo.viewport[3] - self.wnd.fbo.viewport[1]),
@@ -1094,10 +1313,14 @@ class Viewer(moderngl_window.WindowConfig):
         everything outside this range is clipped by OpenGL.
         """
         # Get depth image from depth buffer.
-        depth = Image.frombytes('F',
-                                (self.wnd.fbo.viewport[2] - self.wnd.fbo.viewport[0],
-                                 self.wnd.fbo.viewport[3] - self.wnd.fbo.viewport[1]),
-                                self.wnd.fbo.read(viewport=self.wnd.fbo.viewport, alignment=1, attachment=-1, dtype='f4'))
+        if self.offscreen_target is not None:
+            depth = self.offscreen_target.read_depth()
+        else:
+            depth = Image.frombytes('F',
+                                    (self.wnd.fbo.viewport[2] - self.wnd.fbo.viewport[0],
+                                     self.wnd.fbo.viewport[3] - self.wnd.fbo.viewport[1]),
+                                    self.wnd.fbo.read(viewport=self.wnd.fbo.viewport, alignment=1, attachment=-1,
+                                                      dtype='f4'))
 
         # Convert from [0, 1] range to [-1, 1] range.
         # This is necessary because our projection matrix computes NDC
@@ -1118,29 +1341,81 @@ class Viewer(moderngl_window.WindowConfig):
         Render and return a color mask as a 'RGB' PIL image. Each object in the mask
         has a uniform color computed as an hash of the Node uid.
         """
-        # Get object ids as floating point numbers from the first channel of
-        # the first attachment of the picking framebuffer.
-        id = Image.frombytes('F',
-                             (self.wnd.fbo.viewport[2] - self.wnd.fbo.viewport[0],
-                              self.wnd.fbo.viewport[3] - self.wnd.fbo.viewport[1]),
-                             self.offscreen_p.read(viewport=self.wnd.fbo.viewport, alignment=1, components=1, attachment=1, dtype='f4'))
-
-        # Convert the id to integer values.
-        id_int = np.asarray(id).astype(dtype=np.int32)
-
-        # Hash the ids.
-        def hash(h):
-            h ^= h >> 16
-            h *= 0x85ebca6b
-            h ^= h >> 13
-            h *= 0xc2b2ae35
-            h ^= h >> 16
-            return h
-        hashed = hash(id_int.copy())
-
-        # Convert the hashed ids to an RGBA image and then throw away the alpha channel.
-        img = Image.frombytes('RGBA', id.size, hashed.tobytes()).convert('RGB')
-        return img.transpose(Image.FLIP_TOP_BOTTOM)
+        return Image.fromarray(self.get_current_outputs(rgb=False, depth=False, ids=False, mask=True)['mask'])
+
+    def _render_ids(self):
+        """
+        Make sure the fragment map of the current frame is rendered at the output resolution.
+        :return: The framebuffer containing the fragment map, the mask framebuffer and the viewport to read.
+        """
+        target = self.offscreen_target
+        if target is None:
+            # The outputs are read from the whole fragment map of the window.
+            self.ensure_fragmap()
+            return self.offscreen_p, self.offscreen_mask_framebuffer, self.wnd.fbo.viewport
+
+        target.create_id_buffers()
+        self.ctx.enable_only(moderngl.DEPTH_TEST)
+        target.id_framebuffer.clear()
+        target.id_framebuffer.use()
+        for r in self.scene.collect_nodes():
+            r.render_fragmap(self.ctx, self.scene.camera, self.frag_map_prog)
+        return target.id_framebuffer, target.mask_framebuffer, None
+
+    def get_current_outputs(self, rgb=True, depth=True, ids=True, mask=False):
+        """
+        Return several outputs of the last rendered frame as np arrays, such that the scene has to be rendered only
+        once per sample. All arrays have the top row first and are read-only views into the data read from the GPU
+        where possible.
+        :param rgb: Whether to return the color image as 'rgb', a uint8 array of shape (H, W, 3).
+        :param depth: Whether to return the linear depth as 'depth', a float32 array of shape (H, W) containing the
+          z distance to the camera in view space, 0 where nothing was rendered.
+        :param ids: Whether to return 'object_id' and 'triangle_id', int32 arrays of shape (H, W) containing the uid
+          of the rendered node (0 for the background) and the index of the rendered triangle (-1 for the background).
+        :param mask: Whether to return 'mask', a uint8 array of shape (H, W, 3) where each object has a uniform color
+          computed as a hash of its uid.
+        :return: A dictionary with the requested outputs.
+        """
+        outputs = {}
+        target = self.offscreen_target
+        if rgb:
+            if target is not None:
+                w, h = target.size
+                outputs['rgb'] = np.frombuffer(target.read(), dtype=np.uint8).reshape(h, w, 4)[::-1, :, :3]
+            else:
+                vp = self.wnd.fbo.viewport
+                data = self.wnd.fbo.read(viewport=vp, alignment=1)
+                outputs['rgb'] = np.frombuffer(data, dtype=np.uint8).reshape(vp[3] - vp[1], vp[2] - vp[0], 3)[::-1]
+
+        if not (depth or ids or mask):
+            return outputs
+
+        fbo, mask_fbo, viewport = self._render_ids()
+        w, h = target.size if target is not None else (viewport[2] - viewport[0], viewport[3] - viewport[1])
+
+        if depth:
+            data = fbo.read(viewport=viewport, alignment=1, components=4, attachment=0, dtype='f4')
+            outputs['depth'] = -np.frombuffer(data, dtype=np.float32).reshape(h, w, 4)[::-1, :, 2]
+
+        if ids:
+            data = fbo.read(viewport=viewport, alignment=1, components=4, attachment=1, dtype='f4')
+            obj_info = np.frombuffer(data, dtype=np.float32).reshape(h, w, 4)[::-1]
+            object_id = obj_info[..., 0].astype(np.int32)
+            triangle_id = obj_info[..., 1].astype(np.int32)
+            triangle_id[object_id == 0] = -1
+            outputs['object_id'] = object_id
+            outputs['triangle_id'] = triangle_id
+
+        if mask:
+            # Hash the object ids to colors on the GPU.
+            mask_fbo.use()
+            self.ctx.enable_only(moderngl.NOTHING)
+            fbo.color_attachments[1].use(0)
+            self.outline_quad.render(self.id_mask_prog)
+            data = mask_fbo.read(viewport=viewport, alignment=1, components=4)
+            outputs['mask'] = np.frombuffer(data, dtype=np.uint8).reshape(h, w, 4)[::-1, :, :3]
+
+        return outputs
 
     def on_close(self):
         """
@@ -1161,11 +1436,13 @@ class Viewer(moderngl_window.WindowConfig):
         self.export_frame(file_path)
         print(f"Screenshot saved to {file_path}")
 
-    def export_frame(self, file_path, scale_factor:float=None):
+    def export_frame(self, file_path, scale_factor:float=None, supersampling=1):
         """Save the current frame to an image.
         :param file_path: the path where the image is saved.
         :param scale_factor: a scale factor used to scale the image. If None no scale factor is used and
           the image will have the same size as the viewer.
+        :param supersampling: render at this multiple of the image size and downsample on the GPU, must be a power
+          of two. Ignored if an offscreen target was created with `create_offscreen_target`.
         """
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
@@ -1173,9 +1450,12 @@ class Viewer(moderngl_window.WindowConfig):
         run_animations = self.run_animations
         self.run_animations = False
 
-        # Render and save frame.
+        # Render and save frame, scaling is done by rendering at the target size directly.
+        temp_target = self._prepare_export_target(scale_factor, supersampling)
         self.render(0, 0, export=True)
-        self.save_current_frame_as_image(file_path, scale_factor)
+        self.save_current_frame_as_image(file_path, None if temp_target else scale_factor)
+        if temp_target:
+            self.release_offscreen_target()
 
         # Restore run animation and update last frame rendered time.
         self.run_animations = run_animations
@@ -1193,7 +1473,15 @@ class Viewer(moderngl_window.WindowConfig):
         rotate_camera=False,
         seconds_per_rotation=10.0,
         scale_factor=None,
+        supersampling=1,
+        preset=None,
         ):
+        """
+        Render frames to a video and/or to images.
+        :param preset: The encoder preset of mp4 videos or None to use the one from the configuration, see
+          `aitviewer.utils.video_writer.VIDEO_PRESETS`.
+        :return: The path of the exported video or None if no video was exported.
+        """
         if rotate_camera and not isinstance(self.scene.camera, ViewerCamera):
             print("Cannot export a video with camera rotation while using a camera that is not a ViewerCamera")
             return
@@ -1260,66 +1548,95 @@ class Viewer(moderngl_window.WindowConfig):
         # Compute camera speed.
         az_delta = 2 * np.pi / seconds_per_rotation * (duration / frames)
 
-        # Initialize video writer.
-        if output_path is not None:
-            path_mp4, path_gif, is_gif = get_video_paths(output_path)
-            writer = skvideo.io.FFmpegWriter(
-                path_mp4,
-                inputdict = {
-                    '-framerate': str(output_fps),  # must be this early in the command, otherwise it is not applied.
-                },
-                outputdict = {
-                    '-c:v': 'libx264',
-                    '-preset': 'slow',
-                    '-profile:v': 'high',
-                    '-level:v': '4.0',
-                    '-pix_fmt': 'yuv420p',
-                    '-vf': 'pad=ceil(iw/2)*2:ceil(ih/2)*2',  # Avoid error when image res is not divisible by 2.
-                    '-r': str(output_fps),
-                })
-
-        for i in tqdm(range(frames), desc='Rendering frames'):
-            if rotate_camera:
-                self.scene.camera.rotate_azimuth(az_delta)
-
-            self.render(time, time + dt, export=True)
-            img = self.get_current_frame_as_image()
-
-            # Scale image by the scale factor.
-            if scale_factor is not None and scale_factor != 1.0:
-                w = int(img.width * scale_factor)
-                h = int(img.height * scale_factor)
-                img = img.resize((w, h), Image.LANCZOS)
-
-            # Store the image to disk if a directory for frames was given.
-            if frame_dir is not None:
-                img_name = os.path.join(frame_dir, 'frame_{:0>6}.png'.format(i))
-                img.save(img_name)
-
-            # Write the frame to the video writer.
+        # Scaled and supersampled frames are rendered to an offscreen target at the output size directly.
+        temp_target = self._prepare_export_target(scale_factor, supersampling)
+        target = self.offscreen_target
+        if target is not None:
+            (width, height), components = target.size, 4
+        else:
+            viewport = self.wnd.fbo.viewport
+            (width, height), components = (viewport[2] - viewport[0], viewport[3] - viewport[1]), 3
+
+        writer, image_writer, readback = None, None, []
+        try:
+            # Initialize the writers, encoding and saving images happens on background threads. Frames are passed as
+            # they are read from the framebuffer and flipped by the writers.
+            # GIFs are encoded directly in a single pass.
             if output_path is not None:
-                writer.writeFrame(np.array(img))
-
-            if exact_playback:
-                self.scene.current_frame_id = self.scene.current_frame_id + playback_count
-
-            time += dt
-
-        # Save the video.
+                path_mp4, path_gif, is_gif = get_video_paths(output_path)
+                if is_gif:
+                    writer = GifWriter(path_gif, width, height, output_fps, components=components)
+                else:
+                    writer = VideoWriter(path_mp4, width, height, output_fps, components=components, preset=preset)
+            if frame_dir is not None:
+                image_writer = ImageWriter(frame_dir, width, height, components=components)
+
+            # Frames are read back into a ring of buffers asynchronously and only mapped a few frames later, such that
+            # the GPU can keep rendering while previous frames are transferred.
+            readback = [self.ctx.buffer(reserve=width * height * components) for _ in range(3)]
+
+            def write_frame(idx):
+                data = readback[idx % len(readback)].read()
+                if image_writer is not None:
+                    image_writer.write(data, 'frame_{:0>6}.png'.format(idx))
+                if writer is not None:
+                    writer.write(data)
+
+            start_time = perf_counter()
+            for i in tqdm(range(frames), desc='Rendering frames'):
+                if rotate_camera:
+                    self.scene.camera.rotate_azimuth(az_delta)
+
+                self.render(time, time + dt, export=True)
+                if target is not None:
+                    target.read_into(readback[i % len(readback)])
+                else:
+                    self.wnd.fbo.read_into(readback[i % len(readback)], viewport=viewport, alignment=1)
+
+                # Write the oldest frame in flight.
+                if i >= len(readback) - 1:
+                    write_frame(i - len(readback) + 1)
+
+                if exact_playback:
+                    self.scene.current_frame_id = self.scene.current_frame_id + playback_count
+
+                time += dt
+
+            # Write the remaining frames.
+            for i in range(max(frames - len(readback) + 1, 0), frames):
+                write_frame(i)
+        finally:
+            # Release all resources and stop the writers even if rendering failed.
+            for b in readback:
+                b.release()
+            if temp_target:
+                self.release_offscreen_target()
+            try:
+                if image_writer is not None:
+                    image_writer.close()
+            finally:
+                if writer is not None:
+                    writer.close()
+
+                # Reset viewer data.
+                self.scene.camera = saved_camera
+                self.scene.current_frame_id = saved_curr_frame
+                self.run_animations = saved_run_animations
+                self._last_frame_rendered_at = self.timer.time
+
+        elapsed = perf_counter() - start_time
+        print("Exported {} frames in {:.2f}s ({:.2f} frames/s)".format(frames, elapsed, frames / max(elapsed, 1e-6)))
+
+        video_path = None
         if output_path is not None:
-            writer.close()
             if is_gif:
-                # Convert to gif.
-                video_to_gif(path_mp4, path_gif, remove=True)
+                video_path = path_gif
 
                 print(f"GIF saved to {os.path.abspath(path_gif)}")
             else:
-                print(f"Video saved to {os.path.abspath(output_path)}")
+                video_path = path_mp4
+                print(f"Video saved to {os.path.abspath(path_mp4)}")
         else:
             print(f"Frames saved to {os.path.abspath(frame_dir)}")
 
-        # Reset viewer data.
-        self.scene.camera = saved_camera
-        self.scene.current_frame_id = saved_curr_frame
-        self.run_animations = saved_run_animations
-        self._last_frame_rendered_at = self.timer.time
+        return video_path
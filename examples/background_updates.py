@@ -0,0 +1,67 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import threading
+import time
+import numpy as np
+
+from aitviewer.renderables.meshes import Meshes
+from aitviewer.renderables.spheres import Spheres
+from aitviewer.viewer import Viewer
+
+
+def grid(n):
+    """Vertices and faces of a flat n x n grid."""
+    x, z = np.meshgrid(np.linspace(-1, 1, n), np.linspace(-1, 1, n))
+    vertices = np.stack([x, np.zeros_like(x), z], axis=-1).reshape(-1, 3)
+    idxs = np.arange(n * n).reshape(n, n)
+    a, b, c, d = idxs[:-1, :-1].ravel(), idxs[:-1, 1:].ravel(), idxs[1:, :-1].ravel(), idxs[1:, 1:].ravel()
+    faces = np.concatenate([np.stack([a, c, b], -1), np.stack([b, c, d], -1)])
+    return vertices, faces
+
+
+def simulate(v, mesh, vertices, stop):
+    """Deform the mesh in a background thread much faster than the viewer renders, e.g. like an optimization."""
+    start = time.perf_counter()
+    next_marker = 0.0
+    while not stop.is_set():
+        t = time.perf_counter() - start
+        deformed = vertices.copy()
+        deformed[:, 1] = 0.2 * np.sin(4 * np.linalg.norm(vertices[:, [0, 2]], axis=-1) - 3 * t)
+        # Only the newest vertices are uploaded once per frame, older ones are dropped by the queue.
+        v.scene.updates.set_vertices(mesh, deformed[np.newaxis])
+
+        # Nodes can be added from this thread as well.
+        if t > next_marker:
+            next_marker += 2.0
+            marker = Spheres(np.array([[np.random.uniform(-1, 1), 0.5, np.random.uniform(-1, 1)]]), radius=0.05)
+            v.scene.updates.add(marker)
+        time.sleep(0.002)
+
+
+if __name__ == '__main__':
+    vertices, faces = grid(100)
+    mesh = Meshes(vertices[np.newaxis], faces, name="Wave", position=np.array([0.0, 1.0, 0.0]))
+
+    v = Viewer()
+    v.scene.add(mesh)
+
+    stop = threading.Event()
+    thread = threading.Thread(target=simulate, args=(v, mesh, vertices, stop), daemon=True)
+    thread.start()
+    v.run()
+    stop.set()
+    thread.join()
@@ -0,0 +1,59 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import multiprocessing as mp
+import resource
+import time
+import torch
+
+from aitviewer.configuration import CONFIG as C
+from aitviewer.models.smpl import SMPLLayer
+
+
+def evaluate(mode, n_frames, queue):
+    """Evaluate a SMPL-X sequence in a fresh process such that the peak memory only reflects this mode."""
+    layer = SMPLLayer(model_type='smplx', gender='neutral', device=C.device)
+    poses_body = torch.randn(n_frames, layer.bm.NUM_BODY_JOINTS * 3, device=C.device) * 0.1
+    betas = torch.zeros(1, layer.num_betas, device=C.device)
+
+    start = time.perf_counter()
+    if mode == 'autograd':
+        verts, joints = layer.fk(poses_body=poses_body, betas=betas)
+    else:
+        verts, joints = layer.fk_inference(compute_dtype=getattr(torch, mode), poses_body=poses_body, betas=betas)
+    elapsed = time.perf_counter() - start
+
+    # On Linux ru_maxrss is in kilobytes.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if torch.cuda.is_available() and C.device.type == 'cuda':
+        peak = torch.cuda.max_memory_allocated() / 1024 ** 2
+    queue.put((elapsed, peak))
+
+
+if __name__ == '__main__':
+    n_frames = 20000
+    ctx = mp.get_context('spawn')
+    print("Evaluating a SMPL-X sequence with {} frames on {}".format(n_frames, C.device))
+    for mode in ['autograd', 'float32', 'bfloat16', 'float16']:
+        queue = ctx.Queue()
+        p = ctx.Process(target=evaluate, args=(mode, n_frames, queue))
+        p.start()
+        p.join()
+        if p.exitcode != 0:
+            print("{:>9}: failed".format(mode))
+            continue
+        elapsed, peak = queue.get()
+        print("{:>9}: {:.2f}s, peak memory {:.0f} MB".format(mode, elapsed, peak))
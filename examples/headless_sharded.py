@@ -0,0 +1,35 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+
+from aitviewer.configuration import CONFIG as C
+from aitviewer.renderables.smpl import SMPLSequence
+from aitviewer.headless import save_video_sharded
+
+
+def build_scene(viewer):
+    """Populate the scene of a renderer, this is called in every worker process."""
+    smpl_seq = SMPLSequence.from_amass(
+        npz_data_path=os.path.join(C.datasets.amass, "ACCAD/Female1Running_c3d/C2 - Run to stand_poses.npz"),
+        fps_out=60.0, name="AMASS Running")
+    viewer.scene.add(smpl_seq)
+
+
+if __name__ == '__main__':
+    # Render the sequence with 4 processes in parallel, each renders a quarter of the frames.
+    save_video_sharded(build_scene, os.path.join(C.export_dir, 'headless/sharded.mp4'), n_workers=4,
+                       rotate_camera=True)
@@ -0,0 +1,78 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import threading
+import time
+import torch
+
+from aitviewer.configuration import CONFIG as C
+from aitviewer.models.smpl import SMPLLayer
+from aitviewer.renderables.spheres import Spheres
+from aitviewer.streamables.live_smpl import LiveSMPLSequence
+from aitviewer.viewer import Viewer
+
+
+def fit(seq, smpl_layer, target_joints, n_iterations=2000, stop_event=None):
+    """
+    Fit the body poses to target joint positions with gradient descent and publish every iteration to the viewer. The
+    viewer only evaluates the body model for the newest snapshot, so displaying the progress barely slows down the fit.
+    """
+    n_frames = target_joints.shape[0]
+    poses_body = torch.zeros((n_frames, smpl_layer.bm.NUM_BODY_JOINTS * 3), device=C.device, requires_grad=True)
+    betas = torch.zeros((1, smpl_layer.num_betas), device=C.device)
+    optimizer = torch.optim.Adam([poses_body], lr=0.01)
+
+    start = time.perf_counter()
+    for i in range(n_iterations):
+        if stop_event is not None and stop_event.is_set():
+            break
+        optimizer.zero_grad()
+        _, joints = smpl_layer(poses_body=poses_body, betas=betas)
+        loss = (joints[:, :22] - target_joints).square().sum(dim=-1).mean()
+        loss.backward()
+        optimizer.step()
+        seq.publish(poses_body=poses_body)
+
+        if i % 100 == 0:
+            rate = (i + 1) / (time.perf_counter() - start)
+            print("Iteration {}: loss {:.6f}, {:.1f} it/s".format(i, loss.item(), rate))
+
+
+if __name__ == '__main__':
+    smpl_layer = SMPLLayer(model_type='smpl', gender='neutral', device=C.device)
+
+    # Create target joint positions from random poses.
+    n_frames = 30
+    torch.manual_seed(0)
+    with torch.no_grad():
+        target_poses = torch.randn((n_frames, smpl_layer.bm.NUM_BODY_JOINTS * 3), device=C.device) * 0.3
+        _, target_joints = smpl_layer(poses_body=target_poses, betas=torch.zeros((1, smpl_layer.num_betas),
+                                                                                 device=C.device))
+        target_joints = target_joints[:, :22]
+
+    seq = LiveSMPLSequence.t_pose(smpl_layer, frames=n_frames, max_fps=30.0, name='Fit')
+    targets = Spheres(target_joints.cpu().numpy(), radius=0.02, color=(1.0, 0.2, 0.2, 1.0), name='Targets')
+
+    stop_event = threading.Event()
+    thread = threading.Thread(target=fit, args=(seq, smpl_layer, target_joints), kwargs={'stop_event': stop_event},
+                              daemon=True)
+
+    v = Viewer()
+    v.scene.add(seq, targets)
+    thread.start()
+    v.run()
+    stop_event.set()
+    thread.join()
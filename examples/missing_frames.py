@@ -18,7 +18,7 @@ import joblib
 import numpy as np
 
 from aitviewer.viewer import Viewer
-from aitviewer.renderables.smpl import SMPLSequence
+from aitviewer.renderables.smpl import SMPLSequence, batch_construction
 from aitviewer.models.smpl import SMPLLayer
 from aitviewer.configuration import CONFIG as C
 from aitviewer.utils.so3 import aa2rot_numpy
@@ -52,16 +52,6 @@ if __name__ == '__main__':
     # Set to zero the values at the indices of the 100 missing frames. There are now only M ones in the mask.
     enabled_frames[25:125] = 0
 
-    # Instantiate an SMPL sequence using the parameters and the enabled_frames mask.
-    smpl_layer = SMPLLayer(model_type='smpl', gender='neutral', device=C.device)
-    smpl_seq = SMPLSequence(poses_body=p[:, 3:24 * 3],
-                            poses_root=p[:, 0:3],
-                            betas=b,
-                            smpl_layer=smpl_layer,
-                            position=(1, 0, 0),
-                            rotation=aa2rot_numpy(np.array([1, 0, 0]) * np.pi),
-                            enabled_frames=enabled_frames)
-
     # We do the same for a second sequence but removing a different range of frames.
     # Notice how the two sequences remain in sync, since the sequence is only advanced
     # during frames that are enabled (where the mask value is one).
@@ -69,14 +59,25 @@ if __name__ == '__main__':
     b2 = np.concatenate((betas[:175], betas[275:]))
     enabled_frames2 = np.ones(N, dtype=np.bool8)
     enabled_frames2[175:275] = 0
-    smpl_layer2 = SMPLLayer(model_type='smpl', gender='neutral', device=C.device)
-    smpl_seq2 = SMPLSequence(poses_body=p2[:, 3:24 * 3],
-                             poses_root=p2[:, 0:3],
-                             betas=b2,
-                             smpl_layer=smpl_layer2,
-                             position=(-1, 0, 0),
-                             rotation=aa2rot_numpy(np.array([1, 0, 0]) * np.pi),
-                             enabled_frames=enabled_frames2)
+
+    # Instantiate the SMPL sequences using the parameters and the enabled_frames masks. Both sequences share the
+    # same layer and are created in a batch_construction block, so their forward kinematics are evaluated together.
+    smpl_layer = SMPLLayer(model_type='smpl', gender='neutral', device=C.device)
+    with batch_construction():
+        smpl_seq = SMPLSequence(poses_body=p[:, 3:24 * 3],
+                                poses_root=p[:, 0:3],
+                                betas=b,
+                                smpl_layer=smpl_layer,
+                                position=(1, 0, 0),
+                                rotation=aa2rot_numpy(np.array([1, 0, 0]) * np.pi),
+                                enabled_frames=enabled_frames)
+        smpl_seq2 = SMPLSequence(poses_body=p2[:, 3:24 * 3],
+                                 poses_root=p2[:, 0:3],
+                                 betas=b2,
+                                 smpl_layer=smpl_layer,
+                                 position=(-1, 0, 0),
+                                 rotation=aa2rot_numpy(np.array([1, 0, 0]) * np.pi),
+                                 enabled_frames=enabled_frames2)
 
     # Run the viewer
     viewer = Viewer(size=(1600, 900))
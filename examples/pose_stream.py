@@ -0,0 +1,30 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import sys
+
+from aitviewer.streamables.pose_stream import PoseStream
+from aitviewer.viewer import Viewer
+
+
+if __name__ == '__main__':
+    # Display poses written by another process, e.g. `pose_stream_producer.py` which must be started first.
+    name = sys.argv[1] if len(sys.argv) > 1 else 'poses'
+    stream = PoseStream(name)
+
+    v = Viewer()
+    v.scene.add(stream)
+    v.run()
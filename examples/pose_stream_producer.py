@@ -0,0 +1,63 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import argparse
+import time
+import numpy as np
+
+from aitviewer.utils.shared_ring_buffer import RingBufferWriter
+
+
+if __name__ == '__main__':
+    # A stand-in for a live motion capture system. It writes SMPL poses to a shared memory ring buffer at a fixed
+    # rate, run `pose_stream.py` in another terminal to display them.
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--name', default='poses', help="Name of the stream.")
+    parser.add_argument('--amass', default=None, help="Path to an AMASS sequence to replay, otherwise the body waves.")
+    parser.add_argument('--fps', type=float, default=120.0, help="Rate at which poses are written.")
+    args = parser.parse_args()
+
+    if args.amass is not None:
+        body_data = np.load(args.amass)
+        poses, trans = body_data['poses'], body_data['trans']
+        betas = body_data['betas'][:10]
+        gender = str(body_data['gender'])
+    else:
+        # Raise and lower the arms.
+        t = np.arange(0, 10, 1 / args.fps)
+        poses = np.zeros((len(t), 66))
+        poses[:, 3 * 16 + 2] = -0.5 - 0.5 * np.sin(2 * np.pi * 0.5 * t)
+        poses[:, 3 * 17 + 2] = 0.5 + 0.5 * np.sin(2 * np.pi * 0.5 * t)
+        trans = np.zeros((len(t), 3))
+        betas = np.zeros(10)
+        gender = 'neutral'
+
+    fields = {'poses_root': 3, 'poses_body': 63, 'trans': 3, 'betas': 10}
+    writer = RingBufferWriter(args.name, fields, metadata={'model_type': 'smplx', 'gender': gender,
+                                                           'z_up': args.amass is not None})
+    print("Streaming {} poses at {} fps to '{}', press Ctrl+C to stop.".format(len(poses), args.fps, args.name))
+    try:
+        i, start = 0, time.perf_counter()
+        while True:
+            f = i % len(poses)
+            writer.write(poses_root=poses[f, :3], poses_body=poses[f, 3:66], trans=trans[f], betas=betas)
+            i += 1
+            # Sleep until the next sample is due without accumulating drift.
+            time.sleep(max(0.0, start + i / args.fps - time.perf_counter()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
@@ -0,0 +1,52 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import os
+import numpy as np
+
+from aitviewer.configuration import CONFIG as C
+from aitviewer.dataset_renderer import DatasetRenderer
+from aitviewer.headless import HeadlessRenderer
+from aitviewer.renderables.smpl import SMPLSequence
+from aitviewer.scene.camera import OpenCVCamera
+from aitviewer.utils.so3 import aa2rot_numpy
+
+
+if __name__ == '__main__':
+    # Load an AMASS sequence.
+    smpl_seq = SMPLSequence.from_amass(
+        npz_data_path=os.path.join(C.datasets.amass, "ACCAD/Female1Running_c3d/C2 - Run to stand_poses.npz"),
+        fps_out=30.0, name="AMASS Running")
+
+    v = HeadlessRenderer()
+    v.scene.add(smpl_seq)
+
+    # Place 8 cameras on a circle around the origin looking at the center of the sequence.
+    cols, rows = 640, 480
+    K = np.array([[500.0, 0.0, cols / 2], [0.0, 500.0, rows / 2], [0.0, 0.0, 1.0]])
+    cameras = []
+    for angle in np.linspace(0, 2 * np.pi, 8, endpoint=False):
+        # Rotate around the y-axis and flip y and z to go from the OpenGL to the OpenCV camera convention.
+        R = aa2rot_numpy(np.array([0.0, angle, 0.0]))
+        R_cv = (R @ np.diag([1.0, -1.0, -1.0])).T
+        position = R @ np.array([0.0, 1.0, 4.0])
+        Rt = np.concatenate([R_cv, -R_cv @ position[:, np.newaxis]], axis=1)
+        cameras.append(OpenCVCamera(K, Rt, cols, rows, viewer=v))
+
+    # Render RGB, depth and instance ids of all frames from all cameras. Running this again resumes where it stopped.
+    renderer = DatasetRenderer(v, cameras, os.path.join(C.export_dir, 'dataset'), chunk_size=32,
+                               outputs=('rgb', 'depth', 'object_id'))
+    renderer.run()
@@ -0,0 +1,59 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import sys
+import time
+import numpy as np
+
+from scipy.spatial.transform import Rotation as R
+
+from aitviewer.utils.so3 import resample_rotations
+
+
+def load_poses(n_frames, n_joints):
+    """Load the poses of an AMASS sequence given on the command line or create a random motion."""
+    if len(sys.argv) > 1:
+        body_data = np.load(sys.argv[1])
+        poses = body_data['poses']
+        return np.reshape(poses, [poses.shape[0], -1, 3]), body_data['mocap_frame_rate'].tolist()
+    rots = R.from_rotvec(np.random.randn(n_joints, 3) * 0.3)
+    poses = [rots.as_rotvec()]
+    for _ in range(n_frames - 1):
+        rots = rots * R.from_rotvec(np.random.randn(n_joints, 3) * 0.02)
+        poses.append(rots.as_rotvec())
+    return np.stack(poses), 120
+
+
+def angular_error(a, b):
+    """Maximum angle in degrees between the rotations a and b."""
+    diff = R.from_rotvec(a.reshape(-1, 3)).inv() * R.from_rotvec(b.reshape(-1, 3))
+    return np.degrees(np.max(diff.magnitude()))
+
+
+if __name__ == '__main__':
+    # Pass the path to an AMASS npz file to resample it, otherwise a random SMPL-X motion with hands is used.
+    np.random.seed(0)
+    poses, fps_in = load_poses(n_frames=6000, n_joints=55)
+    fps_out = 60
+    print("Resampling {} frames of {} joints from {} to {} fps".format(poses.shape[0], poses.shape[1], fps_in, fps_out))
+
+    results = {}
+    for method in ['scipy', 'spline', 'slerp']:
+        start = time.perf_counter()
+        results[method] = resample_rotations(poses, fps_in, fps_out, method)
+        duration = time.perf_counter() - start
+        print("{:>6}: {:.3f}s, max. deviation from scipy {:.4f} deg".format(
+            method, duration, angular_error(results['scipy'], results[method])))
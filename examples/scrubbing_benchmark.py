@@ -0,0 +1,67 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import time
+import numpy as np
+
+from aitviewer.renderables.spheres import Spheres
+from aitviewer.renderables.skeletons import Skeletons
+from aitviewer.scene.scene import Scene
+
+
+def build_scene(n_sequences, n_frames, n_joints, disabled_ratio):
+    """Create a scene with many animated skeletons, a fraction of which is disabled."""
+    scene = Scene()
+    skeleton = np.stack([np.arange(n_joints) - 1, np.arange(n_joints)], axis=-1)
+    skeleton[0, 0] = -1
+    for i in range(n_sequences):
+        joints = np.cumsum(np.random.randn(n_frames, n_joints, 3) * 0.01, axis=0) + np.array([i, 0.0, 0.0])
+        node = Skeletons(joints, skeleton, name="Skeleton {}".format(i))
+        node.add(Spheres(joints[:, :1], radius=0.05, is_selectable=False))
+        node.enabled = i >= n_sequences * disabled_ratio
+        scene.add(node)
+    return scene
+
+
+def scrub(scene, n_ticks, jumps_per_tick, eager):
+    """
+    Simulate dragging the frame slider: every tick the frame is changed several times before the scene is drawn.
+    :param eager: If set, every node is updated after every single frame change, as if frame changes were
+      propagated immediately through the whole tree.
+    """
+    all_nodes = scene.collect_nodes(req_enabled=False)
+    start = time.perf_counter()
+    for _ in range(n_ticks):
+        for _ in range(jumps_per_tick):
+            scene.current_frame_id = np.random.randint(0, scene.n_frames)
+            if eager:
+                for n in all_nodes:
+                    n.current_frame_id
+        scene.update_frame()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    np.random.seed(0)
+    n_ticks, jumps_per_tick = 100, 5
+    scene = build_scene(n_sequences=100, n_frames=300, n_joints=24, disabled_ratio=0.5)
+    print("Scene with {} nodes, {} ticks with {} frame changes each".format(
+        len(scene.collect_nodes(req_enabled=False)), n_ticks, jumps_per_tick))
+
+    for eager in [True, False]:
+        duration = scrub(scene, n_ticks, jumps_per_tick, eager)
+        print("{:>8}: {:.2f}s total, {:.2f}ms per tick".format(
+            "Eager" if eager else "Deferred", duration, duration / n_ticks * 1000.0))
@@ -0,0 +1,42 @@
+"""
+Copyright (C) 2022  ETH Zurich, Manuel Kaufmann, Velko Vechev, Dario Mylonopoulos
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import numpy as np
+import os
+import sys
+
+from aitviewer.renderables.billboard import VideoBillboard
+from aitviewer.renderables.smpl import SMPLSequence
+from aitviewer.viewer import Viewer
+from aitviewer.configuration import CONFIG as C
+
+
+if __name__ == '__main__':
+    # Usage: python video_reference.py <amass_npz> <video> [offset in seconds]
+    # Shows a reference video next to an AMASS sequence. The video is decoded in the background and follows the
+    # scene frame, so it stays in sync when scrubbing or changing the playback speed.
+    npz_path, video_path = sys.argv[1], sys.argv[2]
+    offset = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+
+    seq = SMPLSequence.from_amass(npz_data_path=npz_path, fps_out=C.scene_fps, name=os.path.basename(npz_path))
+    video = VideoBillboard.from_video(video_path, scale=1.0, offset=offset, name="Reference")
+    video.position = np.array([0.0, 1.0, -2.0])
+
+    v = Viewer()
+    v.run_animations = True
+    v.scene.camera.position = np.array([0.0, 2.0, 6.0])
+    v.scene.add(seq, video)
+    v.run()
@@ -19,12 +19,13 @@ import os
 import imgui
 import torch
 import toolz
-import glob
 
 from aitviewer.renderables.smpl import SMPLSequence
 from aitviewer.viewer import Viewer
 from aitviewer.configuration import CONFIG as C
 from aitviewer.utils import to_numpy
+from aitviewer.utils.amass_catalog import AmassCatalog
+from aitviewer.thumbnails import ThumbnailService
 
 class ExportingViewer(Viewer):    
     def __init__(self, **kwargs):
@@ -39,21 +40,79 @@ class ExportingViewer(Viewer):
         self.gui_controls['export']= self.gui_export
         self.gui_controls['load']= self.gui_load
         self.part, self.subject, self.action = 'Testset', 'One', 'Hard'
-        self.filenames = glob.glob(os.path.join(C.datasets.amass, C.export.part, '**', '*_stageii.npz'))
-        self.displaynames = list(map(lambda f: f"{os.path.basename(os.path.dirname(f))} - {os.path.basename(f)}", self.filenames))
+        self.catalog = AmassCatalog(root=os.path.join(C.datasets.amass, C.export.part), pattern='*/*_stageii.npz')
+        n_read = self.catalog.update()
+        print(f"Indexed {n_read} new or modified sequences.")
+        self.genders = ['all', 'female', 'male', 'neutral']
+        self.filter_name, self.filter_gender = '', 0
         self.loaded_sequences = []
+        self.thumbnails = ThumbnailService()
+        self.preview_path, self.preview_texture = None, None
+        self.refresh_sequences()
+
+    def refresh_sequences(self):
+        gender = self.genders[self.filter_gender] if self.filter_gender > 0 else None
+        entries = self.catalog.query(name=self.filter_name, gender=gender)
+        self.filenames = [e['path'] for e in entries]
+        self.displaynames = list(map(lambda f: f"{os.path.basename(os.path.dirname(f))} - {os.path.basename(f)}", self.filenames))
+        self.listnames = [f"{n} ({e['n_frames']} frames @ {e['fps']:.0f} fps, {e['gender']})" for n, e in zip(self.displaynames, entries)]
         self.selected_sequence = 0
+        self.thumbnails.cancel_pending()
+        self.prefetch_previews()
+
+    def prefetch_previews(self, n_rows=15):
+        # Render the previews of the rows around the selection in the background, closest to the selection first.
+        first = max(0, min(self.selected_sequence - n_rows // 2, len(self.filenames) - n_rows))
+        rows = sorted(range(first, min(first + n_rows, len(self.filenames))), key=lambda i: abs(i - self.selected_sequence))
+        self.thumbnails.prefetch([self.filenames[i] for i in rows])
+
+    def gui_preview(self):
+        if len(self.filenames) == 0:
+            return
+        filename = self.filenames[self.selected_sequence]
+        if filename != self.preview_path:
+            if self.preview_texture is not None:
+                self.imgui.remove_texture(self.preview_texture)
+                self.preview_texture.release()
+            self.preview_path, self.preview_texture = filename, None
+        if self.preview_texture is None:
+            # The preview is rendered in the background, show it once it is available.
+            image = self.thumbnails.get(filename)
+            if image is None:
+                imgui.text("Rendering preview...")
+                return
+            self.preview_texture = self.ctx.texture((image.shape[1], image.shape[0]), 3, np.ascontiguousarray(image).tobytes())
+            self.imgui.register_texture(self.preview_texture)
+        imgui.image(self.preview_texture.glo, *self.preview_texture.size)
+
+    def on_close(self):
+        self.thumbnails.close()
+        self.catalog.close()
+        super().on_close()
 
     def gui_load(self):
         imgui.set_next_window_position(1250, 100, imgui.FIRST_USE_EVER)
         imgui.set_next_window_size(self.window_size[0] * 0.4, self.window_size[1] * 0.5, imgui.FIRST_USE_EVER)
         imgui.begin(C.export.part)
+        imgui.push_item_width(imgui.get_window_width() * 0.6)
+        name_changed, self.filter_name = imgui.input_text('Filter', self.filter_name, 256)
+        imgui.pop_item_width()
+        imgui.same_line()
+        imgui.push_item_width(imgui.get_window_width() * 0.2)
+        gender_changed, self.filter_gender = imgui.combo('Gender', self.filter_gender, self.genders)
+        imgui.pop_item_width()
+        if name_changed or gender_changed:
+            self.refresh_sequences()
         imgui.push_item_width(imgui.get_window_width() * 0.95)
-        _, self.selected_sequence = imgui.listbox(
-            "##Sequences", self.selected_sequence, self.displaynames, 15
+        selection_changed, self.selected_sequence = imgui.listbox(
+            "##Sequences", self.selected_sequence, self.listnames, 15
         )
         imgui.pop_item_width()
-        if imgui.button('Load Selected', width=100, height=50):
+        if selection_changed:
+            self.thumbnails.cancel_pending()
+            self.prefetch_previews()
+        self.gui_preview()
+        if imgui.button('Load Selected', width=100, height=50) and len(self.filenames) > 0:
             filename = self.filenames[self.selected_sequence]
             displayname = self.displaynames[self.selected_sequence]
             sequence = SMPLSequence.from_amass(npz_data_path=filename,                
@@ -1,15 +1,25 @@
 from utils import reference, viewer, noreference, requires_smpl, RESOURCE_DIR
 
 from aitviewer.renderables.meshes import Meshes
+from aitviewer.renderables.point_clouds import PointClouds
 from aitviewer.renderables.spheres import Spheres
-from aitviewer.renderables.smpl import SMPLSequence, SMPLLayer
+from aitviewer.renderables.smpl import SMPLSequence, SMPLLayer, batch_construction, batch_fk
 from aitviewer.scene.camera import OpenCVCamera, WeakPerspectiveCamera
 from aitviewer.viewer import Viewer
+from aitviewer.scene.scene import Scene
+from aitviewer.scene.node import Node
 from aitviewer.headless import HeadlessRenderer
+from aitviewer.models.registry import get_layer
+from aitviewer.utils import load_npz_window
+from aitviewer.utils.amass_catalog import AmassCatalog
+from aitviewer.streamables.live_smpl import LiveSMPLSequence
+from aitviewer.streamables.recorder import StreamRecorder, load_recording
+from aitviewer.utils.so3 import interpolate_rotations, resample_rotations
 from aitviewer.configuration import CONFIG as C
 
 import trimesh
 import numpy as np
+import torch
 import os
 from tempfile import TemporaryDirectory
 
@@ -139,4 +149,277 @@ def test_vertex_face_colors(viewer: Viewer):
     viewer.scene.camera.rotate_azimuth_elevation(250, 250)
     viewer.scene.floor.enabled = False
     viewer.shadows_enabled = False
-    viewer.scene.add(per_vertex0, per_vertex1, per_vertex2, per_face0, per_face1, per_face2, uniform1, uniform2, uniform3)
\ No newline at end of file
+    viewer.scene.add(per_vertex0, per_vertex1, per_vertex2, per_face0, per_face1, per_face2, uniform1, uniform2, uniform3)
+
+
+@noreference
+def test_headless_outputs(viewer: HeadlessRenderer):
+    cube = trimesh.load(os.path.join(RESOURCE_DIR, 'cube.obj'), process=False)
+    cube_mesh = Meshes(cube.vertices, cube.faces, name='Cube', flat_shading=True)
+    viewer.scene.add(cube_mesh)
+
+    outputs = viewer.get_outputs(mask=True)
+    h, w = viewer.window.size[1], viewer.window.size[0]
+    assert outputs['rgb'].shape == (h, w, 3) and outputs['mask'].shape == (h, w, 3)
+    assert outputs['depth'].shape == (h, w) and outputs['object_id'].shape == (h, w)
+
+    # The outputs match the ones of the individual methods.
+    assert np.array_equal(outputs['rgb'], np.asarray(viewer.get_current_frame_as_image()))
+    assert np.array_equal(outputs['mask'], np.asarray(viewer.get_current_mask_image()))
+
+    is_cube = outputs['object_id'] == cube_mesh.uid
+    assert is_cube.any()
+    assert (outputs['depth'][is_cube] > 0).all()
+    assert (outputs['triangle_id'][is_cube] >= 0).all() and (outputs['triangle_id'][is_cube] < len(cube.faces)).all()
+
+
+@requires_smpl
+def test_shared_layers():
+    layer = get_layer(SMPLLayer, model_type='smpl', gender='male', device=C.device)
+    assert get_layer(SMPLLayer, 'smpl', 'male', device=C.device) is layer
+    assert get_layer(SMPLLayer, model_type='smpl', gender='female', device=C.device) is not layer
+
+    seq0 = SMPLSequence.t_pose()
+    seq1 = SMPLSequence.t_pose()
+    assert seq0.smpl_layer is seq1.smpl_layer
+
+
+@requires_smpl
+def test_batch_fk():
+    layer = get_layer(SMPLLayer, model_type='smpl', gender='neutral', device=C.device)
+    poses = [np.random.randn(n, layer.bm.NUM_BODY_JOINTS * 3) * 0.1 for n in [1, 5, 3]]
+    betas = [np.random.randn(1, 10) for _ in poses]
+
+    seqs = [SMPLSequence(p, layer, betas=b) for p, b in zip(poses, betas)]
+    with batch_construction():
+        batched_seqs = [SMPLSequence(p, layer, betas=b) for p, b in zip(poses, betas)]
+
+    for s, b in zip(seqs, batched_seqs):
+        assert np.allclose(s.vertices, b.vertices, atol=1e-5)
+        assert np.allclose(s.joints, b.joints, atol=1e-5)
+
+    for s, (v, j, _, _) in zip(seqs, batch_fk(seqs, current_frame_only=True)):
+        assert np.allclose(s.vertices[s.current_frame_id], v, atol=1e-5)
+
+
+@requires_smpl
+def test_live_smpl_sequence():
+    seq = LiveSMPLSequence.t_pose(frames=3, max_fps=1000.0)
+    poses = [torch.randn_like(seq.poses_body) * 0.1 for _ in range(3)]
+    vertices = seq.vertices.copy()
+
+    # Only the newest snapshot is displayed, the producer can keep modifying its tensors after publishing.
+    for p in poses:
+        seq.publish(poses_body=p)
+    poses[-1].zero_()
+    seq.capture()
+    assert seq.n_published == 3 and seq.n_displayed == 1
+    assert not torch.allclose(seq.poses_body, poses[-1])
+    assert not np.allclose(seq.vertices, vertices)
+
+    # Nothing new was published.
+    seq.capture()
+    assert seq.n_displayed == 1
+
+    # Parameters that are not published keep their values.
+    seq.publish(trans=torch.ones_like(seq.trans))
+    seq._last_update = 0.0
+    seq.capture()
+    assert seq.n_displayed == 2
+    assert torch.allclose(seq.trans, torch.ones_like(seq.trans))
+    assert not torch.allclose(seq.poses_body, torch.zeros_like(seq.poses_body))
+
+
+def test_point_clouds_ragged():
+    points = [np.random.randn(n, 3) for n in [5, 0, 12, 7]]
+    colors = [np.random.rand(n, 4) for n in [5, 0, 12, 7]]
+    pc = PointClouds(points, colors)
+
+    assert pc.n_frames == 4 and pc.max_n_points == 12
+    for i in range(4):
+        assert np.allclose(pc.points[i], points[i]) and np.allclose(pc.colors[i], colors[i])
+
+    all_points = np.concatenate(points)
+    assert np.allclose(pc.bounds, np.stack([all_points.min(axis=0), all_points.max(axis=0)], axis=-1), atol=1e-6)
+
+    # Resident sequences draw a range of the buffers holding all frames, streamed ones only hold the current frame.
+    pc.current_frame_id = 2
+    assert np.allclose(pc.current_points, points[2]) and np.allclose(pc.current_colors, colors[2])
+    assert pc.is_gpu_resident and pc.draw_range == (5, 12)
+    budget = C.point_cloud_gpu_budget
+    C.update_conf({'point_cloud_gpu_budget': 0})
+    try:
+        assert not pc.is_gpu_resident and pc.draw_range == (0, 12)
+    finally:
+        C.update_conf({'point_cloud_gpu_budget': budget})
+
+    pc = PointClouds(np.random.randn(3, 4, 3), color=(1.0, 0.0, 0.0, 1.0))
+    assert pc.points.shape == (3, 4, 3)
+    assert np.array_equal(pc.current_colors, np.tile([1.0, 0.0, 0.0, 1.0], (4, 1)))
+
+
+
+class _CountingNode(Node):
+    """A node that counts how often its frame is updated."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.n_updates = 0
+
+    def on_frame_update(self):
+        super().on_frame_update()
+        self.n_updates += 1
+
+
+def test_deferred_frame_updates():
+    root = _CountingNode(n_frames=10)
+    child = _CountingNode(n_frames=10)
+    grandchild = _CountingNode(n_frames=10)
+    root.add(child)
+    child.add(grandchild)
+
+    # Repeated frame changes before the update are coalesced into a single update.
+    for f in [3, 5, 7]:
+        root.current_frame_id = f
+    assert root.n_updates == 0
+    root.update_frame()
+    assert [n.n_updates for n in [root, child, grandchild]] == [1, 1, 1]
+    assert grandchild.current_frame_id == 7
+
+    # Disabled subtrees are skipped until they are enabled again.
+    child.enabled = False
+    root.current_frame_id = 2
+    root.update_frame()
+    assert [n.n_updates for n in [root, child, grandchild]] == [2, 1, 1]
+    child.enabled = True
+    root.update_frame()
+    assert [n.n_updates for n in [root, child, grandchild]] == [2, 2, 2]
+    assert child.current_frame_id == 2 and grandchild.current_frame_id == 2
+
+    # Reading the frame of a descendant first applies the pending frames of its ancestors.
+    root.current_frame_id = 4
+    assert grandchild.current_frame_id == 4
+    assert [n.n_updates for n in [root, child, grandchild]] == [3, 3, 3]
+
+def _random_rotations(n):
+    q, r = np.linalg.qr(np.random.randn(n, 3, 3))
+    return q * np.sign(np.linalg.det(q))[:, np.newaxis, np.newaxis]
+
+
+def _trs(node, frame_id):
+    """Compose translation, rotation and scale of a node's frame directly from its per-frame arrays."""
+    t, r, s = np.eye(4), np.eye(4), np.eye(4)
+    t[:3, 3] = node.positions[frame_id if len(node.positions) > 1 else 0]
+    r[:3, :3] = node.rotations[frame_id if len(node.rotations) > 1 else 0]
+    s[:3, :3] *= node.scales[frame_id if len(node.scales) > 1 else 0]
+    return t @ r @ s
+
+
+def test_node_model_matrix():
+    n_frames = 5
+    parent = Node(position=np.random.randn(n_frames, 3), rotation=_random_rotations(n_frames), scale=2.0)
+    child = Node(n_frames=n_frames, rotation=_random_rotations(n_frames),
+                 scale=np.random.uniform(0.5, 2.0, n_frames).astype(np.float32))
+    parent.add(child)
+
+    # Values shared by all frames are changed for all frames, even if set while another frame is current.
+    parent.current_frame_id = 2
+    child.position = [1.0, 2.0, 3.0]
+    parent.scale = 0.5
+
+    for f in range(n_frames):
+        parent.current_frame_id = f
+        assert np.allclose(parent.model_matrix, _trs(parent, f), atol=1e-5)
+        assert np.allclose(child.model_matrix, _trs(parent, f) @ _trs(child, f), atol=1e-5)
+        assert np.allclose(child.inverse_model_matrix @ child.model_matrix, np.eye(4), atol=1e-4)
+
+def test_interpolate_rotations():
+    # A smooth motion sampled at irregular timestamps.
+    ts_in = np.cumsum(np.random.uniform(0.5, 1.5, 50))
+    phases = np.random.uniform(0, 2 * np.pi, (1, 4, 3))
+    poses = 0.5 * np.sin(0.2 * ts_in[:, np.newaxis, np.newaxis] + phases)
+    ts_out = np.linspace(ts_in[0], ts_in[-1], 200)
+
+    reference = interpolate_rotations(poses, ts_in, ts_out, method='scipy')
+    for method in ['spline', 'slerp']:
+        assert np.allclose(interpolate_rotations(poses, ts_in, ts_in, method), poses, atol=1e-6)
+        assert np.allclose(interpolate_rotations(poses, ts_in, ts_out, method), reference, atol=1e-2)
+    assert resample_rotations(poses, 120, 60).shape == (25, 4, 3)
+
+
+def test_load_npz_window():
+    poses = np.random.randn(100, 156).astype(np.float32)
+    trans = np.random.randn(100, 3)
+    betas = np.random.randn(16)
+    with TemporaryDirectory() as temp:
+        for save in [np.savez, np.savez_compressed]:
+            path = os.path.join(temp, 'seq.npz')
+            save(path, poses=poses, trans=trans, betas=betas, gender=np.array('male'),
+                 marker_meta=np.array({'marker_vids': {}}, dtype=object), markers=np.random.randn(100, 41, 3))
+
+            data = load_npz_window(path, 10, 30)
+            assert np.array_equal(data['poses'], poses[10:30]) and np.array_equal(data['trans'], trans[10:30])
+            assert np.array_equal(data['betas'], betas) and data['gender'].item() == 'male'
+            assert np.array_equal(load_npz_window(path, 90, None)['poses'], poses[90:])
+            assert np.array_equal(load_npz_window(path)['poses'], poses)
+
+            # Object members are skipped and only the requested members are read.
+            assert 'marker_meta' not in load_npz_window(path)
+            assert set(load_npz_window(path, 10, 30, keys=('poses', 'betas', 'gender'))) == {'poses', 'betas', 'gender'}
+
+
+def test_amass_catalog():
+    with TemporaryDirectory() as temp:
+        root = os.path.join(temp, 'amass')
+        for subject, gender, n in [('s1', 'male', 10), ('s1', 'female', 20), ('s2', 'male', 30)]:
+            os.makedirs(os.path.join(root, subject), exist_ok=True)
+            np.savez(os.path.join(root, subject, '{}_{}_stageii.npz'.format(gender, n)), poses=np.zeros((n, 165)),
+                     trans=np.zeros((n, 3)), betas=np.ones(16), gender=np.array(gender),
+                     mocap_frame_rate=np.array(120.0), surface_model_type=np.array('smplx'))
+
+        catalog = AmassCatalog(root, index_path=os.path.join(temp, 'catalog.sqlite'))
+        assert catalog.update() == 3
+        assert catalog.update() == 0
+        assert [e['n_frames'] for e in catalog.query()] == [20, 10, 30]
+        assert [e['n_frames'] for e in catalog.query(gender='male', min_frames=15)] == [30]
+        assert len(catalog.query(name='S1')) == 2
+
+        entry = catalog.query(name='s2')[0]
+        assert entry['fps'] == 120.0 and entry['model_type'] == 'smplx' and np.array_equal(entry['betas'], np.ones(16))
+        os.remove(entry['path'])
+        assert catalog.update() == 0 and len(catalog.query()) == 2
+        catalog.close()
+
+
+def test_stream_recorder():
+    with TemporaryDirectory() as temp:
+        recorder = StreamRecorder(temp, capacity=16, chunk_size=4)
+        for i in range(10):
+            recorder.push(float(i), joints=np.full((24, 3), i, np.float32))
+        assert len(recorder.finish()) == 3
+
+        data = load_recording(temp)
+        assert recorder.n_dropped == 0
+        assert np.array_equal(data['timestamps'], np.arange(10))
+        assert data['joints'].shape == (10, 24, 3) and np.array_equal(data['joints'][:, 0, 0], np.arange(10))
+
+
+def test_scene_update_queue():
+    scene = Scene()
+    cube = trimesh.creation.box()
+    mesh = Meshes(cube.vertices[np.newaxis], cube.faces)
+    calls = []
+
+    for i in range(5):
+        scene.updates.set_vertices(mesh, cube.vertices[np.newaxis] * (i + 1))
+        scene.updates.call(calls.append, i, key='progress')
+    scene.updates.add(mesh)
+    assert len(scene.updates) == 3
+
+    scene.updates.apply(scene)
+    assert np.allclose(mesh.vertices, cube.vertices[np.newaxis] * 5)
+    assert calls == [4] and mesh.parent is scene and len(scene.updates) == 0
+
+    scene.updates.remove(mesh)
+    scene.updates.apply(scene)
+    assert mesh not in scene.nodes